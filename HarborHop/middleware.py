@@ -1,21 +1,130 @@
 """
 Custom middleware for cache control and security headers
 """
+import hashlib
+from calendar import timegm
 
-class NoCacheMiddleware:
+from django.conf import settings
+from django.contrib import messages
+from django.utils.cache import (
+    add_never_cache_headers,
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+    set_response_etag,
+)
+from django.utils.http import http_date, quote_etag
+
+PUBLIC = 'public'
+PRIVATE = 'private'
+NO_STORE = 'no-store'
+
+# Long-lived public pages (contact, offers)
+PUBLIC_MAX_AGE = 60 * 60
+
+
+class CachePolicy:
+    """
+    How a view's responses may be cached.
+
+    public   - may be kept for max_age seconds (by shared caches only for
+               anonymous visitors); ETag from the body
+    private  - only the user's browser may keep it and must revalidate; the
+               etag/last_modified callables (same arguments as the view) let
+               a conditional GET be answered with 304 before the view runs
+    no-store - never cached (admin pages)
+    """
+
+    def __init__(self, kind, max_age=0, etag=None, last_modified=None):
+        if kind not in (PUBLIC, PRIVATE, NO_STORE):
+            raise ValueError(f"Unknown cache policy: {kind}")
+        self.kind = kind
+        self.max_age = max_age
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+def cache_policy(kind, max_age=0, etag=None, last_modified=None):
+    """Declare a view's cache policy; applied by CachePolicyMiddleware"""
+    def decorator(view_func):
+        view_func.cache_policy = CachePolicy(kind, max_age, etag, last_modified)
+        return view_func
+    return decorator
+
+
+def policy_etag(*parts):
+    """ETag value from the parts a private page depends on"""
+    digest = hashlib.md5(usedforsecurity=False)
+    for part in (getattr(settings, 'HTTP_CACHE_VERSION', ''), *parts):
+        digest.update(str(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class CachePolicyMiddleware:
     """
-    Middleware to add cache control headers to all responses.
-    Prevents browser from caching authenticated pages.
+    Applies the cache_policy() a view declares. Views without one are left
+    alone. Must come after AuthenticationMiddleware and MessageMiddleware.
     """
+
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
         response = self.get_response(request)
-        
-        # Add cache control headers to prevent browser caching
-        response['Cache-Control'] = 'no-cache, no-store, must-revalidate, private'
-        response['Pragma'] = 'no-cache'
-        response['Expires'] = '0'
-        
+        policy = getattr(request, '_cache_policy', None)
+        if policy is not None:
+            response = self.apply_policy(request, response, policy)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        policy = getattr(view_func, 'cache_policy', None)
+        request._cache_policy = policy
+        if policy is None or policy.kind != PRIVATE or request.method not in ('GET', 'HEAD'):
+            return None
+        if not request.user.is_authenticated:
+            return None
+
+        etag = policy.etag(request, *view_args, **view_kwargs) if policy.etag else None
+        last_modified = policy.last_modified(request, *view_args, **view_kwargs) if policy.last_modified else None
+        request._cache_validators = (etag, last_modified)
+
+        # A pending flash message has to be rendered, so the page cannot be reused
+        if (etag is None and last_modified is None) or len(messages.get_messages(request)):
+            return None
+
+        response = get_conditional_response(
+            request,
+            etag=quote_etag(etag) if etag else None,
+            last_modified=timegm(last_modified.utctimetuple()) if last_modified else None,
+        )
+        # A 304 here answers from the browser's copy without running the view
+        return response
+
+    def apply_policy(self, request, response, policy):
+        if policy.kind == NO_STORE:
+            add_never_cache_headers(response)
+            return response
+
+        if policy.kind == PUBLIC:
+            # The navigation bar is personalised, so a signed-in copy stays in the browser
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, max_age=policy.max_age)
+            else:
+                patch_cache_control(response, public=True, max_age=policy.max_age)
+            patch_vary_headers(response, ('Cookie',))
+            if request.method in ('GET', 'HEAD') and response.status_code == 200:
+                if not response.streaming and not response.has_header('ETag'):
+                    set_response_etag(response)
+                return get_conditional_response(request, etag=response.get('ETag'), response=response)
+            return response
+
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
+        etag, last_modified = getattr(request, '_cache_validators', (None, None))
+        if response.status_code in (200, 304):
+            if etag and not response.has_header('ETag'):
+                response['ETag'] = quote_etag(etag)
+            if last_modified and not response.has_header('Last-Modified'):
+                response['Last-Modified'] = http_date(timegm(last_modified.utctimetuple()))
         return response
@@ -76,19 +76,32 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'harbor_mgmt.slowqueries.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'harbor_mgmt.timing.ServerTimingMiddleware',
+    'harbor_mgmt.carts.CartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'HarborHop.middleware.CachePolicyMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Loads request.user together with its UserProfile (one query per request).
+# ModelBackend stays listed so sessions that were created with it (stored
+# under its path) remain valid
+AUTHENTICATION_BACKENDS = [
+    'harbor_mgmt.backends.ProfileBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 ROOT_URLCONF = 'HarborHop.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to ServerTimingMiddleware
+        'BACKEND': 'harbor_mgmt.timing.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -116,7 +129,10 @@ if DATABASE_URL:
     DATABASES = {
         'default': dj_database_url.config(
             default=DATABASE_URL,
-            conn_max_age=600,
+            # Each gunicorn thread keeps its own connection open between
+            # requests; gunicorn.conf.py caps workers * threads at
+            # DB_MAX_CONNECTIONS so the pooler is not exhausted
+            conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', '600')),
             conn_health_checks=True,
         )
     }
@@ -181,14 +197,72 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache
+# With REDIS_URL set every worker shares one Redis cache; without it each
+# process has its own LocMemCache, so caches that must agree across workers
+# (sessions, booking carts) stay off
+REDIS_URL = os.getenv('REDIS_URL', '')
+SHARED_CACHE = bool(REDIS_URL)
+if SHARED_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
 # Session Configuration
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Sessions live in django_session, read through the shared cache when there
+# is one (a session logged out on one worker must not stay valid on the
+# others). Expired rows are removed in batches by the sweeper (see
+# harbor_mgmt/sessions.py)
+SESSION_ENGINE = (
+    'django.contrib.sessions.backends.cached_db' if SHARED_CACHE
+    else 'django.contrib.sessions.backends.db'
+)
 SESSION_COOKIE_AGE = 1209600  # 2 weeks
 SESSION_COOKIE_HTTPONLY = True  # Prevent JavaScript from accessing session cookie
 SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
 SESSION_COOKIE_SAMESITE = 'Lax'  # Allow AJAX requests to send session cookie
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 
+# The booking funnel's selections and form data live in the booking cart
+# (harbor_mgmt/carts.py), not the session; entries expire this many seconds
+# after their last write
+BOOKING_CART_TTL = 60 * 60 * 3
+
+# Part of every ETag the cache policies hand out (HarborHop/middleware.py);
+# bump it when a deploy changes what cached pages look like
+HTTP_CACHE_VERSION = os.getenv('HTTP_CACHE_VERSION', '1')
+
+# Share of requests whose DB/upstream/template timings are logged
+# (harbor_mgmt/timing.py); admins always get a Server-Timing header
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv('SERVER_TIMING_SAMPLE_RATE', '0.05'))
+
+# The request_timing and slow_query lines go to stderr, where the platform
+# collects process output
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'harbor_mgmt.timing': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        'harbor_mgmt.slowqueries': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+# Slow-query log (harbor_mgmt/slowqueries.py): queries slower than this many
+# milliseconds are recorded with their plan; 0 leaves the middleware out
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '0'))
+SLOW_QUERY_EXPLAIN_LIMIT = 3
+SLOW_QUERY_LOG_SIZE = 1000
+
+# Barkota reseller API (harbor_mgmt/barkota.py); point it at
+# api_testing_scripts/barkota_standin.py for load tests
+BARKOTA_API_URL = os.getenv('BARKOTA_API_URL', 'https://barkota-reseller-php-prod-4kl27j34za-uc.a.run.app')
+
 # CSRF Configuration
 CSRF_COOKIE_HTTPONLY = False  # Allow JavaScript to read CSRF token
 CSRF_COOKIE_SECURE = False  # Set to True in production with HTTPS
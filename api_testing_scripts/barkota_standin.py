@@ -0,0 +1,94 @@
+"""
+Local stand-in for the Barkota reseller API, for load tests.
+Answers the routes and voyage search endpoints with canned data after a
+fixed delay, like the real API's response time.
+
+Usage: python api_testing_scripts/barkota_standin.py [--port 8900] [--latency 0.3]
+Then run the app with BARKOTA_API_URL=http://127.0.0.1:8900
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROUTES = [
+    {
+        "origin": {"id": 93, "name": "Cebu"},
+        "destination": {"id": 96, "name": "Tagbilaran"},
+        "destinations": [{"id": 96, "name": "Tagbilaran"}],
+    },
+    {
+        "origin": {"id": 96, "name": "Tagbilaran"},
+        "destination": {"id": 93, "name": "Cebu"},
+        "destinations": [{"id": 93, "name": "Cebu"}],
+    },
+]
+
+
+def voyages(payload):
+    departure_date = payload.get("departureDate") or "2025-10-22"
+    return [
+        {
+            "voyage": {
+                "id": 1000 + hour,
+                "departureDateTime": f"{departure_date}T{hour:02d}:00:00",
+                "vessel": {"name": "MV Stand-in"},
+                "shippingCompany": {"name": "Stand-in Lines"},
+            },
+            "accommodations": [{"name": "Tourist", "price": 500.0}],
+        }
+        for hour in (6, 10, 14, 18)
+    ]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.3
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.latency)
+
+        if self.path == "/ob/routes/passageenabled":
+            body = ROUTES
+        elif self.path == "/ob/voyages/search/bylocation":
+            body = voyages(payload)
+        else:
+            self.send_error(404)
+            return
+
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_standin(port=8900, latency=0.3):
+    """Serve the stand-in from a background thread; returns the server"""
+    handler = type("Handler", (StandInHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before each response")
+    args = parser.parse_args()
+
+    start_standin(args.port, args.latency)
+    print(f"Barkota stand-in on http://127.0.0.1:{args.port} ({args.latency}s latency), Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
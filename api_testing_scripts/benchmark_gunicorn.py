@@ -0,0 +1,98 @@
+"""
+Throughput of the sync and gthread gunicorn modes against the Barkota stand-in.
+
+Starts the stand-in, then for each worker class runs gunicorn with
+gunicorn.conf.py and the same number of workers, and fires concurrent
+requests at /api/locations/ (one Barkota call per request, no caching).
+
+Usage: python api_testing_scripts/benchmark_gunicorn.py [--workers 2] [--threads 8]
+       [--clients 32] [--requests 160] [--latency 0.3]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from barkota_standin import start_standin
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STANDIN_PORT = 8900
+APP_PORT = 8901
+URL = f"http://127.0.0.1:{APP_PORT}/api/locations/"
+
+
+def wait_until_up(timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(URL, timeout=5)
+            return
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn did not start")
+
+
+def timed_get(session_factory):
+    started = time.monotonic()
+    response = session_factory().get(URL, timeout=60)
+    return response.status_code, time.monotonic() - started
+
+
+def run(worker_class, args):
+    env = dict(
+        os.environ,
+        PORT=str(APP_PORT),
+        BARKOTA_API_URL=f"http://127.0.0.1:{STANDIN_PORT}",
+        GUNICORN_WORKER_CLASS=worker_class,
+        WEB_CONCURRENCY=str(args.workers),
+        GUNICORN_THREADS=str(args.threads),
+        DB_MAX_CONNECTIONS=str(args.workers * args.threads),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "HarborHop.wsgi", "--config", "gunicorn.conf.py", "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+    try:
+        wait_until_up()
+        with ThreadPoolExecutor(args.clients) as pool:
+            started = time.monotonic()
+            results = list(pool.map(lambda _: timed_get(requests.Session), range(args.requests)))
+            elapsed = time.monotonic() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = sorted(duration for _status, duration in results)
+    errors = sum(1 for status, _duration in results if status != 200)
+    return {
+        "throughput": len(results) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "errors": errors,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=160)
+    parser.add_argument("--latency", type=float, default=0.3, help="stand-in response time in seconds")
+    args = parser.parse_args()
+
+    start_standin(STANDIN_PORT, args.latency)
+    print(f"{args.workers} workers, {args.clients} clients, {args.requests} requests, Barkota latency {args.latency}s")
+    print("-" * 50)
+    for worker_class in ("sync", "gthread"):
+        result = run(worker_class, args)
+        print(
+            f"{worker_class:8} {result['throughput']:7.1f} req/s   p50 {result['p50'] * 1000:6.0f} ms   "
+            f"p95 {result['p95'] * 1000:6.0f} ms   errors {result['errors']}"
+        )
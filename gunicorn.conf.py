@@ -0,0 +1,72 @@
+"""
+Gunicorn settings for the web process (see Procfile).
+
+The application is loaded and warmed up once in the master (preload_app),
+so workers fork with views imported, templates compiled and the routes
+catalogue cached instead of paying for it on their first requests.
+
+Workers are gthread by default: most requests wait on Barkota, Stripe or
+the database, so each worker serves GUNICORN_THREADS requests at once.
+Django holds one database connection per thread, kept open between
+requests for DB_CONN_MAX_AGE seconds (settings.py), so workers and then
+threads are capped to keep workers * threads within DB_MAX_CONNECTIONS
+(default 10): the share of the Supabase pooler the web process may use,
+leaving room for the job worker and the sweeper. GUNICORN_WORKER_CLASS=sync
+restores one request per worker. Workers are recycled after
+max_requests (+ jitter) requests to bound memory growth.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == 'gthread':
+    workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() + 1))
+    threads = int(os.environ.get('GUNICORN_THREADS', 8))
+else:
+    workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+    threads = 1
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+db_max_connections = max(1, int(os.environ.get('DB_MAX_CONNECTIONS', 10)))
+workers = max(1, min(workers, db_max_connections))
+threads = max(1, min(threads, db_max_connections // workers))
+
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+def _warm_up(log):
+    from django.core.cache import caches
+    from django.db import connections
+
+    from harbor_mgmt.warmup import warm_up
+
+    try:
+        metrics = warm_up()
+        log.info(f"Warmup done in {metrics['duration_ms']} ms: {metrics}")
+    except Exception as e:
+        # A cold worker is slower, not broken
+        log.warning(f"Warmup failed: {str(e)}")
+    finally:
+        # Sockets opened during warmup must not be shared with forked workers
+        connections.close_all()
+        caches.close_all()
+
+
+def when_ready(server):
+    server.log.info(
+        f"{worker_class} workers={workers} threads={threads} max_requests={max_requests} "
+        f"db_connections<={workers * threads}"
+    )
+    # With preload_app the master holds the app; warm it before forking workers
+    if server.cfg.preload_app:
+        _warm_up(server.log)
+
+
+def post_worker_init(worker):
+    # Without preload each worker loads the app itself; warm it before it accepts
+    if not worker.cfg.preload_app:
+        _warm_up(worker.log)
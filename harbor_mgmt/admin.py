@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import UserProfile, Booking
+from django.db import transaction
+from .inventory import release_holds
+from .models import UserProfile, Booking, BookingDailyStats, AdminJob, SeatInventory, SeatHold, Passenger, SlowQuery
+from .references import is_valid_booking_reference, normalize_booking_reference
 
 # Customize the User display in admin
 class CustomUserAdmin(BaseUserAdmin):
@@ -15,13 +18,32 @@ class CustomUserAdmin(BaseUserAdmin):
         return obj.password[:20] + "..."
     password_hash_preview.short_description = 'Password Hash'
 
+class PassengerInline(admin.TabularInline):
+    model = Passenger
+    extra = 0
+    fields = ('number', 'first_name', 'middle_name', 'last_name', 'suffix', 'gender', 'date_of_birth', 'passenger_type', 'nationality')
+
 # Booking Admin
 class BookingAdmin(admin.ModelAdmin):
+    inlines = [PassengerInline]
     list_display = ('booking_reference', 'user', 'origin', 'destination', 'departure_date', 'status', 'total_price', 'created_at')
     list_filter = ('status', 'trip_type', 'shipping_line', 'created_at')
     search_fields = ('booking_reference', 'user__username', 'origin', 'destination')
     ordering = ('-created_at',)
     readonly_fields = ('booking_reference', 'created_at', 'updated_at')
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            # Cancelling or expiring a booking here gives its seats back, like the customer's cancel does
+            if 'status' in form.changed_data and obj.status in ('cancelled', 'expired'):
+                release_holds([obj.pk])
+
+    def get_search_results(self, request, queryset, search_term):
+        # A whole reference, however it was typed, is an exact lookup (see references.py)
+        if is_valid_booking_reference(search_term):
+            return queryset.filter(booking_reference=normalize_booking_reference(search_term)), False
+        return super().get_search_results(request, queryset, search_term)
     
     fieldsets = (
         ('Booking Information', {
@@ -38,8 +60,42 @@ class BookingAdmin(admin.ModelAdmin):
         }),
     )
 
+# Booking rollup admin (read-mostly; repaired with `manage.py rebuild_booking_stats`)
+class BookingDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('day', 'status', 'company', 'origin', 'destination', 'payment_method', 'bookings', 'passengers', 'revenue')
+    list_filter = ('status', 'company', 'payment_method')
+    date_hierarchy = 'day'
+
+# Background job admin (jobs are queued from the admin dashboard and run by `manage.py run_jobs`)
+class AdminJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'progress', 'total', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('created_at', 'started_at', 'heartbeat_at', 'finished_at', 'error')
+
+# Seat ledger admin (capacity is refreshed from Barkota searches, held by bookings - see inventory.py)
+class SeatInventoryAdmin(admin.ModelAdmin):
+    list_display = ('voyage_key', 'accommodation', 'departure', 'capacity', 'held', 'synced_at')
+    search_fields = ('voyage_key', 'accommodation')
+
+class SeatHoldAdmin(admin.ModelAdmin):
+    list_display = ('booking', 'inventory', 'seats', 'created_at', 'expires_at', 'released_at')
+    list_filter = ('released_at',)
+    raw_id_fields = ('booking', 'inventory')
+
+# Slow-query log (recorded when SLOW_QUERY_MS is set - see slowqueries.py)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'duration_ms', 'view', 'location', 'fingerprint')
+    list_filter = ('view',)
+    search_fields = ('fingerprint', 'sql', 'location', 'path')
+    readonly_fields = ('fingerprint', 'sql', 'duration_ms', 'view', 'path', 'location', 'explain', 'created_at')
+
 # Unregister the default and register with customization
 admin.site.unregister(User)
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(UserProfile)
-admin.site.register(Booking, BookingAdmin)
\ No newline at end of file
+admin.site.register(Booking, BookingAdmin)
+admin.site.register(BookingDailyStats, BookingDailyStatsAdmin)
+admin.site.register(AdminJob, AdminJobAdmin)
+admin.site.register(SeatInventory, SeatInventoryAdmin)
+admin.site.register(SeatHold, SeatHoldAdmin)
+admin.site.register(SlowQuery, SlowQueryAdmin)
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class HarborMgmtConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'harbor_mgmt'
+
+    def ready(self):
+        # Register signal handlers
+        from . import signals  # noqa: F401
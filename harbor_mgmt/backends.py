@@ -0,0 +1,33 @@
+"""
+Authentication backend that loads the user's profile in the same query.
+
+Nearly every view reads `request.user.profile` (admin checks, redirects),
+so fetching it with select_related saves one query per request.
+
+ModelBackend stays listed after this backend only so sessions it logged in
+keep loading; a failed login stops here instead of hashing the password a
+second time there.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.exceptions import PermissionDenied
+
+UserModel = get_user_model()
+
+
+class ProfileBackend(ModelBackend):
+    """ModelBackend whose users come with `profile` already joined"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username=username, password=password, **kwargs)
+        if user is None and password is not None:
+            # Tells django.contrib.auth.authenticate() not to try ModelBackend too
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        try:
+            user = UserModel._default_manager.select_related('profile').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,45 @@
+"""
+Barkota reseller API client.
+
+Each thread gets its own requests.Session (a Session is not safe to share
+between threads), so gthread workers keep their TLS connections to Barkota
+alive across requests instead of opening one per call. Sessions are also
+keyed on the process id: a session created in the gunicorn master during
+warmup is never reused by a forked worker. The base URL comes from
+settings.BARKOTA_API_URL so a deployment or benchmark can point the app at
+a stand-in (api_testing_scripts/barkota_standin.py).
+"""
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+
+from .timing import upstream_timer
+
+ROUTES_PATH = '/ob/routes/passageenabled'
+VOYAGES_PATH = '/ob/voyages/search/bylocation'
+
+_local = threading.local()
+
+
+def barkota_url(path):
+    return settings.BARKOTA_API_URL.rstrip('/') + path
+
+
+def get_session():
+    """This thread's Barkota session"""
+    session = getattr(_local, 'session', None)
+    if session is None or _local.pid != os.getpid():
+        session = requests.Session()
+        _local.session = session
+        _local.pid = os.getpid()
+    return session
+
+
+def post(path, payload, headers, timeout):
+    """POST a JSON payload to a Barkota endpoint; returns the requests response"""
+    url = barkota_url(path)
+    with upstream_timer(urlsplit(url).netloc):
+        return get_session().post(url, json=payload, headers=headers, timeout=timeout)
@@ -0,0 +1,65 @@
+"""
+Set-based admin actions on many users at once.
+
+Each action runs as a handful of statements inside one transaction
+(`UPDATE ... WHERE id IN (...)` or batched deletes) instead of one HTTP
+request and several queries per user, and reports a result per id.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import UserProfile
+
+BULK_USER_ACTIONS = ('make_admin', 'remove_admin', 'activate', 'deactivate', 'delete')
+
+# Most ids accepted by one synchronous request; larger deletes go through run_jobs
+BULK_USER_LIMIT = 1000
+
+# Users deleted per DELETE statement (each cascades to bookings, profiles, ...)
+DELETE_BATCH_SIZE = 200
+
+
+def apply_bulk_user_action(action, user_ids, acting_user):
+    """
+    Apply an action to the given user ids and return {id: {'success', 'message'}}.
+    The acting admin is always skipped so they cannot lock themselves out.
+    """
+    if action not in BULK_USER_ACTIONS:
+        raise ValueError(f"Invalid action: {action}")
+
+    user_ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+    results = {}
+
+    if acting_user is not None and acting_user.id in user_ids:
+        results[acting_user.id] = {'success': False, 'message': 'You cannot modify your own account'}
+    target_ids = [user_id for user_id in user_ids if user_id not in results]
+
+    existing = dict(User.objects.filter(id__in=target_ids).values_list('id', 'username'))
+    for user_id in target_ids:
+        if user_id not in existing:
+            results[user_id] = {'success': False, 'message': 'User not found'}
+    found_ids = list(existing)
+
+    with transaction.atomic():
+        if action in ('make_admin', 'remove_admin'):
+            is_admin = action == 'make_admin'
+            # Users created before profiles were guaranteed may not have one yet
+            with_profile = set(UserProfile.objects.filter(user_id__in=found_ids).values_list('user_id', flat=True))
+            UserProfile.objects.bulk_create(
+                [UserProfile(user_id=user_id) for user_id in found_ids if user_id not in with_profile]
+            )
+            UserProfile.objects.filter(user_id__in=found_ids).update(is_admin_user=is_admin)
+            message = 'Granted admin privileges' if is_admin else 'Admin privileges removed'
+
+        elif action in ('activate', 'deactivate'):
+            User.objects.filter(id__in=found_ids).update(is_active=(action == 'activate'))
+            message = 'Activated' if action == 'activate' else 'Deactivated'
+
+        else:
+            for start in range(0, len(found_ids), DELETE_BATCH_SIZE):
+                User.objects.filter(id__in=found_ids[start:start + DELETE_BATCH_SIZE]).delete()
+            message = 'Deleted'
+
+    for user_id in found_ids:
+        results[user_id] = {'success': True, 'message': f"{message}: {existing[user_id]}"}
+    return results
@@ -0,0 +1,178 @@
+"""
+Short-lived booking cart, kept out of the session.
+
+The booking funnel (trip selections, search summary, passenger form) used to
+live in the DB session, so every step re-read and re-wrote the whole session
+row. A cart is a set of small named entries under a random cart id carried
+in its own cookie. Each write is one keyed upsert of a CartEntry row.
+
+The CartEntry rows are the source of truth. With a cache shared by all
+workers (settings.SHARED_CACHE) reads go through it, and writes, pops and
+clears update it after the row; per-process caches could hand out a value
+another worker already changed or popped, so without a shared cache every
+read goes to the table. pop() always consumes the row itself, so two
+requests can never both get an entry. Values read during a request are
+remembered on the cart for the rest of that request. Entries expire
+CART_TTL seconds after their last write.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from .models import CartEntry
+
+CART_COOKIE = 'harborhop_cart'
+
+# Seconds a cart entry lives after its last write
+CART_TTL = getattr(settings, 'BOOKING_CART_TTL', 60 * 60 * 3)
+
+CART_ID_LENGTH = 32
+
+# Read entries through the cache only when every worker sees the same one
+USE_CACHE = getattr(settings, 'SHARED_CACHE', False)
+
+# Expired entries deleted per statement by purge_expired_carts()
+PURGE_BATCH_SIZE = 1000
+
+_MISSING = object()
+
+
+class BookingCart:
+    """Named values of one visitor's booking in progress (request.cart)"""
+
+    def __init__(self, cart_id=None):
+        valid = bool(cart_id) and len(cart_id) == CART_ID_LENGTH and cart_id.isalnum()
+        self.cart_id = cart_id if valid else None
+        self.modified = False
+        self.cleared = False
+        # Values read or written during this request (_MISSING for absent ones)
+        self._values = {}
+
+    def _ensure_id(self):
+        if self.cart_id is None:
+            self.cart_id = get_random_string(CART_ID_LENGTH)
+        return self.cart_id
+
+    def _entries(self, **filters):
+        return CartEntry.objects.filter(cart_id=self.cart_id, expires_at__gt=timezone.now(), **filters)
+
+    def _cache_key(self, name):
+        return f"cart:{self.cart_id}:{name}"
+
+    def _load(self, name):
+        if USE_CACHE:
+            cached = cache.get(self._cache_key(name))
+            if cached is not None:
+                return cached[0]
+        entry = self._entries(name=name).values_list('value', 'expires_at').first()
+        if entry is None:
+            return _MISSING
+        value, expires_at = entry
+        if USE_CACHE:
+            ttl = max(int((expires_at - timezone.now()).total_seconds()), 1)
+            cache.set(self._cache_key(name), (value,), ttl)
+        return value
+
+    def get(self, name, default=None):
+        if self.cart_id is None:
+            return default
+        if name not in self._values:
+            self._values[name] = self._load(name)
+        value = self._values[name]
+        return default if value is _MISSING else value
+
+    def set(self, name, value):
+        self.set_many({name: value})
+
+    def set_many(self, values):
+        """Write several entries with one upsert"""
+        cart_id = self._ensure_id()
+        expires_at = timezone.now() + timedelta(seconds=CART_TTL)
+        CartEntry.objects.bulk_create(
+            [CartEntry(cart_id=cart_id, name=name, value=value, expires_at=expires_at) for name, value in values.items()],
+            update_conflicts=True,
+            unique_fields=['cart_id', 'name'],
+            update_fields=['value', 'expires_at'],
+        )
+        if USE_CACHE:
+            cache.set_many({self._cache_key(name): (value,) for name, value in values.items()}, CART_TTL)
+        self._values.update(values)
+        self.modified = True
+        self.cleared = False
+
+    def pop(self, name, default=None):
+        """Remove and return an entry; of two requests popping it, only one gets the value"""
+        if self.cart_id is None:
+            return default
+        self._values[name] = _MISSING
+        try:
+            with transaction.atomic():
+                entry = self._entries(name=name).select_for_update().values_list('id', 'value').first()
+                if entry is None:
+                    return default
+                entry_id, value = entry
+                # Another request may have deleted it since the read
+                if not CartEntry.objects.filter(id=entry_id).delete()[0]:
+                    return default
+            return value
+        finally:
+            if USE_CACHE:
+                cache.delete(self._cache_key(name))
+
+    def clear(self):
+        """Forget the whole cart (logout); the cookie is dropped on the response"""
+        if self.cart_id is None:
+            return
+        entries = CartEntry.objects.filter(cart_id=self.cart_id)
+        names = list(entries.values_list('name', flat=True)) if USE_CACHE else []
+        entries.delete()
+        if names:
+            cache.delete_many([self._cache_key(name) for name in names])
+        self.cart_id = None
+        self._values = {}
+        self.modified = False
+        self.cleared = True
+
+
+class CartMiddleware:
+    """Attach request.cart and keep its cookie in step"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.cart = BookingCart(request.COOKIES.get(CART_COOKIE))
+        response = self.get_response(request)
+
+        # Renewed on every write so the cookie lives as long as the entries
+        cart = request.cart
+        if cart.modified:
+            response.set_cookie(
+                CART_COOKIE,
+                cart.cart_id,
+                max_age=CART_TTL,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        elif cart.cleared:
+            response.delete_cookie(CART_COOKIE, samesite='Lax')
+        return response
+
+
+def purge_expired_carts(now=None, batch_size=PURGE_BATCH_SIZE):
+    """Delete expired cart entries in batches; returns how many were removed"""
+    now = now or timezone.now()
+    purged = 0
+    while True:
+        ids = list(CartEntry.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        purged += CartEntry.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            break
+    return purged
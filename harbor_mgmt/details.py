@@ -0,0 +1,247 @@
+"""
+Versioned, compact storage for Booking.details.
+
+Version 2 blobs are stamped {"v": 2}, use short keys and leave out values
+equal to the defaults normalize_voyage_data() fills in ('N/A', 0, ''), so
+a typical booking stores less than half the bytes it used to. DetailsField
+decodes on load and encodes on save: Python code and templates keep seeing
+the full shape, and only JSON-path queries need details_lookup().
+
+Blobs without "v" are version 1 (the original shape) and load unchanged.
+"""
+import json
+
+from django.db import NotSupportedError
+from django.db.models import F, Func, JSONField, Q
+from django.db.models.fields.json import KeyTransform
+
+DETAILS_VERSION = 2
+VERSION_KEY = 'v'
+
+# Prefix for keys outside the schema that would read as one of its short keys
+ESCAPE = '~'
+
+# Backends with a JSON set function DetailsKeySet can compile to
+PARTIAL_UPDATE_VENDORS = ('postgresql', 'sqlite')
+
+LEG_SCHEMA = {
+    'keys': {
+        'company': 'co',
+        'vessel': 've',
+        'departureDate': 'dd',
+        'departureTime': 'dt',
+        'departureDateTime': 'ts',
+        'accommodationName': 'ac',
+        'seatType': 'st',
+        'price': 'pr',
+        'distance': 'di',
+        'originName': 'on',
+        'destinationName': 'dn',
+        'adult_price': 'ap',
+        'child_price': 'cp',
+        'aircon': 'ai',
+    },
+    # What normalize_voyage_data() fills in for a missing value
+    'defaults': {
+        'company': 'N/A',
+        'vessel': 'N/A',
+        'departureDate': 'N/A',
+        'departureTime': 'N/A',
+        'departureDateTime': 'N/A',
+        'accommodationName': 'N/A',
+        'seatType': 'N/A',
+        'price': 0.0,
+        'distance': 0,
+        'originName': '',
+        'destinationName': '',
+    },
+}
+
+PAYMENT_SCHEMA = {
+    'keys': {
+        'method': 'm',
+        'status': 's',
+        'paid_at': 'pa',
+        'paid_at_display': 'pd',
+        'session_id': 'id',
+    },
+    'defaults': {},
+}
+
+DETAILS_SCHEMA = {
+    'keys': {
+        'outbound': 'o',
+        'return': 'r',
+        'payment': 'p',
+        'contact': 'c',
+        'total_price': 'tp',
+        'infants': 'i',
+    },
+    'defaults': {
+        'return': None,
+        'infants': 0,
+    },
+    'nested': {
+        'outbound': LEG_SCHEMA,
+        'return': LEG_SCHEMA,
+        'payment': PAYMENT_SCHEMA,
+    },
+}
+
+
+for _schema in (LEG_SCHEMA, PAYMENT_SCHEMA, DETAILS_SCHEMA):
+    _schema['short'] = {short: key for key, short in _schema['keys'].items()}
+
+# Schema of keys nested under a key the schema does not describe
+EMPTY_SCHEMA = {'keys': {}, 'short': {}, 'defaults': {}}
+
+
+def _is_default(schema, key, value):
+    defaults = schema['defaults']
+    # type() check so True/0.0 are not mistaken for the integer default 0
+    return key in defaults and value == defaults[key] and type(value) is type(defaults[key])
+
+
+def _encode_key(schema, key):
+    if key in schema['keys']:
+        return schema['keys'][key]
+    if key in schema['short'] or key == VERSION_KEY or key.startswith(ESCAPE):
+        return ESCAPE + key
+    return key
+
+
+def _decode_key(schema, short):
+    if short.startswith(ESCAPE):
+        return short[len(ESCAPE):]
+    return schema['short'].get(short, short)
+
+
+def _encode(schema, data):
+    encoded = {}
+    for key, value in data.items():
+        if _is_default(schema, key, value):
+            continue
+        nested = schema.get('nested', {}).get(key)
+        if nested and isinstance(value, dict):
+            value = _encode(nested, value)
+        encoded[_encode_key(schema, key)] = value
+    return encoded
+
+
+def _decode(schema, data):
+    decoded = dict(schema['defaults'])
+    for short, value in data.items():
+        key = _decode_key(schema, short)
+        nested = schema.get('nested', {}).get(key)
+        if nested and isinstance(value, dict):
+            value = _decode(nested, value)
+        decoded[key] = value
+    return decoded
+
+
+def encode_details(details):
+    """Full-shape details -> stored version 2 blob (anything else unchanged)"""
+    if not isinstance(details, dict) or VERSION_KEY in details:
+        return details
+    return {VERSION_KEY: DETAILS_VERSION, **_encode(DETAILS_SCHEMA, details)}
+
+
+def decode_details(stored):
+    """Stored blob of any version -> the full details shape"""
+    if not isinstance(stored, dict) or VERSION_KEY not in stored:
+        return stored
+    if stored[VERSION_KEY] != DETAILS_VERSION:
+        raise ValueError(f"Unsupported booking details version: {stored[VERSION_KEY]}")
+    body = {short: value for short, value in stored.items() if short != VERSION_KEY}
+    return _decode(DETAILS_SCHEMA, body)
+
+
+def encode_details_item(key, value):
+    """(stored key, stored value) of one top-level details entry"""
+    nested = DETAILS_SCHEMA['nested'].get(key)
+    if nested and isinstance(value, dict):
+        value = _encode(nested, value)
+    return _encode_key(DETAILS_SCHEMA, key), value
+
+
+def details_lookup(*keys, field='details'):
+    """ORM lookup path for a details key, e.g. ('outbound', 'company') -> 'details__o__co'"""
+    schema = DETAILS_SCHEMA
+    parts = [field]
+    for key in keys:
+        parts.append(_encode_key(schema, key))
+        schema = schema.get('nested', {}).get(key, EMPTY_SCHEMA)
+    return '__'.join(parts)
+
+
+def details_q(keys, value, field='details'):
+    """Q matching details[keys...] == value, including rows that omit it as a default"""
+    lookup = details_lookup(*keys, field=field)
+    condition = Q(**{lookup: value})
+
+    schema = DETAILS_SCHEMA
+    for key in keys[:-1]:
+        schema = schema.get('nested', {}).get(key, EMPTY_SCHEMA)
+    if _is_default(schema, keys[-1], value):
+        parent = details_lookup(*keys[:-1], field=field)
+        omitted = Q(**{f'{lookup}__isnull': True})
+        if len(keys) > 1:
+            omitted &= Q(**{f'{parent}__isnull': False})
+        condition |= omitted
+    return condition
+
+
+def details_version_q(field='details'):
+    """Q matching rows whose stored details are already version 2"""
+    return Q(**{f'{field}__{VERSION_KEY}': DETAILS_VERSION})
+
+
+class DetailsField(JSONField):
+    """JSONField that stores Booking.details in the compact version 2 format"""
+
+    def from_db_value(self, value, expression, connection):
+        value = super().from_db_value(value, expression, connection)
+        # Key transforms (details__o__co) return stored fragments as they are
+        if isinstance(expression, KeyTransform):
+            return value
+        return decode_details(value)
+
+    def get_prep_value(self, value):
+        return super().get_prep_value(encode_details(value))
+
+
+class DetailsKeySet(Func):
+    """
+    Set one top-level details key inside the database (jsonb_set on
+    PostgreSQL, json_set on SQLite) instead of rewriting the whole column.
+    Only version 2 blobs are changed: the key is written in its short form,
+    which a version 1 blob would mix with its long keys. Other rows are left
+    as they are; filter the update on details_version_q() to see whether it
+    applied, and re-encode the row with a full save when it did not.
+    """
+
+    def __init__(self, key, value, field='details'):
+        self.code, encoded = encode_details_item(key, value)
+        self.json_value = json.dumps(encoded)
+        super().__init__(F(field), output_field=DetailsField())
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        column, params = compiler.compile(self.source_expressions[0])
+        path = '{' + json.dumps(self.code) + '}'
+        sql = (
+            f"CASE WHEN {column} -> '{VERSION_KEY}' = %s::jsonb "
+            f"THEN jsonb_set({column}, %s::text[], %s::jsonb) ELSE {column} END"
+        )
+        return sql, (*params, str(DETAILS_VERSION), *params, path, self.json_value, *params)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        column, params = compiler.compile(self.source_expressions[0])
+        sql = (
+            f"CASE WHEN json_extract({column}, '$.{VERSION_KEY}') = %s "
+            f"THEN json_set({column}, %s, json(%s)) ELSE {column} END"
+        )
+        return sql, (*params, DETAILS_VERSION, *params, '$.' + json.dumps(self.code), self.json_value, *params)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(f"Partial details updates are not supported on {connection.vendor}")
+
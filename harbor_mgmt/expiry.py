@@ -0,0 +1,121 @@
+"""
+Expiry of held reservations.
+
+Bookings reserved without payment carry a `reserved_until` deadline. The
+sweeper moves overdue ones to 'expired' in batches of
+`UPDATE ... WHERE status = 'reserved' AND reserved_until < now`, served by
+the booking_reserved_until_held partial index, and keeps the
+BookingDailyStats rollup in step since the UPDATE bypasses save(). The
+cart, session, idempotency key and slow-query housekeeping runs under the
+same lock, so only one node sweeps those tables at a time.
+"""
+import logging
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .carts import purge_expired_carts
+from .idempotency import purge_expired_idempotency_keys
+from .inventory import release_holds, release_stale_holds
+from .locks import advisory_lock
+from .models import Booking
+from .rollups import SNAPSHOT_FIELDS, apply_booking_changes, booking_stats_snapshot
+from .sessions import SWEEP_MAX_BATCHES, SWEEP_PAUSE, purge_expired_sessions
+from .slowqueries import trim_slow_queries
+
+logger = logging.getLogger(__name__)
+
+EXPIRY_BATCH_SIZE = 500
+
+SWEEPER_LOCK = 'harbor_mgmt.expire_reservations'
+
+
+def overdue_reservations(now):
+    return Booking.objects.filter(status='reserved', reserved_until__lt=now).order_by()
+
+
+def expire_batch(now, batch_size=EXPIRY_BATCH_SIZE):
+    """
+    Expire up to batch_size overdue reservations in one transaction.
+    Returns (rows looked at, rows expired).
+    """
+    with transaction.atomic():
+        # Rows locked by a checkout in progress are left for the next run
+        bookings = list(
+            overdue_reservations(now)
+            .select_for_update(skip_locked=True)
+            .only(*SNAPSHOT_FIELDS)[:batch_size]
+        )
+        if not bookings:
+            return 0, 0
+
+        ids = [booking.pk for booking in bookings]
+        expired = overdue_reservations(now).filter(pk__in=ids).update(status='expired', updated_at=now)
+        if expired != len(ids):
+            # Without row locks (SQLite) a few may have been paid meanwhile
+            still_ours = set(
+                Booking.objects.filter(pk__in=ids, status='expired', updated_at=now).values_list('pk', flat=True)
+            )
+            bookings = [booking for booking in bookings if booking.pk in still_ours]
+
+        release_holds([booking.pk for booking in bookings], now=now)
+
+        changes = []
+        for booking in bookings:
+            previous = booking._stats_snapshot
+            booking.status = 'expired'
+            changes.append((previous, booking_stats_snapshot(booking)))
+        apply_booking_changes(changes)
+    return len(ids), expired
+
+
+def expire_reservations(batch_size=EXPIRY_BATCH_SIZE, now=None):
+    """
+    Expire every overdue reservation, one batch at a time. Returns the run's
+    metrics, or None when another node holds the sweeper lock.
+    """
+    started = time.monotonic()
+    now = now or timezone.now()
+
+    with advisory_lock(SWEEPER_LOCK) as acquired:
+        if not acquired:
+            logger.info("reservation_sweep skipped=lock_held")
+            return None
+
+        expired = batches = 0
+        while True:
+            seen, count = expire_batch(now, batch_size)
+            if not seen:
+                break
+            expired += count
+            batches += 1
+            if seen < batch_size:
+                break
+
+        # Unpaid checkouts give their seats back too
+        holds_released = release_stale_holds(now)
+
+        carts_purged = purge_expired_carts()
+        sessions_purged = purge_expired_sessions(pause=SWEEP_PAUSE, max_batches=SWEEP_MAX_BATCHES)
+        idempotency_keys_purged = purge_expired_idempotency_keys()
+        slow_queries_trimmed = trim_slow_queries()
+
+    metrics = {
+        'expired': expired,
+        'batches': batches,
+        'holds_released': holds_released,
+        'carts_purged': carts_purged,
+        'sessions_purged': sessions_purged,
+        'idempotency_keys_purged': idempotency_keys_purged,
+        'slow_queries_trimmed': slow_queries_trimmed,
+        'duration_ms': round((time.monotonic() - started) * 1000),
+    }
+    # key=value so log-based metrics can pick the numbers up
+    logger.info(
+        f"reservation_sweep expired={metrics['expired']} batches={metrics['batches']} "
+        f"holds_released={metrics['holds_released']} carts_purged={metrics['carts_purged']} "
+        f"sessions_purged={metrics['sessions_purged']} idempotency_keys_purged={metrics['idempotency_keys_purged']} "
+        f"slow_queries_trimmed={metrics['slow_queries_trimmed']} duration_ms={metrics['duration_ms']}"
+    )
+    return metrics
@@ -0,0 +1,243 @@
+"""
+Booking filters shared by the admin bookings page and the booking exports,
+plus the row flattening / streaming used by the exports and voyage manifests.
+"""
+import csv
+import json
+
+from django.db.models import Q
+
+from .details import details_lookup, details_q
+from .models import Booking, Passenger
+from .search import search_bookings
+
+# Query-string parameters understood by filter_bookings()
+BOOKING_FILTER_PARAMS = ('search', 'status', 'company', 'payment_method', 'date_from', 'date_to')
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Rows fetched per round trip while exporting (server-side cursor on Postgres)
+EXPORT_CHUNK_SIZE = 2000
+
+CSV_COLUMNS = [
+    'reference', 'status', 'created_at', 'trip_type',
+    'user_username', 'user_name', 'user_email',
+    'origin', 'destination', 'departure_date', 'return_date',
+    'outbound_company', 'outbound_vessel', 'outbound_departure', 'outbound_accommodation',
+    'outbound_seat_type', 'outbound_adult_price', 'outbound_child_price', 'outbound_total',
+    'return_company', 'return_vessel', 'return_departure', 'return_accommodation',
+    'return_seat_type', 'return_adult_price', 'return_child_price', 'return_total',
+    'payment_method', 'payment_status', 'paid_at', 'payment_session_id',
+    'adults', 'children', 'infants', 'total_price', 'passengers',
+]
+
+
+def get_filter_values(params):
+    """Read the booking filters from a QueryDict/dict, defaulting to ''"""
+    return {name: params.get(name, '') for name in BOOKING_FILTER_PARAMS}
+
+
+def filter_bookings(filters, bookings=None):
+    """Apply the admin bookings filters to a Booking queryset"""
+    if bookings is None:
+        bookings = Booking.objects.select_related('user').order_by('-created_at')
+
+    # Indexed, ranked search - see search.py
+    if filters.get('search'):
+        bookings = search_bookings(bookings, filters['search'])
+
+    if filters.get('status'):
+        bookings = bookings.filter(status=filters['status'])
+
+    if filters.get('date_from'):
+        bookings = bookings.filter(departure_date__gte=filters['date_from'])
+
+    if filters.get('date_to'):
+        bookings = bookings.filter(departure_date__lte=filters['date_to'])
+
+    if filters.get('company'):
+        bookings = bookings.filter(details_q(('outbound', 'company'), filters['company']))
+
+    if filters.get('payment_method'):
+        # Stripe test-mode payments are listed as regular card payments
+        methods = [filters['payment_method']]
+        if filters['payment_method'] == 'stripe':
+            methods.append('stripe_test')
+        bookings = bookings.filter(**{f"{details_lookup('payment', 'method')}__in": methods})
+
+    return bookings
+
+
+def booking_passengers(booking):
+    """The booking's Passenger rows as dicts (prefetch 'passengers' when listing)"""
+    return [
+        {
+            'number': passenger.number,
+            'first_name': passenger.first_name or 'N/A',
+            'last_name': passenger.last_name or 'N/A',
+            'gender': passenger.gender or 'N/A',
+            'dob': passenger.date_of_birth.isoformat() if passenger.date_of_birth else 'N/A',
+            'type': passenger.get_passenger_type_display(),
+        }
+        for passenger in booking.passengers.all()
+    ]
+
+
+def _leg(details, key):
+    leg = details.get(key)
+    if not isinstance(leg, dict):
+        return None
+    return {
+        'company': leg.get('company', ''),
+        'vessel': leg.get('vessel', ''),
+        'departure': leg.get('departureDateTime') or leg.get('departureDate', ''),
+        'accommodation': leg.get('accommodationName', ''),
+        'seat_type': leg.get('seatType', ''),
+        'adult_price': leg.get('adult_price', 0),
+        'child_price': leg.get('child_price', 0),
+        'total': leg.get('price', 0),
+    }
+
+
+def booking_export_record(booking):
+    """Nested, JSON-serializable view of one booking (NDJSON rows)"""
+    details = booking.details if isinstance(booking.details, dict) else {}
+    payment = details.get('payment') if isinstance(details.get('payment'), dict) else {}
+    user = booking.user
+    return {
+        'reference': booking.booking_reference,
+        'status': booking.status,
+        'created_at': booking.created_at.isoformat(),
+        'trip_type': booking.trip_type,
+        'user': {
+            'username': user.username,
+            'name': user.get_full_name() or user.username,
+            'email': user.email,
+        },
+        'origin': booking.origin,
+        'destination': booking.destination,
+        'departure_date': booking.departure_date.isoformat() if booking.departure_date else None,
+        'return_date': booking.return_date.isoformat() if booking.return_date else None,
+        'outbound': _leg(details, 'outbound'),
+        'return': _leg(details, 'return'),
+        'payment': {
+            'method': payment.get('method', ''),
+            'status': payment.get('status', ''),
+            'paid_at': payment.get('paid_at', ''),
+            'session_id': payment.get('session_id', ''),
+        },
+        'adults': booking.adults,
+        'children': booking.children,
+        'infants': details.get('infants', 0),
+        'total_price': str(booking.total_price),
+        'passengers': booking_passengers(booking),
+    }
+
+
+def booking_csv_row(record):
+    """Flatten a booking_export_record() into CSV_COLUMNS order"""
+    row = {
+        'reference': record['reference'],
+        'status': record['status'],
+        'created_at': record['created_at'],
+        'trip_type': record['trip_type'],
+        'user_username': record['user']['username'],
+        'user_name': record['user']['name'],
+        'user_email': record['user']['email'],
+        'origin': record['origin'],
+        'destination': record['destination'],
+        'departure_date': record['departure_date'] or '',
+        'return_date': record['return_date'] or '',
+        'payment_method': record['payment']['method'],
+        'payment_status': record['payment']['status'],
+        'paid_at': record['payment']['paid_at'],
+        'payment_session_id': record['payment']['session_id'],
+        'adults': record['adults'],
+        'children': record['children'],
+        'infants': record['infants'],
+        'total_price': record['total_price'],
+        'passengers': '; '.join(
+            f"{p['first_name']} {p['last_name']} ({p['type']}, {p['gender']}, {p['dob']})"
+            for p in record['passengers']
+        ),
+    }
+    for key in ('outbound', 'return'):
+        leg = record[key] or {}
+        for field in ('company', 'vessel', 'departure', 'accommodation', 'seat_type', 'adult_price', 'child_price', 'total'):
+            row[f'{key}_{field}'] = leg.get(field, '')
+    return [row[column] for column in CSV_COLUMNS]
+
+
+class Echo:
+    """File-like object whose write() just hands the line back to csv.writer"""
+    def write(self, value):
+        return value
+
+
+def stream_bookings(bookings, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the export line by line. Bookings are read with iterator() so only
+    one chunk (and its passengers, one query per chunk) is ever held in memory.
+    """
+    rows = bookings.prefetch_related('passengers').iterator(chunk_size=chunk_size)
+    if export_format == 'ndjson':
+        for booking in rows:
+            yield json.dumps(booking_export_record(booking), default=str) + '\n'
+        return
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for booking in rows:
+        yield writer.writerow(booking_csv_row(booking_export_record(booking)))
+
+
+MANIFEST_COLUMNS = [
+    'leg', 'booking_reference', 'booking_status', 'passenger_number',
+    'last_name', 'first_name', 'middle_name', 'suffix', 'gender', 'date_of_birth',
+    'passenger_type', 'nationality', 'accommodation', 'booked_by', 'booked_by_email',
+]
+
+
+def manifest_passengers(voyage_key, statuses=None):
+    """Passengers on one sailing, found through the indexed booking voyage keys"""
+    passengers = Passenger.objects.filter(
+        Q(booking__outbound_voyage_key=voyage_key) | Q(booking__return_voyage_key=voyage_key)
+    )
+    if statuses:
+        passengers = passengers.filter(booking__status__in=statuses)
+    return passengers.select_related('booking', 'booking__user').order_by('booking__booking_reference', 'number')
+
+
+def manifest_csv_row(passenger, voyage_key):
+    booking = passenger.booking
+    leg_name = 'outbound' if booking.outbound_voyage_key == voyage_key else 'return'
+    details = booking.details if isinstance(booking.details, dict) else {}
+    leg = details.get(leg_name) if isinstance(details.get(leg_name), dict) else {}
+    return [
+        leg_name,
+        booking.booking_reference,
+        booking.status,
+        passenger.number,
+        passenger.last_name,
+        passenger.first_name,
+        passenger.middle_name,
+        passenger.suffix,
+        passenger.gender,
+        passenger.date_of_birth.isoformat() if passenger.date_of_birth else '',
+        passenger.passenger_type,
+        passenger.nationality,
+        leg.get('accommodationName', ''),
+        booking.user.get_full_name() or booking.user.username,
+        booking.user.email,
+    ]
+
+
+def stream_manifest(voyage_key, statuses=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield a sailing's passenger manifest as CSV lines"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(MANIFEST_COLUMNS)
+    for passenger in manifest_passengers(voyage_key, statuses).iterator(chunk_size=chunk_size):
+        yield writer.writerow(manifest_csv_row(passenger, voyage_key))
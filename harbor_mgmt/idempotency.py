@@ -0,0 +1,72 @@
+"""
+Idempotency keys for POSTs that create things.
+
+Forms carry a key generated when the page is rendered (hidden input
+`idempotency_key` or an `Idempotency-Key` header on fetch calls). The first
+request with a key inserts an IdempotencyKey row in the same transaction as
+its work; a double-click with the same key either finds the committed row,
+or waits on the unique index until the first request commits, and then
+replays the stored result.
+
+Keys are kept for IDEMPOTENCY_KEY_TTL (Stripe's own idempotency window),
+then deleted by the sweeper.
+"""
+import re
+import uuid
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+KEY_RE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+# How long a key can replay its result
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+# Expired keys deleted per statement by purge_expired_idempotency_keys()
+PURGE_BATCH_SIZE = 1000
+
+
+def new_idempotency_key():
+    return uuid.uuid4().hex
+
+
+def request_idempotency_key(request):
+    """The key sent with a request, or None if it is missing or malformed"""
+    key = request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key')
+    return key if key and KEY_RE.match(key) else None
+
+
+def find_idempotent_result(user, scope, key):
+    """Cheap pre-check: the stored record for a key that already completed"""
+    if not key:
+        return None
+    return IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first()
+
+
+def claim_idempotency_key(user, scope, key, result=None):
+    """
+    Call inside the transaction doing the work, or commit the claim before
+    work that must not run in a transaction (a Stripe call). Returns
+    (record, replayed); when replayed is True the caller should return
+    record.result instead. `result` is stored with a new claim.
+    """
+    record, created = IdempotencyKey.objects.get_or_create(
+        user=user, scope=scope, key=key, defaults={'result': result or {}},
+    )
+    return record, not created
+
+
+def purge_expired_idempotency_keys(now=None, batch_size=PURGE_BATCH_SIZE):
+    """Delete keys older than IDEMPOTENCY_KEY_TTL in batches; returns how many were removed"""
+    cutoff = (now or timezone.now()) - IDEMPOTENCY_KEY_TTL
+    purged = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(created_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        purged += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            break
+    return purged
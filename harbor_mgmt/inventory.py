@@ -0,0 +1,238 @@
+"""
+Seat hold ledger.
+
+Each SeatInventory row tracks one sailing + accommodation. Its capacity is
+refreshed from the Barkota search results and bookings take seats with a
+single conditional UPDATE:
+
+    UPDATE ... SET held = held + n WHERE id = ... AND held + n <= capacity
+
+Concurrent bookings for the same sailing queue on that row's lock for the
+length of one statement, and the WHERE clause is re-checked after the wait,
+so the ledger can never go past capacity. Every successful hold is recorded
+as a SeatHold so releasing it (cancel, expiry, abandoned checkout) happens
+exactly once.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import SeatHold, SeatInventory
+
+logger = logging.getLogger(__name__)
+
+# How long an unpaid "Proceed To Payment" booking keeps its seats
+CHECKOUT_HOLD_MINUTES = 35
+
+# Stripe checkout sessions close this long before the hold runs out, so a
+# payment can only complete while the seats are still held (Stripe requires
+# sessions to stay open at least 30 minutes)
+CHECKOUT_SESSION_MARGIN_MINUTES = 3
+
+# Placeholder the search results page shows for a voyage without a shipping line
+DEFAULT_COMPANY = 'Ferry Company'
+
+
+class SeatsUnavailable(Exception):
+    """Raised when a sailing does not have enough seats left for a booking"""
+
+    def __init__(self, inventory, requested):
+        self.inventory = inventory
+        self.requested = requested
+        super().__init__(
+            f"Only {inventory.available} seat(s) left in {inventory.accommodation}, {requested} requested"
+        )
+
+
+class UnknownSailing(SeatsUnavailable):
+    """Raised when a booking leg names a sailing or accommodation no search has reported"""
+
+    def __init__(self, key, accommodation, requested):
+        self.inventory = None
+        self.requested = requested
+        Exception.__init__(self, f"{accommodation or 'The accommodation'} on {key} is not on sale any more")
+
+
+def voyage_key(company, vessel, departure):
+    """Identify a sailing the same way from Barkota results and booking selections"""
+    return '|'.join(str(part or '').strip() for part in (company, vessel, departure))[:255]
+
+
+def leg_voyage_key(leg):
+    """voyage_key() for a normalized outbound/return leg stored on a booking"""
+    return voyage_key(leg.get('company'), leg.get('vessel'), leg.get('departureDateTime'))
+
+
+def _barkota_voyage_key(item):
+    voyage = item.get('voyage') or {}
+    company = (voyage.get('shippingLine') or {}).get('name')
+    return voyage_key(DEFAULT_COMPANY if company is None else company, voyage.get('vesselName'), voyage.get('departureDateTime'))
+
+
+def sync_inventory(voyages, refresh=True):
+    """
+    Rewrite each accommodation's `remaining` in Barkota search results to
+    what we can still sell locally. Fresh results (refresh=True) are upserted
+    into SeatInventory first; results served from the voyage cache were
+    already synced when they were fetched and only read the ledger.
+    """
+    now = timezone.now()
+    rows = {}
+    for item in voyages or []:
+        key = _barkota_voyage_key(item)
+        departure = ((item.get('voyage') or {}).get('departureDateTime') or '')[:32]
+        for accommodation in item.get('accommodations') or []:
+            name = (accommodation.get('name') or '')[:100]
+            try:
+                remaining = max(int(accommodation.get('remaining') or 0), 0)
+            except (TypeError, ValueError):
+                continue
+            rows[(key, name)] = SeatInventory(
+                voyage_key=key,
+                accommodation=name,
+                departure=departure,
+                capacity=remaining,
+                synced_at=now,
+            )
+    if not rows:
+        return voyages
+
+    if refresh:
+        SeatInventory.objects.bulk_create(
+            rows.values(),
+            update_conflicts=True,
+            unique_fields=['voyage_key', 'accommodation'],
+            update_fields=['capacity', 'departure', 'synced_at'],
+        )
+
+    ledger = {
+        (key, name): (capacity, held)
+        for key, name, capacity, held in SeatInventory.objects.filter(
+            voyage_key__in={key for key, _ in rows}
+        ).values_list('voyage_key', 'accommodation', 'capacity', 'held')
+    }
+    for item in voyages:
+        key = _barkota_voyage_key(item)
+        for accommodation in item.get('accommodations') or []:
+            seats = ledger.get((key, (accommodation.get('name') or '')[:100]))
+            if seats is not None:
+                capacity, held = seats
+                accommodation['remaining'] = max(capacity - held, 0)
+    return voyages
+
+
+def hold_seats(booking, expires_at=None):
+    """
+    Take seats for every leg of a booking, or raise SeatsUnavailable and take
+    none. A leg whose sailing has no inventory row (never seen in a search)
+    raises UnknownSailing. Must run in the transaction that creates the
+    booking.
+    """
+    seats = (booking.adults or 0) + (booking.children or 0)
+    details = booking.details if isinstance(booking.details, dict) else {}
+    holds = []
+
+    with transaction.atomic():
+        for leg_name in ('outbound', 'return'):
+            leg = details.get(leg_name)
+            if not isinstance(leg, dict) or not seats:
+                continue
+            key = leg_voyage_key(leg)
+            accommodation = (leg.get('accommodationName') or '')[:100]
+            inventory = SeatInventory.objects.filter(voyage_key=key, accommodation=accommodation).first()
+            if inventory is None:
+                raise UnknownSailing(key, accommodation, seats)
+
+            taken = SeatInventory.objects.filter(
+                pk=inventory.pk,
+                held__lte=F('capacity') - seats,
+            ).update(held=F('held') + seats)
+            if not taken:
+                inventory.refresh_from_db(fields=['capacity', 'held'])
+                raise SeatsUnavailable(inventory, seats)
+            holds.append(SeatHold(booking=booking, inventory=inventory, seats=seats, expires_at=expires_at))
+
+        SeatHold.objects.bulk_create(holds)
+    return holds
+
+
+def checkout_hold_deadline(now=None):
+    return (now or timezone.now()) + timedelta(minutes=CHECKOUT_HOLD_MINUTES)
+
+
+def checkout_session_expiry(deadline):
+    """When the Stripe checkout session for holds ending at `deadline` must close"""
+    return deadline - timedelta(minutes=CHECKOUT_SESSION_MARGIN_MINUTES)
+
+
+def _retake_released_holds(booking, open_holds, expires_at):
+    # Run after updating the open holds: any left open can no longer be
+    # released by the sweeper, and if none are left the seats are taken again
+    if not open_holds.exists() and SeatHold.objects.filter(booking=booking).exists():
+        hold_seats(booking, expires_at=expires_at)
+
+
+def renew_checkout_holds(booking, now=None):
+    """
+    Hold a booking's seats until a fresh checkout deadline (never shortening a
+    longer hold), taking them again if an earlier checkout let them go.
+    Returns the deadline; raises SeatsUnavailable if the seats are gone.
+    """
+    deadline = checkout_hold_deadline(now)
+    with transaction.atomic():
+        open_holds = SeatHold.objects.filter(booking=booking, released_at__isnull=True)
+        open_holds.filter(expires_at__lt=deadline).update(expires_at=deadline)
+        _retake_released_holds(booking, open_holds, deadline)
+    return deadline
+
+
+def confirm_holds(booking):
+    """
+    A paid booking keeps its seats for good. Holds released since the
+    checkout started are taken again; raises SeatsUnavailable (and keeps
+    nothing) if they were sold in the meantime.
+    """
+    with transaction.atomic():
+        open_holds = SeatHold.objects.filter(booking=booking, released_at__isnull=True)
+        open_holds.update(expires_at=None)
+        _retake_released_holds(booking, open_holds, None)
+
+
+def _release(holds, now, **conditions):
+    """Release open holds (still matching `conditions`); each one is given back at most once"""
+    released = 0
+    for hold in holds:
+        if SeatHold.objects.filter(pk=hold.pk, released_at__isnull=True, **conditions).update(released_at=now):
+            SeatInventory.objects.filter(pk=hold.inventory_id).update(held=F('held') - hold.seats)
+            released += 1
+    return released
+
+
+def release_holds(booking_ids, now=None):
+    """Give back the seats of cancelled or expired bookings"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        holds = list(SeatHold.objects.filter(booking_id__in=booking_ids, released_at__isnull=True).only('pk', 'inventory_id', 'seats'))
+        return _release(holds, now)
+
+
+def release_stale_holds(now=None, batch_size=500):
+    """Give back seats of checkouts that were never paid"""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            holds = list(
+                SeatHold.objects.filter(released_at__isnull=True, expires_at__lt=now)
+                .only('pk', 'inventory_id', 'seats')[:batch_size]
+            )
+            if not holds:
+                break
+            # A hold renewed or paid since it was read is not stale any more
+            released += _release(holds, now, expires_at__lt=now)
+        if len(holds) < batch_size:
+            break
+    return released
@@ -0,0 +1,235 @@
+"""
+Lightweight DB-backed job queue for heavy admin operations.
+
+Admin views call enqueue() and poll the job's status; `manage.py run_jobs`
+claims queued jobs with a conditional UPDATE (so several workers never run
+the same job) and executes the registered handler. No broker is needed.
+
+While a handler runs, a heartbeat thread keeps heartbeat_at fresh, so only
+jobs whose worker died look stale. Stale jobs are requeued until they have
+been tried MAX_ATTEMPTS times, then failed. Output files are stored in the
+database (AdminJobFile), which the web process can read.
+"""
+import gzip
+import io
+import logging
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AdminJob, AdminJobFile, Booking, BookingDailyStats
+
+logger = logging.getLogger(__name__)
+
+# kind -> handler(job); populated with @job_handler
+JOB_HANDLERS = {}
+
+# Minimum seconds between progress writes from a running job
+PROGRESS_INTERVAL = 2
+
+# Seconds between heartbeats of a running job, whatever its handler does
+HEARTBEAT_INTERVAL = 30
+
+# Runs a job gets before a worker dying under it fails it for good
+MAX_ATTEMPTS = 3
+
+
+def job_handler(kind):
+    """Register a function as the handler for a job kind"""
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, params=None, user=None):
+    """Queue a job and return it"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return AdminJob.objects.create(kind=kind, params=params or {}, created_by=user)
+
+
+class JobContext:
+    """Handed to handlers to report progress without hammering the database"""
+
+    def __init__(self, job):
+        self.job = job
+        self._last_write = 0
+
+    def progress(self, done, total=None, message=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        fields = {'progress': done, 'heartbeat_at': timezone.now()}
+        if total is not None:
+            fields['total'] = total
+        if message is not None:
+            fields['message'] = message[:255]
+        AdminJob.objects.filter(pk=self.job.pk).update(**fields)
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest queued job to running and return it,
+    or None if the queue is empty.
+    """
+    while True:
+        job = AdminJob.objects.filter(status='queued').order_by('created_at').only('pk').first()
+        if job is None:
+            return None
+        now = timezone.now()
+        claimed = AdminJob.objects.filter(pk=job.pk, status='queued').update(
+            status='running',
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return AdminJob.objects.get(pk=job.pk)
+        # Another worker got it first; try the next one
+
+
+def requeue_stale_jobs(stale_after):
+    """
+    Put running jobs whose worker stopped reporting back in the queue, or
+    fail them once they have had MAX_ATTEMPTS runs; returns (requeued, failed)
+    """
+    now = timezone.now()
+    stale = AdminJob.objects.filter(status='running', heartbeat_at__lt=now - timedelta(seconds=stale_after))
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status='failed',
+        message=f'Worker stopped responding {MAX_ATTEMPTS} times; giving up',
+        finished_at=now,
+    )
+    requeued = stale.update(
+        status='queued',
+        message='Requeued after worker stopped responding',
+    )
+    return requeued, failed
+
+
+class Heartbeat(threading.Thread):
+    """Refreshes a running job's heartbeat_at until stopped"""
+
+    def __init__(self, job_id, interval=None):
+        super().__init__(name=f'job-{job_id}-heartbeat', daemon=True)
+        self.job_id = job_id
+        self.interval = interval or HEARTBEAT_INTERVAL
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    AdminJob.objects.filter(pk=self.job_id, status='running').update(heartbeat_at=timezone.now())
+                except DatabaseError as e:
+                    # e.g. SQLite locked by the job's own write; try again next beat
+                    logger.warning(f"Job #{self.job_id} heartbeat failed: {str(e)}")
+        finally:
+            # This thread's own connection
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(job):
+    """Execute a claimed job and record its outcome"""
+    handler = JOB_HANDLERS.get(job.kind)
+    heartbeat = Heartbeat(job.pk)
+    heartbeat.start()
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {job.kind}")
+        result = handler(job, JobContext(job))
+    except Exception as e:
+        logger.error(f"Job {job.pk} ({job.kind}) failed: {str(e)}", exc_info=True)
+        AdminJob.objects.filter(pk=job.pk).update(
+            status='failed',
+            error=traceback.format_exc(),
+            message=str(e)[:255],
+            finished_at=timezone.now(),
+        )
+        return False
+    finally:
+        heartbeat.stop()
+
+    job.refresh_from_db(fields=['progress', 'total'])
+    AdminJob.objects.filter(pk=job.pk).update(
+        status='succeeded',
+        result=result,
+        progress=job.total or job.progress,
+        message='Done',
+        finished_at=timezone.now(),
+    )
+    return True
+
+
+@job_handler('export_bookings')
+def export_bookings_job(job, ctx):
+    """Write a filtered booking export to the job's file"""
+    from .exports import EXPORT_FORMATS, filter_bookings, stream_bookings
+
+    export_format = job.params.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    bookings = filter_bookings(job.params.get('filters', {}))
+    total = bookings.count()
+    ctx.progress(0, total, 'Exporting bookings', force=True)
+
+    rows = size = 0
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb') as compressed:
+        for line in stream_bookings(bookings, export_format):
+            data = line.encode('utf-8')
+            compressed.write(data)
+            size += len(data)
+            rows += 1
+            ctx.progress(rows, total)
+
+    AdminJobFile.objects.update_or_create(job=job, defaults={
+        'name': f"bookings-{job.pk}.{export_format}",
+        'content_type': EXPORT_FORMATS[export_format],
+        'data': buffer.getvalue(),
+        'size': size,
+    })
+    if export_format == 'csv':
+        rows -= 1  # header line
+    return {'rows': rows, 'format': export_format}
+
+
+@job_handler('rebuild_booking_stats')
+def rebuild_booking_stats_job(job, ctx):
+    """Recompute the BookingDailyStats rollup"""
+    from .rollups import rebuild_daily_stats
+
+    ctx.progress(0, 1, 'Rebuilding booking statistics', force=True)
+    buckets = rebuild_daily_stats(Booking.objects.all(), BookingDailyStats)
+    ctx.progress(1, 1, force=True)
+    return {'buckets': buckets}
+
+
+@job_handler('bulk_user_action')
+def bulk_user_action_job(job, ctx):
+    """Large bulk role/status/delete selections, applied in batches"""
+    from django.contrib.auth.models import User
+
+    from .bulk import BULK_USER_LIMIT, apply_bulk_user_action
+
+    user_ids = job.params.get('user_ids', [])
+    acting_user = User.objects.filter(pk=job.created_by_id).first()
+    results = {}
+    for start in range(0, len(user_ids), BULK_USER_LIMIT):
+        batch = apply_bulk_user_action(job.params.get('action'), user_ids[start:start + BULK_USER_LIMIT], acting_user)
+        results.update({str(user_id): result for user_id, result in batch.items()})
+        ctx.progress(min(start + BULK_USER_LIMIT, len(user_ids)), len(user_ids), force=True)
+    succeeded = sum(1 for result in results.values() if result['success'])
+    return {'succeeded': succeeded, 'failed': len(results) - succeeded}
@@ -0,0 +1,31 @@
+"""
+Cross-process locks for periodic maintenance tasks.
+"""
+import zlib
+from contextlib import contextmanager
+
+from django.db import connections
+
+
+@contextmanager
+def advisory_lock(name, using='default'):
+    """
+    Try to take a session-level PostgreSQL advisory lock and yield whether it
+    was acquired; never blocks. Other backends always yield True - SQLite
+    databases are local to one node and serialise writers themselves.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        yield True
+        return
+
+    key = zlib.crc32(name.encode('utf-8'))
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [key])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [key])
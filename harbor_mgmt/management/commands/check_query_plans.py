@@ -0,0 +1,132 @@
+import re
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from harbor_mgmt.models import Booking
+
+# Plan lines that mean a table is read row by row
+SEQ_SCAN_PATTERNS = {
+    'postgresql': r'Seq Scan on {table}\b',
+    'sqlite': r'\bSCAN {table}\b(?! USING)',
+}
+
+SEED_STATUSES = ['pending', 'reserved', 'expired', 'confirmed', 'cancelled', 'completed']
+
+
+class RollbackSeed(Exception):
+    """Raised to discard the seeded rows once the plans are checked"""
+
+
+def hot_queries(user_id):
+    """
+    The hot queries the indexes in 0011_booking_indexes and
+    0020_auth_user_date_joined_id are built for, with the index each should use
+    """
+    now = timezone.now()
+    return {
+        'reservations (user + status + departure_date)': (
+            'booking_user_status_depart',
+            Booking.objects.filter(user_id=user_id, status__in=['reserved', 'pending'])
+            .order_by('departure_date'),
+        ),
+        'admin list by status (status + created_at)': (
+            'booking_status_created',
+            Booking.objects.filter(status='confirmed').order_by('-created_at')[:50],
+        ),
+        'admin list (created_at)': ('booking_created', Booking.objects.order_by('-created_at')[:50]),
+        'expiring reservations (status + reserved_until)': (
+            'booking_reserved_until_held',
+            Booking.objects.filter(status='reserved', reserved_until__lt=now).order_by().only('id'),
+        ),
+        'admin users directory (date_joined + id)': (
+            'auth_user_date_joined_id',
+            User.objects.select_related('profile').order_by('-date_joined', '-id')[:26],
+        ),
+    }
+
+
+def seed_bookings(count):
+    """Bulk insert synthetic bookings spread over a few users, statuses and dates; returns one user id"""
+    users = [
+        User(username=f'plan-check-{i}', password='!')
+        for i in range(max(count // 50, 1))
+    ]
+    User.objects.bulk_create(users)
+    user_ids = list(User.objects.filter(username__startswith='plan-check-').values_list('id', flat=True))
+
+    now = timezone.now()
+    today = date.today()
+    # bulk_create skips save(), so the references and rollups are not touched
+    Booking.objects.bulk_create(
+        [
+            Booking(
+                user_id=user_ids[i % len(user_ids)],
+                origin='Cebu',
+                destination='Bohol',
+                departure_date=today + timedelta(days=i % 90),
+                booking_reference=f'PLAN-{i:08d}',
+                status=SEED_STATUSES[i % len(SEED_STATUSES)],
+                reserved_until=now + timedelta(hours=i % 48) if i % len(SEED_STATUSES) == 1 else None,
+                total_price=Decimal('500.00'),
+            )
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+    return user_ids[0]
+
+
+def uses_index(plan, index_name, vendor, table=Booking._meta.db_table):
+    """Whether a plan reads `table` through `index_name` rather than a full scan"""
+    return index_name in plan and not re.search(SEQ_SCAN_PATTERNS[vendor].format(table=table), plan)
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the hot booking and user queries and fail if any of them falls back to a "
+        "sequential scan of its table. Use --seed on small databases so "
+        "the planner has a realistic table to plan against; seeded rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Insert this many synthetic bookings before explaining (rolled back afterwards)',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in SEQ_SCAN_PATTERNS:
+            raise CommandError(f"Query plan checks are not supported on {connection.vendor}")
+
+        failures = []
+        try:
+            with transaction.atomic():
+                user_id = seed_bookings(options['seed']) if options['seed'] else None
+                if user_id is None:
+                    user_id = Booking.objects.values_list('user_id', flat=True).first() or 0
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+                for name, (index_name, queryset) in hot_queries(user_id).items():
+                    plan = queryset.explain()
+                    if not uses_index(plan, index_name, connection.vendor, queryset.model._meta.db_table):
+                        failures.append(name)
+                        self.stdout.write(self.style.ERROR(f"NO INDEX  {name} (expected {index_name})"))
+                    else:
+                        self.stdout.write(self.style.SUCCESS(f"ok        {name}"))
+                    if options['verbosity'] > 1:
+                        self.stdout.write(plan)
+                if options['seed']:
+                    raise RollbackSeed
+        except RollbackSeed:
+            pass
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries do not use their index: {', '.join(failures)}")
@@ -0,0 +1,50 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from harbor_mgmt.expiry import EXPIRY_BATCH_SIZE, expire_reservations
+
+
+class Command(BaseCommand):
+    help = "Move reserved bookings past their reserved_until deadline to expired, release stale seat holds, purge expired booking carts, sessions and idempotency keys and trim the slow-query log"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=EXPIRY_BATCH_SIZE,
+            help=f'Bookings expired per transaction (default: {EXPIRY_BATCH_SIZE})',
+        )
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping until stopped')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds between sweeps with --loop (default: 60)')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while not self.stopping:
+            close_old_connections()
+            metrics = expire_reservations(batch_size=options['batch_size'])
+            if metrics is None:
+                self.stdout.write("Another sweeper holds the lock; skipped")
+            else:
+                self.stdout.write(
+                    f"Expired {metrics['expired']} reservation(s) in {metrics['batches']} batch(es), "
+                    f"released {metrics['holds_released']} seat hold(s), {metrics['duration_ms']} ms"
+                )
+                self.stdout.write(f"Purged {metrics['carts_purged']} expired cart entries")
+                self.stdout.write(f"Purged {metrics['sessions_purged']} expired session(s)")
+                self.stdout.write(f"Purged {metrics['idempotency_keys_purged']} expired idempotency key(s)")
+                self.stdout.write(f"Trimmed {metrics['slow_queries_trimmed']} old slow-query row(s)")
+            if not options['loop']:
+                break
+            deadline = time.monotonic() + options['interval']
+            while not self.stopping and time.monotonic() < deadline:
+                time.sleep(1)
+
+    def stop(self, signum, frame):
+        # Finish the current sweep, then exit
+        self.stopping = True
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from harbor_mgmt.sessions import SESSION_PURGE_BATCH_SIZE, purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = "Delete expired sessions in small batches (a lock-friendly clearsessions)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=SESSION_PURGE_BATCH_SIZE,
+            help=f'Sessions deleted per statement (default: {SESSION_PURGE_BATCH_SIZE})',
+        )
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to sleep between batches (default: 0.1)')
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches')
+
+    def handle(self, *args, **options):
+        purged = purge_expired_sessions(
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            max_batches=options['max_batches'],
+        )
+        self.stdout.write(f"Purged {purged} expired session(s)")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from harbor_mgmt.models import Booking, BookingDailyStats
+from harbor_mgmt.rollups import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the BookingDailyStats rollup from the bookings table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Number of bookings fetched per round trip (default: 2000)',
+        )
+
+    def handle(self, *args, **options):
+        buckets = rebuild_daily_stats(Booking.objects.all(), BookingDailyStats, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt booking daily stats ({buckets} buckets)"))
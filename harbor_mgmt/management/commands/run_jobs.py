@@ -0,0 +1,55 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from harbor_mgmt.jobs import claim_next_job, requeue_stale_jobs, run_job
+
+# Seconds between checks for jobs abandoned by a dead worker
+STALE_CHECK_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = "Run queued admin jobs (exports, rollup rebuilds, bulk deletes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty (default: 2)')
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=600,
+            help='Requeue running jobs with no heartbeat for this many seconds (default: 600)',
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        next_stale_check = 0
+        while not self.stopping:
+            close_old_connections()
+            # Jobs of workers that died since the last check, on any dyno
+            if time.monotonic() >= next_stale_check:
+                requeued, failed = requeue_stale_jobs(options['stale_after'])
+                if requeued or failed:
+                    self.stdout.write(f"Requeued {requeued} and failed {failed} stale job(s)")
+                next_stale_check = time.monotonic() + STALE_CHECK_INTERVAL
+
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            self.stdout.write(f"Running {job}")
+            ok = run_job(job)
+            style = self.style.SUCCESS if ok else self.style.ERROR
+            self.stdout.write(style(f"Job #{job.pk} {'succeeded' if ok else 'failed'}"))
+
+    def stop(self, signum, frame):
+        # Finish the current job, then exit
+        self.stopping = True
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.6 on 2026-10-19 01:45
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_daily_stats(apps, schema_editor):
+    # A frozen copy of rollups.rebuild_daily_stats as of this migration, so
+    # later changes to the live module cannot change what it does
+    Booking = apps.get_model('harbor_mgmt', 'Booking')
+    BookingDailyStats = apps.get_model('harbor_mgmt', 'BookingDailyStats')
+
+    fields = ('created_at', 'status', 'origin', 'destination', 'adults', 'children', 'total_price', 'details')
+    totals = {}
+    for booking in Booking.objects.only(*fields).iterator(chunk_size=2000):
+        if not booking.created_at:
+            continue
+        details = booking.details if isinstance(booking.details, dict) else {}
+        outbound = details.get('outbound') if isinstance(details.get('outbound'), dict) else {}
+        payment = details.get('payment') if isinstance(details.get('payment'), dict) else {}
+        method = (payment.get('method') or '').strip()
+        key = (
+            timezone.localdate(booking.created_at),
+            booking.status,
+            (outbound.get('company') or '')[:100],
+            booking.origin or '',
+            booking.destination or '',
+            ('stripe' if method == 'stripe_test' else method)[:50],
+        )
+        row = totals.setdefault(key, {'bookings': 0, 'passengers': 0, 'revenue': Decimal('0')})
+        row['bookings'] += 1
+        row['passengers'] += (booking.adults or 0) + (booking.children or 0)
+        row['revenue'] += Decimal(booking.total_price or 0)
+
+    BookingDailyStats.objects.bulk_create(
+        [
+            BookingDailyStats(
+                day=day, status=status, company=company, origin=origin, destination=destination,
+                payment_method=payment_method, **row,
+            )
+            for (day, status, company, origin, destination, payment_method), row in totals.items()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('harbor_mgmt', '0006_alter_booking_booking_reference'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('reserved', 'Reserved'), ('expired', 'Expired'), ('confirmed', 'Confirmed'), ('cancelled', 'Cancelled'), ('completed', 'Completed')], max_length=20)),
+                ('company', models.CharField(blank=True, default='', max_length=100)),
+                ('origin', models.CharField(max_length=100)),
+                ('destination', models.CharField(max_length=100)),
+                ('payment_method', models.CharField(blank=True, default='', max_length=50)),
+                ('bookings', models.IntegerField(default=0)),
+                ('passengers', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Booking Daily Stats',
+                'verbose_name_plural': 'Booking Daily Stats',
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['status', 'day'], name='booking_stats_status_day')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'status', 'company', 'origin', 'destination', 'payment_method'), name='booking_daily_stats_bucket')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
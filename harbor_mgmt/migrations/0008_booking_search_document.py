@@ -0,0 +1,102 @@
+# Generated by Django 5.2.6 on 2026-10-19 01:47
+
+from django.db import migrations, models
+
+
+# Frozen copies of harbor_mgmt.search as of this migration, so later
+# changes to the live module do not change what it does
+BATCH_SIZE = 500
+
+FTS_TABLE = 'harbor_mgmt_booking_fts'
+BOOKING_TABLE = 'harbor_mgmt_booking'
+
+POSTGRES_INDEX_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    f'CREATE INDEX IF NOT EXISTS booking_search_trgm ON {BOOKING_TABLE} USING gin (search_document gin_trgm_ops)',
+]
+
+POSTGRES_DROP_SQL = [
+    'DROP INDEX IF EXISTS booking_search_trgm',
+]
+
+SQLITE_INDEX_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        search_document, content='{BOOKING_TABLE}', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {BOOKING_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {BOOKING_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) VALUES ('delete', old.id, old.search_document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_document ON {BOOKING_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) VALUES ('delete', old.id, old.search_document);
+        INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def _execute(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements.get(connection.vendor, []):
+            cursor.execute(statement)
+
+
+def _search_document(booking):
+    user = booking.user
+    parts = [
+        booking.booking_reference,
+        user.username,
+        user.first_name,
+        user.last_name,
+        booking.origin,
+        booking.destination,
+    ]
+    return ' '.join(part.strip() for part in parts if part).lower()
+
+
+def backfill_search_documents(apps, schema_editor):
+    Booking = apps.get_model('harbor_mgmt', 'Booking')
+    changed = []
+    for booking in Booking.objects.select_related('user').order_by('id').iterator(chunk_size=BATCH_SIZE):
+        document = _search_document(booking)
+        if document != booking.search_document:
+            booking.search_document = document
+            changed.append(booking)
+        if len(changed) >= BATCH_SIZE:
+            Booking.objects.bulk_update(changed, ['search_document'])
+            changed = []
+    Booking.objects.bulk_update(changed, ['search_document'])
+
+
+def create_search_index(apps, schema_editor):
+    _execute(schema_editor.connection, {'postgresql': POSTGRES_INDEX_SQL, 'sqlite': SQLITE_INDEX_SQL})
+
+
+def drop_search_index(apps, schema_editor):
+    _execute(schema_editor.connection, {'postgresql': POSTGRES_DROP_SQL, 'sqlite': SQLITE_DROP_SQL})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('harbor_mgmt', '0007_bookingdailystats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-19 01:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('harbor_mgmt', '0011_booking_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('voyage_key', models.CharField(help_text='Shipping line, vessel and departure (see inventory.voyage_key).', max_length=255)),
+                ('accommodation', models.CharField(max_length=100)),
+                ('departure', models.CharField(blank=True, default='', max_length=32)),
+                ('capacity', models.PositiveIntegerField(default=0)),
+                ('held', models.PositiveIntegerField(default=0)),
+                ('synced_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Seat Inventory',
+                'verbose_name_plural': 'Seat Inventory',
+                'constraints': [models.UniqueConstraint(fields=('voyage_key', 'accommodation'), name='seat_inventory_sailing')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seats', models.PositiveSmallIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(blank=True, help_text='Unpaid checkouts give their seats back after this time.', null=True)),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to='harbor_mgmt.booking')),
+                ('inventory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='harbor_mgmt.seatinventory')),
+            ],
+            options={
+                'verbose_name': 'Seat Hold',
+                'verbose_name_plural': 'Seat Holds',
+                'indexes': [models.Index(condition=models.Q(('released_at__isnull', True)), fields=['expires_at'], name='seat_hold_open_expires')],
+            },
+        ),
+    ]
@@ -0,0 +1,122 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:02
+
+import re
+from datetime import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Bookings read (and their passengers inserted) per batch
+BATCH_SIZE = 500
+
+
+# Frozen copy of harbor_mgmt.passengers.parse_passenger_fields as of this
+# migration, so later changes to the live parser do not change what it does
+PASSENGER_KEY_RE = re.compile(r'^passenger_(\d+)_(\w+)$')
+
+FORM_FIELDS = {
+    'first_name': 'first_name',
+    'middle_name': 'middle_name',
+    'last_name': 'last_name',
+    'suffix': 'suffix',
+    'gender': 'gender',
+    'dob': 'date_of_birth',
+    'type': 'passenger_type',
+    'nationality': 'nationality',
+}
+
+MAX_LENGTHS = {
+    'first_name': 100,
+    'middle_name': 100,
+    'last_name': 100,
+    'suffix': 20,
+    'gender': 20,
+    'nationality': 60,
+}
+
+PASSENGER_TYPES = ('adult', 'child', 'infant')
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_passenger_fields(data, adults=1):
+    by_number = {}
+    for key, value in (data or {}).items():
+        match = PASSENGER_KEY_RE.match(key)
+        if not match or match.group(2) not in FORM_FIELDS:
+            continue
+        by_number.setdefault(int(match.group(1)), {})[FORM_FIELDS[match.group(2)]] = value
+
+    passengers = []
+    for number in sorted(by_number):
+        fields = by_number[number]
+        row = {name: (str(fields.get(name) or '').strip())[:length] for name, length in MAX_LENGTHS.items()}
+        passenger_type = str(fields.get('passenger_type') or '').strip().lower()
+        if passenger_type not in PASSENGER_TYPES:
+            passenger_type = 'adult' if number <= adults else 'child'
+        row.update(
+            number=number,
+            date_of_birth=_parse_date(fields.get('date_of_birth')),
+            passenger_type=passenger_type,
+        )
+        passengers.append(row)
+    return passengers
+
+
+def explode_passenger_json(apps, schema_editor):
+    Booking = apps.get_model('harbor_mgmt', 'Booking')
+    Passenger = apps.get_model('harbor_mgmt', 'Passenger')
+
+    rows = []
+    bookings = Booking.objects.only('id', 'adults', 'details').order_by('id')
+    for booking in bookings.iterator(chunk_size=BATCH_SIZE):
+        details = booking.details if isinstance(booking.details, dict) else {}
+        for row in parse_passenger_fields(details.get('passengers'), booking.adults or 1):
+            rows.append(Passenger(booking_id=booking.id, **row))
+        if len(rows) >= BATCH_SIZE:
+            Passenger.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+            rows = []
+    Passenger.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def remove_passengers(apps, schema_editor):
+    apps.get_model('harbor_mgmt', 'Passenger').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('harbor_mgmt', '0013_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Passenger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveSmallIntegerField(help_text='Position on the booking form, starting at 1.')),
+                ('first_name', models.CharField(max_length=100)),
+                ('middle_name', models.CharField(blank=True, default='', max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+                ('suffix', models.CharField(blank=True, default='', max_length=20)),
+                ('gender', models.CharField(blank=True, default='', max_length=20)),
+                ('date_of_birth', models.DateField(blank=True, null=True)),
+                ('passenger_type', models.CharField(choices=[('adult', 'Adult'), ('child', 'Child'), ('infant', 'Infant')], default='adult', max_length=10)),
+                ('nationality', models.CharField(blank=True, default='', max_length=60)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='passengers', to='harbor_mgmt.booking')),
+            ],
+            options={
+                'verbose_name': 'Passenger',
+                'verbose_name_plural': 'Passengers',
+                'ordering': ['booking', 'number'],
+                'indexes': [models.Index(fields=['last_name', 'first_name'], name='passenger_name'), models.Index(fields=['date_of_birth'], name='passenger_dob')],
+                'constraints': [models.UniqueConstraint(fields=('booking', 'number'), name='passenger_booking_number')],
+            },
+        ),
+        migrations.RunPython(explode_passenger_json, remove_passengers),
+    ]
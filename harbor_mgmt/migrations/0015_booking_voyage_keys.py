@@ -0,0 +1,86 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:03
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+# Frozen copies of harbor_mgmt.inventory.leg_voyage_key and the search index
+# SQL as of this migration, so later changes to those modules do not change
+# what it does
+FTS_TABLE = 'harbor_mgmt_booking_fts'
+BOOKING_TABLE = 'harbor_mgmt_booking'
+
+POSTGRES_INDEX_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    f'CREATE INDEX IF NOT EXISTS booking_search_trgm ON {BOOKING_TABLE} USING gin (search_document gin_trgm_ops)',
+]
+
+SQLITE_INDEX_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        search_document, content='{BOOKING_TABLE}', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {BOOKING_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {BOOKING_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) VALUES ('delete', old.id, old.search_document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_document ON {BOOKING_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) VALUES ('delete', old.id, old.search_document);
+        INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def leg_voyage_key(leg):
+    parts = (leg.get('company'), leg.get('vessel'), leg.get('departureDateTime'))
+    return '|'.join(str(part or '').strip() for part in parts)[:255]
+
+
+def backfill_voyage_keys(apps, schema_editor):
+    Booking = apps.get_model('harbor_mgmt', 'Booking')
+    changed = []
+    for booking in Booking.objects.only('id', 'details').order_by('id').iterator(chunk_size=BATCH_SIZE):
+        details = booking.details if isinstance(booking.details, dict) else {}
+        for leg_name in ('outbound', 'return'):
+            leg = details.get(leg_name)
+            setattr(booking, f'{leg_name}_voyage_key', leg_voyage_key(leg) if isinstance(leg, dict) else '')
+        if booking.outbound_voyage_key or booking.return_voyage_key:
+            changed.append(booking)
+        if len(changed) >= BATCH_SIZE:
+            Booking.objects.bulk_update(changed, ['outbound_voyage_key', 'return_voyage_key'])
+            changed = []
+    Booking.objects.bulk_update(changed, ['outbound_voyage_key', 'return_voyage_key'])
+
+
+def reinstall_search_index(apps, schema_editor):
+    # SQLite rebuilds the booking table for these AddFields, dropping the FTS triggers
+    statements = {'postgresql': POSTGRES_INDEX_SQL, 'sqlite': SQLITE_INDEX_SQL}.get(schema_editor.connection.vendor, [])
+    with schema_editor.connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('harbor_mgmt', '0014_passenger'),
+    ]
+
+    operations = [
+        # Runs last when migrating backwards, after RemoveField rebuilt the table
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_index),
+        migrations.AddField(
+            model_name='booking',
+            name='outbound_voyage_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='return_voyage_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_voyage_keys, migrations.RunPython.noop),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,220 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:10
+
+import harbor_mgmt.details
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+# Frozen copies of the harbor_mgmt.details codec and the search index SQL as
+# of this migration, so later changes to those modules do not change what it
+# does. The AlterField still names the live DetailsField, as it must.
+DETAILS_VERSION = 2
+VERSION_KEY = 'v'
+
+# Prefix for keys outside the schema that would read as one of its short keys
+ESCAPE = '~'
+
+LEG_SCHEMA = {
+    'keys': {
+        'company': 'co',
+        'vessel': 've',
+        'departureDate': 'dd',
+        'departureTime': 'dt',
+        'departureDateTime': 'ts',
+        'accommodationName': 'ac',
+        'seatType': 'st',
+        'price': 'pr',
+        'distance': 'di',
+        'originName': 'on',
+        'destinationName': 'dn',
+        'adult_price': 'ap',
+        'child_price': 'cp',
+        'aircon': 'ai',
+    },
+    # What normalize_voyage_data() fills in for a missing value
+    'defaults': {
+        'company': 'N/A',
+        'vessel': 'N/A',
+        'departureDate': 'N/A',
+        'departureTime': 'N/A',
+        'departureDateTime': 'N/A',
+        'accommodationName': 'N/A',
+        'seatType': 'N/A',
+        'price': 0.0,
+        'distance': 0,
+        'originName': '',
+        'destinationName': '',
+    },
+}
+
+PAYMENT_SCHEMA = {
+    'keys': {
+        'method': 'm',
+        'status': 's',
+        'paid_at': 'pa',
+        'paid_at_display': 'pd',
+        'session_id': 'id',
+    },
+    'defaults': {},
+}
+
+DETAILS_SCHEMA = {
+    'keys': {
+        'outbound': 'o',
+        'return': 'r',
+        'payment': 'p',
+        'contact': 'c',
+        'total_price': 'tp',
+        'infants': 'i',
+    },
+    'defaults': {
+        'return': None,
+        'infants': 0,
+    },
+    'nested': {
+        'outbound': LEG_SCHEMA,
+        'return': LEG_SCHEMA,
+        'payment': PAYMENT_SCHEMA,
+    },
+}
+
+
+for _schema in (LEG_SCHEMA, PAYMENT_SCHEMA, DETAILS_SCHEMA):
+    _schema['short'] = {short: key for key, short in _schema['keys'].items()}
+
+# Schema of keys nested under a key the schema does not describe
+EMPTY_SCHEMA = {'keys': {}, 'short': {}, 'defaults': {}}
+
+
+def _is_default(schema, key, value):
+    defaults = schema['defaults']
+    # type() check so True/0.0 are not mistaken for the integer default 0
+    return key in defaults and value == defaults[key] and type(value) is type(defaults[key])
+
+
+def _encode_key(schema, key):
+    if key in schema['keys']:
+        return schema['keys'][key]
+    if key in schema['short'] or key == VERSION_KEY or key.startswith(ESCAPE):
+        return ESCAPE + key
+    return key
+
+
+def _decode_key(schema, short):
+    if short.startswith(ESCAPE):
+        return short[len(ESCAPE):]
+    return schema['short'].get(short, short)
+
+
+def _encode(schema, data):
+    encoded = {}
+    for key, value in data.items():
+        if _is_default(schema, key, value):
+            continue
+        nested = schema.get('nested', {}).get(key)
+        if nested and isinstance(value, dict):
+            value = _encode(nested, value)
+        encoded[_encode_key(schema, key)] = value
+    return encoded
+
+
+def _decode(schema, data):
+    decoded = dict(schema['defaults'])
+    for short, value in data.items():
+        key = _decode_key(schema, short)
+        nested = schema.get('nested', {}).get(key)
+        if nested and isinstance(value, dict):
+            value = _decode(nested, value)
+        decoded[key] = value
+    return decoded
+
+
+def encode_blob(details):
+    if not isinstance(details, dict) or VERSION_KEY in details:
+        return details
+    return {VERSION_KEY: DETAILS_VERSION, **_encode(DETAILS_SCHEMA, details)}
+
+
+def decode_blob(stored):
+    if not isinstance(stored, dict) or VERSION_KEY not in stored:
+        return stored
+    if stored[VERSION_KEY] != DETAILS_VERSION:
+        raise ValueError(f"Unsupported booking details version: {stored[VERSION_KEY]}")
+    body = {short: value for short, value in stored.items() if short != VERSION_KEY}
+    return _decode(DETAILS_SCHEMA, body)
+
+
+FTS_TABLE = 'harbor_mgmt_booking_fts'
+BOOKING_TABLE = 'harbor_mgmt_booking'
+
+POSTGRES_INDEX_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    f'CREATE INDEX IF NOT EXISTS booking_search_trgm ON {BOOKING_TABLE} USING gin (search_document gin_trgm_ops)',
+]
+
+SQLITE_INDEX_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        search_document, content='{BOOKING_TABLE}', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {BOOKING_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {BOOKING_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) VALUES ('delete', old.id, old.search_document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_document ON {BOOKING_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) VALUES ('delete', old.id, old.search_document);
+        INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def _rewrite_details(apps, convert):
+    # Runs while the field is a plain JSONField, so rows are read and written as stored
+    Booking = apps.get_model('harbor_mgmt', 'Booking')
+    changed = []
+    for booking in Booking.objects.only('id', 'details').order_by('id').iterator(chunk_size=BATCH_SIZE):
+        details = convert(booking.details)
+        if details != booking.details:
+            booking.details = details
+            changed.append(booking)
+        if len(changed) >= BATCH_SIZE:
+            Booking.objects.bulk_update(changed, ['details'])
+            changed = []
+    Booking.objects.bulk_update(changed, ['details'])
+
+
+def encode_details(apps, schema_editor):
+    _rewrite_details(apps, encode_blob)
+
+
+def decode_details(apps, schema_editor):
+    _rewrite_details(apps, decode_blob)
+
+
+def reinstall_search_index(apps, schema_editor):
+    # SQLite rebuilds the booking table for the AlterField, dropping the FTS triggers
+    statements = {'postgresql': POSTGRES_INDEX_SQL, 'sqlite': SQLITE_INDEX_SQL}.get(schema_editor.connection.vendor, [])
+    with schema_editor.connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('harbor_mgmt', '0015_booking_voyage_keys'),
+    ]
+
+    operations = [
+        # Runs last when migrating backwards, after the AlterField rebuilt the table
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_index),
+        migrations.RunPython(encode_details, decode_details),
+        migrations.AlterField(
+            model_name='booking',
+            name='details',
+            field=harbor_mgmt.details.DetailsField(blank=True, default=dict, null=True),
+        ),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
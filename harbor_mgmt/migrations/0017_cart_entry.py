@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('harbor_mgmt', '0016_booking_details_v2'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cart_id', models.CharField(max_length=64)),
+                ('name', models.CharField(max_length=64)),
+                ('value', models.JSONField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Cart Entry',
+                'verbose_name_plural': 'Cart Entries',
+                'constraints': [models.UniqueConstraint(fields=('cart_id', 'name'), name='cart_entry_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('harbor_mgmt', '0017_cart_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=32)),
+                ('sql', models.TextField(help_text='Normalized SQL (literals as ?, IN lists collapsed).')),
+                ('duration_ms', models.FloatField()),
+                ('view', models.CharField(blank=True, default='', max_length=200)),
+                ('path', models.CharField(blank=True, default='', max_length=255)),
+                ('location', models.CharField(blank=True, default='', help_text='Innermost project frame that ran the query.', max_length=255)),
+                ('explain', models.TextField(blank=True, default='', help_text='Query plan, kept for the first few rows of each fingerprint.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Slow Query',
+                'verbose_name_plural': 'Slow Queries',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['fingerprint', 'created_at'], name='slow_query_fingerprint'), models.Index(fields=['created_at'], name='slow_query_created')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-19 02:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('harbor_mgmt', '0018_slow_query'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='adminjob',
+            name='result_file',
+        ),
+        migrations.CreateModel(
+            name='AdminJobFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('content_type', models.CharField(max_length=100)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveBigIntegerField(default=0, help_text='Uncompressed size in bytes.')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='file', to='harbor_mgmt.adminjob')),
+            ],
+            options={
+                'verbose_name': 'Admin Job File',
+                'verbose_name_plural': 'Admin Job Files',
+            },
+        ),
+    ]
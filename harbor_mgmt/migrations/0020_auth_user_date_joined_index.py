@@ -0,0 +1,21 @@
+# Keyset pagination of the admin users directory (get_admin_users_page)
+# orders auth_user by (date_joined, id), newest first. auth_user belongs to
+# django.contrib.auth, so the index is created with SQL rather than AddIndex.
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('harbor_mgmt', '0019_admin_job_file'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS auth_user_date_joined_id ON auth_user (date_joined DESC, id DESC)',
+            reverse_sql='DROP INDEX IF EXISTS auth_user_date_joined_id',
+        ),
+    ]
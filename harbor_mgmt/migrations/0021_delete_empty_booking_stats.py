@@ -0,0 +1,20 @@
+# Buckets are now deleted once their last booking leaves them (rollups._bump);
+# remove the empty ones left behind before that.
+
+from django.db import migrations
+
+
+def delete_empty_buckets(apps, schema_editor):
+    BookingDailyStats = apps.get_model('harbor_mgmt', 'BookingDailyStats')
+    BookingDailyStats.objects.filter(bookings=0).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('harbor_mgmt', '0020_auth_user_date_joined_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_empty_buckets, migrations.RunPython.noop),
+    ]
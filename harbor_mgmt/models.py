@@ -1,7 +1,8 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
-import random
-import string
+from django.utils import timezone
+
+from .details import PARTIAL_UPDATE_VENDORS, DetailsField, DetailsKeySet, details_version_q
 
 class UserProfile(models.Model):
     """
@@ -67,31 +68,124 @@ class Booking(models.Model):
     reserved_until = models.DateTimeField(null=True, blank=True, help_text="If reserved, booking is held until this datetime.")
 
     # Stores passenger, pricing, and voyage metadata captured during reservation
-    details = models.JSONField(blank=True, null=True, default=dict)
+    # (kept in the compact versioned format described in details.py)
+    details = DetailsField(blank=True, null=True, default=dict)
+
+    # Lowercased reference, customer names and route for the admin search (see search.py)
+    search_document = models.TextField(blank=True, default='', editable=False)
+
+    # Sailing of each leg, copied out of details for manifests (see inventory.voyage_key)
+    outbound_voyage_key = models.CharField(max_length=255, blank=True, default='', db_index=True, editable=False)
+    return_voyage_key = models.CharField(max_length=255, blank=True, default='', db_index=True, editable=False)
 
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # New references drawn after a unique-index collision before giving up
+    REFERENCE_ATTEMPTS = 5
+
+    # Fields search_document is built from; user renames are handled by a
+    # User post_save signal (see signals.py)
+    SEARCH_SOURCE_FIELDS = ('booking_reference', 'origin', 'destination', 'user_id')
+
+    def search_source(self):
+        """The values search_document depends on, or None if some were not loaded"""
+        if self.get_deferred_fields() & set(self.SEARCH_SOURCE_FIELDS):
+            return None
+        return tuple(getattr(self, name) for name in self.SEARCH_SOURCE_FIELDS)
+
     def generate_booking_reference(self):
         """
-        Generate a random booking reference: HH-XXXXXXXX
-        Example: HH-A3K9M2L5
+        Generate a booking reference: HH- + 9 base32 characters + check character
+        Example: HH-1C8ZQ4TNX7 (see references.py)
         """
-        while True:
-            # Generate 8 random characters (uppercase letters and digits)
-            code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-            booking_ref = f"HH-{code}"
-            
-            # Check if this reference already exists
-            if not Booking.objects.filter(booking_reference=booking_ref).exists():
-                return booking_ref
+        from .references import new_booking_reference
+        return new_booking_reference()
     
+    def set_voyage_keys(self):
+        """Copy the outbound/return sailing keys out of details"""
+        from .inventory import leg_voyage_key
+        details = self.details if isinstance(self.details, dict) else {}
+        for leg_name in ('outbound', 'return'):
+            leg = details.get(leg_name)
+            setattr(self, f'{leg_name}_voyage_key', leg_voyage_key(leg) if isinstance(leg, dict) else '')
+
+    def set_details_key(self, key, value, **fields):
+        """
+        Set details[key] (plus any plain field changes) with a partial JSON
+        update, so the rest of the stored blob is not rewritten.
+        """
+        from .rollups import UNKNOWN, apply_booking_change, booking_stats_snapshot
+
+        details = dict(self.details) if isinstance(self.details, dict) else {}
+        details[key] = value
+        self.details = details
+        for name, field_value in fields.items():
+            setattr(self, name, field_value)
+        self.updated_at = timezone.now()
+
+        previous = getattr(self, '_stats_snapshot', None)
+        using = self._state.db or 'default'
+        if previous is UNKNOWN or transaction.get_connection(using).vendor not in PARTIAL_UPDATE_VENDORS:
+            self.save(update_fields=['details', *fields, 'updated_at'])
+            return
+
+        if key in ('outbound', 'return'):
+            self.set_voyage_keys()
+            fields[f'{key}_voyage_key'] = getattr(self, f'{key}_voyage_key')
+
+        current = booking_stats_snapshot(self)
+        with transaction.atomic(using=using):
+            updated = Booking.objects.using(using).filter(details_version_q(), pk=self.pk).update(
+                details=DetailsKeySet(key, value),
+                updated_at=self.updated_at,
+                **fields,
+            )
+            if not updated:
+                # A version 1 blob (written by code from before 0016): re-encode the whole row
+                self.save(update_fields=['details', *fields, 'updated_at'])
+                return
+            apply_booking_change(previous, current)
+        self._stats_snapshot = current
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this row contributed to the daily rollup so a later
+        # save() can move it between buckets without re-reading the row
+        from .rollups import booking_stats_snapshot
+        instance._stats_snapshot = booking_stats_snapshot(instance)
+        instance._search_source = instance.search_source()
+        return instance
+
     def save(self, *args, **kwargs):
         # Generate booking reference if it doesn't exist
-        if not self.booking_reference:
+        generated = not self.booking_reference
+        if generated:
             self.booking_reference = self.generate_booking_reference()
-        super().save(*args, **kwargs)
+
+        for attempt in range(self.REFERENCE_ATTEMPTS):
+            source = self.search_source()
+            if kwargs.get('update_fields') is None:
+                # Rebuilding the document reads the user; skip it when nothing it uses changed
+                if source is None or source != getattr(self, '_search_source', None):
+                    from .search import booking_search_document
+                    self.search_document = booking_search_document(self)
+                self.set_voyage_keys()
+            try:
+                # Keep the row and its BookingDailyStats adjustment (post_save) together
+                with transaction.atomic(using=kwargs.get('using')):
+                    super().save(*args, **kwargs)
+                if kwargs.get('update_fields') is None:
+                    self._search_source = source
+                return
+            except IntegrityError as e:
+                # The unique index is the only collision check; draw again
+                collided = generated and 'booking_reference' in str(e)
+                if not collided or attempt == self.REFERENCE_ATTEMPTS - 1:
+                    raise
+                self.booking_reference = self.generate_booking_reference()
     
     def __str__(self):
         return f"{self.booking_reference} - {self.user.username} ({self.origin} to {self.destination})"
@@ -107,4 +201,294 @@ class Booking(models.Model):
     class Meta:
         verbose_name = 'Booking'
         verbose_name_plural = 'Bookings'
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # reservations_view: a user's bookings by status, soonest trip first
+            models.Index(fields=['user', 'status', 'departure_date'], name='booking_user_status_depart'),
+            # Admin bookings list, with and without the status filter
+            models.Index(fields=['status', '-created_at'], name='booking_status_created'),
+            models.Index(fields=['-created_at'], name='booking_created'),
+            # Expiring held reservations; only 'reserved' rows are indexed
+            models.Index(
+                fields=['reserved_until'],
+                condition=models.Q(status='reserved'),
+                name='booking_reserved_until_held',
+            ),
+        ]
+
+
+class BookingDailyStats(models.Model):
+    """
+    Daily booking rollup used by the admin KPI cards and charts.
+    Maintained incrementally from Booking saves/deletes (see rollups.py);
+    run `manage.py rebuild_booking_stats` to repair it from scratch.
+    """
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    company = models.CharField(max_length=100, blank=True, default='')
+    origin = models.CharField(max_length=100)
+    destination = models.CharField(max_length=100)
+    payment_method = models.CharField(max_length=50, blank=True, default='')
+
+    bookings = models.IntegerField(default=0)
+    passengers = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.status} {self.company} ({self.origin} to {self.destination}): {self.bookings}"
+
+    class Meta:
+        verbose_name = 'Booking Daily Stats'
+        verbose_name_plural = 'Booking Daily Stats'
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'status', 'company', 'origin', 'destination', 'payment_method'],
+                name='booking_daily_stats_bucket',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'day'], name='booking_stats_status_day'),
+        ]
+
+
+class AdminJob(models.Model):
+    """
+    Background job for heavy admin work (exports, rollup rebuilds, bulk deletes).
+    Queued by admin views and executed by `manage.py run_jobs` (see jobs.py).
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(blank=True, default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='admin_jobs')
+
+    # Progress tracking
+    progress = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    message = models.CharField(max_length=255, blank=True, default='')
+    error = models.TextField(blank=True, default='')
+    attempts = models.IntegerField(default=0)
+
+    # Output (files go to AdminJobFile)
+    result = models.JSONField(blank=True, null=True)
+
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="Last time the worker reported progress.")
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    @property
+    def percent(self):
+        if self.status == 'succeeded':
+            return 100
+        if not self.total:
+            return 0
+        return min(100, int(self.progress * 100 / self.total))
+
+    class Meta:
+        verbose_name = 'Admin Job'
+        verbose_name_plural = 'Admin Jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='admin_job_status_created'),
+        ]
+
+
+class AdminJobFile(models.Model):
+    """
+    File produced by an admin job (e.g. an export), gzip-compressed in the
+    database: the job worker and the web process do not share a disk.
+    """
+    job = models.OneToOneField(AdminJob, on_delete=models.CASCADE, related_name='file')
+    name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    data = models.BinaryField()
+    size = models.PositiveBigIntegerField(default=0, help_text="Uncompressed size in bytes.")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = 'Admin Job File'
+        verbose_name_plural = 'Admin Job Files'
+
+
+class SeatInventory(models.Model):
+    """
+    Local seat ledger for one sailing and accommodation.
+    `capacity` is the remaining count last reported by Barkota and `held` the
+    seats our own active bookings occupy; see inventory.py.
+    """
+    voyage_key = models.CharField(max_length=255, help_text="Shipping line, vessel and departure (see inventory.voyage_key).")
+    accommodation = models.CharField(max_length=100)
+    departure = models.CharField(max_length=32, blank=True, default='')
+    capacity = models.PositiveIntegerField(default=0)
+    held = models.PositiveIntegerField(default=0)
+    synced_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.voyage_key} / {self.accommodation} ({self.held}/{self.capacity})"
+
+    @property
+    def available(self):
+        return max(self.capacity - self.held, 0)
+
+    class Meta:
+        verbose_name = 'Seat Inventory'
+        verbose_name_plural = 'Seat Inventory'
+        constraints = [
+            models.UniqueConstraint(fields=['voyage_key', 'accommodation'], name='seat_inventory_sailing'),
+        ]
+
+
+class SeatHold(models.Model):
+    """Seats one booking holds on one SeatInventory row, until released"""
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='seat_holds')
+    inventory = models.ForeignKey(SeatInventory, on_delete=models.CASCADE, related_name='holds')
+    seats = models.PositiveSmallIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(null=True, blank=True, help_text="Unpaid checkouts give their seats back after this time.")
+    released_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.seats} seat(s) for booking #{self.booking_id}"
+
+    class Meta:
+        verbose_name = 'Seat Hold'
+        verbose_name_plural = 'Seat Holds'
+        indexes = [
+            # release_stale_holds(): open holds past their deadline
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(released_at__isnull=True),
+                name='seat_hold_open_expires',
+            ),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    Outcome of a POST that must not run twice (booking creation, Stripe
+    checkout). A retried submission with the same key replays `result`
+    instead of redoing the work; see idempotency.py.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    scope = models.CharField(max_length=40)
+    key = models.CharField(max_length=64)
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, null=True, blank=True, related_name='idempotency_keys')
+    result = models.JSONField(blank=True, default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
+
+    class Meta:
+        verbose_name = 'Idempotency Key'
+        verbose_name_plural = 'Idempotency Keys'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='idempotency_key_unique'),
+        ]
+        indexes = [
+            # purge_expired_idempotency_keys()
+            models.Index(fields=['created_at'], name='idempotency_key_created'),
+        ]
+
+
+class Passenger(models.Model):
+    """One traveller on a booking, as entered on the passenger info form"""
+    TYPE_CHOICES = [
+        ('adult', 'Adult'),
+        ('child', 'Child'),
+        ('infant', 'Infant'),
+    ]
+
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='passengers')
+    number = models.PositiveSmallIntegerField(help_text="Position on the booking form, starting at 1.")
+    first_name = models.CharField(max_length=100)
+    middle_name = models.CharField(max_length=100, blank=True, default='')
+    last_name = models.CharField(max_length=100)
+    suffix = models.CharField(max_length=20, blank=True, default='')
+    gender = models.CharField(max_length=20, blank=True, default='')
+    date_of_birth = models.DateField(null=True, blank=True)
+    passenger_type = models.CharField(max_length=10, choices=TYPE_CHOICES, default='adult')
+    nationality = models.CharField(max_length=60, blank=True, default='')
+
+    def __str__(self):
+        return f"{self.first_name} {self.last_name} ({self.booking_id})"
+
+    @property
+    def full_name(self):
+        return ' '.join(part for part in (self.first_name, self.middle_name, self.last_name, self.suffix) if part)
+
+    class Meta:
+        verbose_name = 'Passenger'
+        verbose_name_plural = 'Passengers'
+        ordering = ['booking', 'number']
+        constraints = [
+            models.UniqueConstraint(fields=['booking', 'number'], name='passenger_booking_number'),
+        ]
+        indexes = [
+            models.Index(fields=['last_name', 'first_name'], name='passenger_name'),
+            models.Index(fields=['date_of_birth'], name='passenger_dob'),
+        ]
+
+
+class CartEntry(models.Model):
+    """
+    One value of a booking cart (trip selections, passenger form, ...),
+    the database copy behind the cached cart in carts.py.
+    """
+    cart_id = models.CharField(max_length=64)
+    name = models.CharField(max_length=64)
+    value = models.JSONField(blank=True, null=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.cart_id}:{self.name}"
+
+    class Meta:
+        verbose_name = 'Cart Entry'
+        verbose_name_plural = 'Cart Entries'
+        constraints = [
+            models.UniqueConstraint(fields=['cart_id', 'name'], name='cart_entry_unique'),
+        ]
+
+
+class SlowQuery(models.Model):
+    """
+    A query that ran longer than SLOW_QUERY_MS during a request, recorded by
+    SlowQueryMiddleware (see slowqueries.py). The sweeper keeps the newest
+    SLOW_QUERY_LOG_SIZE rows.
+    """
+    fingerprint = models.CharField(max_length=32)
+    sql = models.TextField(help_text="Normalized SQL (literals as ?, IN lists collapsed).")
+    duration_ms = models.FloatField()
+    view = models.CharField(max_length=200, blank=True, default='')
+    path = models.CharField(max_length=255, blank=True, default='')
+    location = models.CharField(max_length=255, blank=True, default='', help_text="Innermost project frame that ran the query.")
+    explain = models.TextField(blank=True, default='', help_text="Query plan, kept for the first few rows of each fingerprint.")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.duration_ms:.0f} ms {self.view or self.path}"
+
+    class Meta:
+        verbose_name = 'Slow Query'
+        verbose_name_plural = 'Slow Queries'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['fingerprint', 'created_at'], name='slow_query_fingerprint'),
+            models.Index(fields=['created_at'], name='slow_query_created'),
+        ]
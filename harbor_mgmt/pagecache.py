@@ -0,0 +1,111 @@
+"""
+Full-page cache for anonymous visitors.
+
+Anonymous GETs of the marketing pages (home, contact, latest offers) are
+served from the cache instead of rendering the templates. Pages are keyed
+on the path and the routes catalogue version, so refreshing the Barkota
+routes with different content moves every page to new keys. The CSRF token
+is hole-punched: the cached copy holds a placeholder that is swapped for
+the visitor's own token on the way out. Signed-in users, requests with
+pending flash messages or query parameters the view does not list,
+non-200 responses and responses marked private or no-store always go to
+the view, so made-up query strings cannot fill the cache with copies.
+"""
+import hashlib
+import json
+import re
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse, QueryDict
+from django.middleware.csrf import get_token
+
+ROUTES_VERSION_KEY = 'barkota_routes_version'
+
+# Kept below the 10 minute routes cache so a cached home page never outlives
+# the catalogue it embeds by much
+ANONYMOUS_PAGE_TIMEOUT = 60 * 5
+
+CSRF_PLACEHOLDER = b'__harborhop_csrf_token__'
+CSRF_INPUT_RE = re.compile(rb'name="csrfmiddlewaretoken" value="([A-Za-z0-9]{64})"')
+
+
+def routes_catalogue_version():
+    return cache.get(ROUTES_VERSION_KEY, '0')
+
+
+def set_routes_catalogue_version(routes_data):
+    """Record the content version of a freshly fetched routes catalogue"""
+    digest = hashlib.md5(json.dumps(routes_data, sort_keys=True).encode(), usedforsecurity=False)
+    cache.set(ROUTES_VERSION_KEY, digest.hexdigest()[:12], None)
+
+
+def page_cache_key(request, query_params=()):
+    query = QueryDict(mutable=True)
+    for name in sorted(query_params):
+        if name in request.GET:
+            query.setlist(name, request.GET.getlist(name))
+    full_path = f'{request.path}?{query.urlencode()}' if query else request.path
+    path = hashlib.md5(full_path.encode(), usedforsecurity=False).hexdigest()
+    return f"page:{getattr(settings, 'HTTP_CACHE_VERSION', '')}:{routes_catalogue_version()}:{path}"
+
+
+def _cacheable_request(request, query_params=()):
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and set(request.GET) <= set(query_params)
+        and not len(messages.get_messages(request))
+    )
+
+
+def _punch_csrf_token(request, content):
+    """The page with its CSRF token replaced by the placeholder, or None if it cannot be"""
+    match = CSRF_INPUT_RE.search(content)
+    if match:
+        return content.replace(match.group(1), CSRF_PLACEHOLDER)
+    # A token was handed out but not in a form field we can find; do not cache it
+    if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        return None
+    return content
+
+
+def cache_anonymous_page(view_func=None, *, query_params=(), timeout=ANONYMOUS_PAGE_TIMEOUT):
+    """
+    Serve a view's anonymous GETs from the full-page cache. `query_params`
+    lists the query parameters the view reads; they are part of the key.
+    """
+    if view_func is None:
+        return lambda view_func: cache_anonymous_page(view_func, query_params=query_params, timeout=timeout)
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not _cacheable_request(request, query_params):
+            return view_func(request, *args, **kwargs)
+
+        key = page_cache_key(request, query_params)
+        page = cache.get(key)
+        if page is not None:
+            content = page['content']
+            if page['csrf']:
+                content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+            return HttpResponse(content, content_type=page['content_type'])
+
+        response = view_func(request, *args, **kwargs)
+        cache_control = response.get('Cache-Control', '')
+        if (
+            response.status_code != 200 or response.streaming or response.cookies
+            or 'no-store' in cache_control or 'private' in cache_control
+        ):
+            return response
+        content = _punch_csrf_token(request, response.content)
+        if content is not None:
+            cache.set(key, {
+                'content': content,
+                'content_type': response['Content-Type'],
+                'csrf': CSRF_PLACEHOLDER in content,
+            }, timeout)
+        return response
+    return wrapper
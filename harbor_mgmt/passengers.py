@@ -0,0 +1,84 @@
+"""
+Passenger rows written from the flat passenger_{i}_* form fields.
+
+Migration 0014 keeps its own frozen copy of parse_passenger_fields() for
+exploding the old Booking.details['passengers'] blobs.
+"""
+import re
+from datetime import datetime
+
+PASSENGER_KEY_RE = re.compile(r'^passenger_(\d+)_(\w+)$')
+
+# Form field suffix -> Passenger field
+FORM_FIELDS = {
+    'first_name': 'first_name',
+    'middle_name': 'middle_name',
+    'last_name': 'last_name',
+    'suffix': 'suffix',
+    'gender': 'gender',
+    'dob': 'date_of_birth',
+    'type': 'passenger_type',
+    'nationality': 'nationality',
+}
+
+MAX_LENGTHS = {
+    'first_name': 100,
+    'middle_name': 100,
+    'last_name': 100,
+    'suffix': 20,
+    'gender': 20,
+    'nationality': 60,
+}
+
+PASSENGER_TYPES = ('adult', 'child', 'infant')
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_passenger_fields(data, adults=1):
+    """
+    Turn {'passenger_1_first_name': ..., 'contact_email': ...} into a list of
+    Passenger field dicts ordered by passenger number. Passengers without a
+    type are adults up to `adults`, children after that.
+    """
+    by_number = {}
+    for key, value in (data or {}).items():
+        match = PASSENGER_KEY_RE.match(key)
+        if not match or match.group(2) not in FORM_FIELDS:
+            continue
+        by_number.setdefault(int(match.group(1)), {})[FORM_FIELDS[match.group(2)]] = value
+
+    passengers = []
+    for number in sorted(by_number):
+        fields = by_number[number]
+        row = {name: (str(fields.get(name) or '').strip())[:length] for name, length in MAX_LENGTHS.items()}
+        passenger_type = str(fields.get('passenger_type') or '').strip().lower()
+        if passenger_type not in PASSENGER_TYPES:
+            passenger_type = 'adult' if number <= adults else 'child'
+        row.update(
+            number=number,
+            date_of_birth=_parse_date(fields.get('date_of_birth')),
+            passenger_type=passenger_type,
+        )
+        passengers.append(row)
+    return passengers
+
+
+def create_passengers(booking, data, passenger_model=None):
+    """bulk_create the Passenger rows for a new booking from its form data"""
+    if passenger_model is None:
+        from .models import Passenger as passenger_model
+
+    return passenger_model.objects.bulk_create(
+        [passenger_model(booking=booking, **row) for row in parse_passenger_fields(data, booking.adults or 1)]
+    )
+
+
+def contact_fields(data):
+    """The contact_* fields of the passenger form"""
+    return {key: value for key, value in (data or {}).items() if key.startswith('contact_')}
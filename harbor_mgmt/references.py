@@ -0,0 +1,99 @@
+"""
+Booking reference generation without a database round trip.
+
+A reference is "HH-" followed by nine Crockford base32 characters and one
+check character, e.g. HH-1C8ZQ4TNX7. The first five characters are the
+minutes since REFERENCE_EPOCH (so references sort roughly by creation
+time), the next four are random, and the check character (Luhn mod 32)
+catches single typos and most transpositions when a reference is read out
+over the phone. Uniqueness is left to the unique index; Booking.save()
+draws a new reference on the rare IntegrityError.
+
+Typed references are normalized before they are looked up: case, spaces
+and hyphens do not matter and I/L/O read as 1/0. References from before
+this scheme (HH- and eight characters of A-Z0-9) have no check character
+and are matched as typed.
+"""
+import re
+import secrets
+from datetime import datetime, timezone as dt_timezone
+
+from django.utils import timezone
+
+# Crockford base32: no I, L, O or U, so references are easy to read aloud
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+BASE = len(ALPHABET)
+
+REFERENCE_PREFIX = 'HH-'
+REFERENCE_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+TIME_CHARS = 5      # 32**5 minutes, about 63 years
+RANDOM_CHARS = 4    # ~1M references per minute before collisions get likely
+CODE_LENGTH = TIME_CHARS + RANDOM_CHARS + 1
+
+# Characters people commonly type for the Crockford ones
+_READ_AS = str.maketrans({'I': '1', 'L': '1', 'O': '0'})
+
+_SEPARATORS_RE = re.compile(r'[\s-]+')
+
+
+def _encode(value, length):
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, BASE)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def check_character(payload):
+    """Luhn mod N check character for a base32 payload"""
+    total = 0
+    factor = 2
+    for char in reversed(payload):
+        addend = factor * ALPHABET.index(char)
+        total += addend // BASE + addend % BASE
+        factor = 1 if factor == 2 else 2
+    return ALPHABET[(BASE - total % BASE) % BASE]
+
+
+def new_booking_reference(now=None):
+    """Return a fresh booking reference; does not touch the database"""
+    now = now or timezone.now()
+    minutes = int((now - REFERENCE_EPOCH).total_seconds() // 60) % BASE ** TIME_CHARS
+    payload = _encode(minutes, TIME_CHARS) + _encode(secrets.randbelow(BASE ** RANDOM_CHARS), RANDOM_CHARS)
+    return f"{REFERENCE_PREFIX}{payload}{check_character(payload)}"
+
+
+def normalize_booking_reference(reference):
+    """
+    The stored form of a typed reference: "hh 1c8z-q4tn-x7", "HH1C8ZQ4TNX7"
+    and "1C8ZQ4TNX7" all become "HH-1C8ZQ4TNX7", with I/L/O mapped to the
+    characters they stand for. Text that does not start with the prefix and
+    is not a whole code is returned uppercased, without separators.
+    """
+    reference = _SEPARATORS_RE.sub('', (reference or '').upper())
+    prefix = REFERENCE_PREFIX.rstrip('-')
+    if reference.startswith(prefix):
+        reference = reference[len(prefix):]
+    elif len(reference) != CODE_LENGTH:
+        return reference
+    return REFERENCE_PREFIX + reference.translate(_READ_AS)
+
+
+def has_reference_shape(reference):
+    """True if a normalized reference is as long as a generated one and uses the alphabet"""
+    code = reference[len(REFERENCE_PREFIX):]
+    return (
+        reference.startswith(REFERENCE_PREFIX)
+        and len(code) == CODE_LENGTH
+        and all(char in ALPHABET for char in code)
+    )
+
+
+def is_valid_booking_reference(reference):
+    """True if a reference has the generated shape and its check character matches"""
+    reference = normalize_booking_reference(reference)
+    if not has_reference_shape(reference):
+        return False
+    code = reference[len(REFERENCE_PREFIX):]
+    return check_character(code[:-1]) == code[-1]
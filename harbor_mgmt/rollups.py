@@ -0,0 +1,137 @@
+"""
+Incremental maintenance of the BookingDailyStats rollup.
+
+Every Booking contributes one booking, its passengers and its total price to
+exactly one bucket (day created, status, company, route, payment method).
+When a booking is saved we subtract it from the bucket it was loaded from and
+add it to the bucket it belongs to now, so the admin KPIs never have to scan
+the bookings table. Buckets left with no bookings are deleted.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+# Fields a snapshot reads; instances loaded with any of these deferred are
+# resolved lazily in pre_save instead (see signals.py)
+SNAPSHOT_FIELDS = ('created_at', 'status', 'origin', 'destination', 'adults', 'children', 'total_price', 'details')
+
+UNKNOWN = object()
+
+
+def normalize_payment_method(method):
+    """Stripe test-mode payments are reported as regular card payments"""
+    method = (method or '').strip()
+    return 'stripe' if method == 'stripe_test' else method
+
+
+def booking_stats_snapshot(booking):
+    """
+    Return (bucket, measures) for a booking, or None if it has not been
+    saved yet. Returns UNKNOWN when the needed fields were deferred.
+    """
+    if booking.get_deferred_fields() & set(SNAPSHOT_FIELDS):
+        return UNKNOWN
+    if not booking.created_at:
+        return None
+
+    details = booking.details if isinstance(booking.details, dict) else {}
+    outbound = details.get('outbound') if isinstance(details.get('outbound'), dict) else {}
+    payment = details.get('payment') if isinstance(details.get('payment'), dict) else {}
+
+    bucket = {
+        'day': timezone.localdate(booking.created_at),
+        'status': booking.status,
+        'company': (outbound.get('company') or '')[:100],
+        'origin': booking.origin or '',
+        'destination': booking.destination or '',
+        'payment_method': normalize_payment_method(payment.get('method'))[:50],
+    }
+    measures = {
+        'bookings': 1,
+        'passengers': (booking.adults or 0) + (booking.children or 0),
+        'revenue': Decimal(booking.total_price or 0),
+    }
+    return bucket, measures
+
+
+def _bump(stats_model, bucket, measures, sign):
+    """Add (sign=1) or subtract (sign=-1) measures from one bucket"""
+    increments = {name: F(name) + sign * value for name, value in measures.items()}
+    if stats_model.objects.filter(**bucket).update(**increments):
+        if sign * measures['bookings'] < 0:
+            # The last booking may have left the bucket
+            stats_model.objects.filter(**bucket, bookings=0).delete()
+        return
+    try:
+        with transaction.atomic():
+            stats_model.objects.create(**bucket, **{name: sign * value for name, value in measures.items()})
+    except IntegrityError:
+        # Another request created the bucket between our UPDATE and INSERT
+        stats_model.objects.filter(**bucket).update(**increments)
+
+
+def apply_booking_change(previous, current, stats_model=None):
+    """Move a booking's contribution from the previous snapshot to the current one"""
+    if previous == current:
+        return
+    if stats_model is None:
+        from .models import BookingDailyStats as stats_model
+
+    if previous:
+        _bump(stats_model, previous[0], previous[1], -1)
+    if current:
+        _bump(stats_model, current[0], current[1], 1)
+
+
+def apply_booking_changes(changes, stats_model=None):
+    """
+    Apply many (previous, current) snapshot pairs at once, e.g. after a bulk
+    UPDATE that bypassed save(). Deltas are summed per bucket first, so each
+    touched bucket costs one statement instead of two per booking.
+    """
+    if stats_model is None:
+        from .models import BookingDailyStats as stats_model
+
+    deltas = {}
+    for previous, current in changes:
+        if previous == current:
+            continue
+        for snapshot, sign in ((previous, -1), (current, 1)):
+            if not snapshot:
+                continue
+            bucket, measures = snapshot
+            row = deltas.setdefault(tuple(sorted(bucket.items())), {'bookings': 0, 'passengers': 0, 'revenue': Decimal('0')})
+            for name, value in measures.items():
+                row[name] += sign * value
+
+    for key, measures in deltas.items():
+        if any(measures.values()):
+            _bump(stats_model, dict(key), measures, 1)
+    return len(deltas)
+
+
+def rebuild_daily_stats(bookings, stats_model, chunk_size=2000):
+    """
+    Recompute the whole rollup from a Booking queryset.
+    Used by the rebuild_booking_stats command and the initial data migration.
+    """
+    totals = {}
+    for booking in bookings.only(*SNAPSHOT_FIELDS).iterator(chunk_size=chunk_size):
+        snapshot = booking_stats_snapshot(booking)
+        if not snapshot or snapshot is UNKNOWN:
+            continue
+        bucket, measures = snapshot
+        key = tuple(sorted(bucket.items()))
+        row = totals.setdefault(key, {'bookings': 0, 'passengers': 0, 'revenue': Decimal('0')})
+        for name, value in measures.items():
+            row[name] += value
+
+    with transaction.atomic():
+        stats_model.objects.all().delete()
+        stats_model.objects.bulk_create(
+            [stats_model(**dict(key), **row) for key, row in totals.items()],
+            batch_size=chunk_size,
+        )
+    return len(totals)
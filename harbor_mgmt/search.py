@@ -0,0 +1,196 @@
+"""
+Indexed search for the admin bookings page.
+
+Each Booking stores a lowercased `search_document` (reference, customer
+names, route). PostgreSQL searches it through a pg_trgm GIN index and ranks
+by word similarity; SQLite uses an FTS5 trigram table kept in sync by
+triggers and ranks by bm25. Anything that looks like a booking reference is
+first tried on the unique `booking_reference` index: a whole reference as
+an exact lookup (normalized, see references.py), anything shorter as a
+range scan.
+"""
+import re
+
+from django.db import connections
+from django.db.models import F, FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .references import REFERENCE_PREFIX, has_reference_shape, is_valid_booking_reference, normalize_booking_reference
+
+FTS_TABLE = 'harbor_mgmt_booking_fts'
+BOOKING_TABLE = 'harbor_mgmt_booking'
+
+# Booking references are uppercase letters/digits, optionally "HH-" prefixed
+REFERENCE_RE = re.compile(r'^[A-Z0-9][A-Z0-9-]{3,19}$')
+
+# FTS5 trigram tokenizer cannot match terms shorter than this
+MIN_TRIGRAM_LENGTH = 3
+
+
+def booking_search_document(booking):
+    """Build the lowercased text the admin search box matches against"""
+    user = booking.user
+    parts = [
+        booking.booking_reference,
+        user.username,
+        user.first_name,
+        user.last_name,
+        booking.origin,
+        booking.destination,
+    ]
+    return ' '.join(part.strip() for part in parts if part).lower()
+
+
+def _search_terms(query):
+    return [term for term in query.lower().split() if term]
+
+
+def _fts_match_expression(terms):
+    # Quote every term so FTS5 operators typed into the search box are literal
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+
+
+def search_bookings(bookings, query):
+    """
+    Filter a Booking queryset by the admin search box query.
+    Results are ordered best match first.
+    """
+    query = (query or '').strip()
+    if not query:
+        return bookings
+
+    # Fast path: a whole reference is one index lookup. With the HH prefix
+    # typed, a wrong check character is a typo and matches nothing; without
+    # it the query may just be a ten-letter word, e.g. a port name
+    reference = normalize_booking_reference(query)
+    if has_reference_shape(reference):
+        if is_valid_booking_reference(reference):
+            by_reference = bookings.filter(booking_reference=reference)
+            if by_reference.exists():
+                return by_reference
+        elif query.upper().startswith(REFERENCE_PREFIX.rstrip('-')):
+            return bookings.none()
+
+    # Reference prefixes are a range scan on the unique index, as typed (older
+    # references may contain I/L/O) and normalized
+    prefixes = {query.upper()}
+    if reference.startswith(REFERENCE_PREFIX):
+        prefixes.add(reference)
+    ranges = Q()
+    for prefix in prefixes:
+        if REFERENCE_RE.match(prefix):
+            ranges |= Q(booking_reference__gte=prefix, booking_reference__lt=prefix + '\uffff')
+    if ranges:
+        by_reference = bookings.filter(ranges)
+        if by_reference.exists():
+            return by_reference.order_by('booking_reference')
+
+    terms = _search_terms(query)
+    vendor = connections[bookings.db].vendor
+
+    if vendor == 'postgresql':
+        for term in terms:
+            bookings = bookings.filter(search_document__contains=term)
+        return bookings.annotate(
+            search_rank=Func(
+                Value(' '.join(terms)),
+                F('search_document'),
+                function='word_similarity',
+                output_field=FloatField(),
+            )
+        ).order_by('-search_rank', '-created_at')
+
+    if vendor == 'sqlite' and all(len(term) >= MIN_TRIGRAM_LENGTH for term in terms):
+        match = _fts_match_expression(terms)
+        return bookings.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,))
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {BOOKING_TABLE}.id',
+                (match,),
+                output_field=FloatField(),
+            )
+        ).order_by('search_rank', '-created_at')
+
+    # Short terms or other backends: unindexed substring match
+    for term in terms:
+        bookings = bookings.filter(search_document__contains=term)
+    return bookings
+
+
+def refresh_search_documents(bookings, batch_size=500):
+    """Recompute search_document for a Booking queryset, writing only changed rows"""
+    changed = []
+    updated = 0
+    for booking in bookings.select_related('user').iterator(chunk_size=batch_size):
+        document = booking_search_document(booking)
+        if document != booking.search_document:
+            booking.search_document = document
+            changed.append(booking)
+        if len(changed) >= batch_size:
+            bookings.model.objects.bulk_update(changed, ['search_document'])
+            updated += len(changed)
+            changed = []
+    if changed:
+        bookings.model.objects.bulk_update(changed, ['search_document'])
+        updated += len(changed)
+    return updated
+
+
+POSTGRES_INDEX_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    f'CREATE INDEX IF NOT EXISTS booking_search_trgm ON {BOOKING_TABLE} USING gin (search_document gin_trgm_ops)',
+]
+
+POSTGRES_DROP_SQL = [
+    'DROP INDEX IF EXISTS booking_search_trgm',
+]
+
+SQLITE_INDEX_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        search_document, content='{BOOKING_TABLE}', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {BOOKING_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {BOOKING_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) VALUES ('delete', old.id, old.search_document);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF search_document ON {BOOKING_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_document) VALUES ('delete', old.id, old.search_document);
+        INSERT INTO {FTS_TABLE}(rowid, search_document) VALUES (new.id, new.search_document);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def install_search_index(connection):
+    """
+    Create the backend-specific search index. Safe to re-run; SQLite table
+    rebuilds in later migrations drop the triggers, so those migrations run
+    a frozen copy of this SQL again.
+    """
+    statements = {
+        'postgresql': POSTGRES_INDEX_SQL,
+        'sqlite': SQLITE_INDEX_SQL,
+    }.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def drop_search_index(connection):
+    statements = {
+        'postgresql': POSTGRES_DROP_SQL,
+        'sqlite': SQLITE_DROP_SQL,
+    }.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
@@ -0,0 +1,46 @@
+"""
+Expired session cleanup.
+
+`manage.py clearsessions` deletes every expired row in one statement, which
+on a large django_session table holds locks for the whole scan. This walks
+the expire_date index instead and deletes small batches, each in its own
+short transaction, optionally pausing between them so normal traffic keeps
+getting through.
+"""
+import logging
+import time
+
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Sessions deleted per DELETE statement
+SESSION_PURGE_BATCH_SIZE = 1000
+
+# Most batches one sweeper pass deletes, so a large backlog is worked off
+# over several passes instead of one long one
+SWEEP_MAX_BATCHES = 50
+SWEEP_PAUSE = 0.1
+
+
+def purge_expired_sessions(now=None, batch_size=SESSION_PURGE_BATCH_SIZE, pause=0, max_batches=None):
+    """Delete expired sessions in index-ordered batches; returns how many were removed"""
+    now = now or timezone.now()
+    purged = batches = 0
+    while max_batches is None or batches < max_batches:
+        keys = list(
+            Session.objects.filter(expire_date__lt=now)
+            .order_by('expire_date')
+            .values_list('session_key', flat=True)[:batch_size]
+        )
+        if not keys:
+            break
+        purged += Session.objects.filter(session_key__in=keys, expire_date__lt=now).delete()[0]
+        batches += 1
+        if len(keys) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    logger.info(f"session_purge purged={purged} batches={batches}")
+    return purged
@@ -0,0 +1,91 @@
+"""
+Model signal handlers for harbor_mgmt
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Booking, Passenger, SeatHold, SeatInventory, UserProfile
+from .rollups import UNKNOWN, apply_booking_change, booking_stats_snapshot
+from .search import refresh_search_documents
+
+# User fields copied into Booking.search_document
+SEARCHABLE_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(pre_save, sender=Booking)
+def resolve_booking_snapshot(sender, instance, raw, **kwargs):
+    """Instances loaded with deferred fields need the stored row to diff against"""
+    if raw or getattr(instance, '_stats_snapshot', None) is not UNKNOWN:
+        return
+    stored = Booking.objects.filter(pk=instance.pk).first() if instance.pk else None
+    instance._stats_snapshot = booking_stats_snapshot(stored) if stored else None
+
+
+@receiver(post_save, sender=Booking)
+def update_booking_daily_stats(sender, instance, created, raw, **kwargs):
+    """Move the booking between BookingDailyStats buckets after every save"""
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_stats_snapshot', None)
+    current = booking_stats_snapshot(instance)
+    if current is UNKNOWN:
+        # Saved from a deferred instance; the stored row is the truth
+        current = booking_stats_snapshot(Booking.objects.get(pk=instance.pk))
+    apply_booking_change(previous, current)
+    instance._stats_snapshot = current
+
+
+@receiver(pre_delete, sender=Booking)
+def resolve_deleted_booking_snapshot(sender, instance, **kwargs):
+    """Deferred instances are about to be deleted; read what the row contributed while it exists"""
+    if getattr(instance, '_stats_snapshot', None) is not UNKNOWN:
+        return
+    stored = Booking.objects.filter(pk=instance.pk).first()
+    instance._stats_snapshot = booking_stats_snapshot(stored) if stored else None
+
+
+@receiver(post_delete, sender=Booking)
+def remove_booking_daily_stats(sender, instance, **kwargs):
+    """Deleted bookings (including user cascades) leave the rollup"""
+    apply_booking_change(getattr(instance, '_stats_snapshot', None), None)
+
+
+@receiver(post_save, sender=User)
+def refresh_user_booking_search(sender, instance, created, raw, update_fields, **kwargs):
+    """Renamed users must stay findable by their new name in the admin search"""
+    if created or raw:
+        return
+    if update_fields is not None and not SEARCHABLE_USER_FIELDS & set(update_fields):
+        # e.g. the last_login update on every login
+        return
+    refresh_search_documents(instance.bookings.all())
+
+
+@receiver(post_save, sender=User)
+def create_user_profile(sender, instance, created, raw, **kwargs):
+    """Every user gets a profile when the account is created"""
+    if created and not raw:
+        UserProfile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Passenger)
+@receiver(post_delete, sender=Passenger)
+def touch_passenger_booking(sender, instance, raw=False, origin=None, **kwargs):
+    """
+    A passenger edit is a booking edit: bump updated_at so the cached admin
+    details (keyed on it) are rebuilt. Cascades from deleting the booking or
+    its user skip this.
+    """
+    if raw or (origin is not None and getattr(origin, 'model', type(origin)) is not Passenger):
+        return
+    Booking.objects.filter(pk=instance.booking_id).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=SeatHold)
+def release_deleted_seat_hold(sender, instance, **kwargs):
+    """Deleting a booking (or its user) gives its open seat holds back"""
+    if instance.released_at is None:
+        SeatInventory.objects.filter(pk=instance.inventory_id).update(held=F('held') - instance.seats)
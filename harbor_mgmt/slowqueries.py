@@ -0,0 +1,182 @@
+"""
+Opt-in slow-query log.
+
+With SLOW_QUERY_MS set, SlowQueryMiddleware times every query a request
+runs (through connection.execute_wrapper) and keeps the ones over the
+threshold. When the response is ready they are written to the SlowQuery
+table with their normalized SQL, fingerprint, view and the innermost
+project frame that ran them, and logged as one "slow_query" line each.
+The first SLOW_QUERY_EXPLAIN_LIMIT rows of a fingerprint also get the
+query plan, taken then, outside whatever transaction the view used.
+
+The table is trimmed to the newest SLOW_QUERY_LOG_SIZE rows by the sweeper
+and browsed in the Django admin or at admin-dashboard/slow-queries/.
+"""
+import hashlib
+import logging
+import os
+import re
+import time
+import traceback
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+
+from .models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+# Milliseconds a query may take before it is recorded; 0 turns the log off
+SLOW_QUERY_MS = getattr(settings, 'SLOW_QUERY_MS', 0)
+
+# Rows per fingerprint that get an EXPLAIN
+EXPLAIN_LIMIT = getattr(settings, 'SLOW_QUERY_EXPLAIN_LIMIT', 3)
+
+# Rows kept by trim_slow_queries()
+LOG_SIZE = getattr(settings, 'SLOW_QUERY_LOG_SIZE', 1000)
+
+# Slow queries recorded per request, so an N+1 loop cannot flood the table
+REQUEST_LIMIT = 20
+
+# Statements EXPLAIN accepts on every backend we run on
+EXPLAINABLE = ('select', 'with', 'update', 'delete', 'insert')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+_THIS_FILE = os.path.abspath(__file__)
+
+
+def normalize_sql(sql):
+    """SQL with literals and placeholders as ? and IN lists collapsed, so repeats share a fingerprint"""
+    sql = sql.replace('%s', '?')
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _LIST_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def sql_fingerprint(normalized_sql):
+    return hashlib.md5(normalized_sql.encode(), usedforsecurity=False).hexdigest()
+
+
+def query_location():
+    """'path:line in function' of the innermost project frame on the stack"""
+    base_dir = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename == _THIS_FILE or not filename.startswith(base_dir) or 'site-packages' in filename:
+            continue
+        return f"{os.path.relpath(filename, base_dir)}:{frame.lineno} in {frame.name}"[:255]
+    return ''
+
+
+class SlowQueryRecorder:
+    """execute_wrapper hook that keeps a request's queries over the threshold"""
+
+    def __init__(self, threshold_ms, alias):
+        self.threshold_ms = threshold_ms
+        self.alias = alias
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.monotonic() - started) * 1000
+            if duration_ms >= self.threshold_ms and len(self.queries) < REQUEST_LIMIT:
+                self.queries.append({
+                    'alias': self.alias,
+                    'sql': sql,
+                    'params': None if many else params,
+                    'duration_ms': duration_ms,
+                    'location': query_location(),
+                })
+
+
+def explain_query(alias, sql, params):
+    """The backend's plan for a query, or '' if it cannot be explained"""
+    if params is None or not sql.lstrip().lower().startswith(EXPLAINABLE):
+        return ''
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+            rows = cursor.fetchall()
+    except DatabaseError as e:
+        logger.warning(f"Could not EXPLAIN slow query: {str(e)}")
+        return ''
+    # PostgreSQL returns one plan line per row, SQLite (id, parent, notused, detail)
+    return '\n'.join(str(row[-1]) for row in rows)
+
+
+def record_slow_queries(queries, view='', path=''):
+    """Write a request's slow queries to the log table, with plans for new fingerprints"""
+    rows = []
+    explained = {}
+    for query in queries:
+        normalized = normalize_sql(query['sql'])
+        fingerprint = sql_fingerprint(normalized)
+        if fingerprint not in explained:
+            explained[fingerprint] = SlowQuery.objects.filter(fingerprint=fingerprint).exclude(explain='').count()
+        explain = ''
+        if explained[fingerprint] < EXPLAIN_LIMIT:
+            explain = explain_query(query['alias'], query['sql'], query['params'])
+            if explain:
+                explained[fingerprint] += 1
+        logger.warning(
+            f"slow_query ms={query['duration_ms']:.0f} view={view or '-'} location={query['location'] or '-'} "
+            f"fingerprint={fingerprint} sql={normalized[:500]}"
+        )
+        rows.append(SlowQuery(
+            fingerprint=fingerprint,
+            sql=normalized,
+            duration_ms=round(query['duration_ms'], 2),
+            view=view[:200],
+            path=path[:255],
+            location=query['location'],
+            explain=explain,
+        ))
+    SlowQuery.objects.bulk_create(rows)
+    return rows
+
+
+def trim_slow_queries(keep=LOG_SIZE):
+    """Delete all but the newest `keep` slow-query rows; returns how many were removed"""
+    cutoff = SlowQuery.objects.order_by('-id').values_list('id', flat=True)[keep:keep + 1].first()
+    if cutoff is None:
+        return 0
+    return SlowQuery.objects.filter(id__lte=cutoff).delete()[0]
+
+
+class SlowQueryMiddleware:
+    """Record the slow queries of each request; unused unless SLOW_QUERY_MS is set"""
+
+    def __init__(self, get_response):
+        if not SLOW_QUERY_MS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorders = []
+        with ExitStack() as stack:
+            for connection in connections.all():
+                recorder = SlowQueryRecorder(SLOW_QUERY_MS, connection.alias)
+                recorders.append(recorder)
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        queries = [query for recorder in recorders for query in recorder.queries]
+        if queries:
+            match = request.resolver_match
+            try:
+                record_slow_queries(queries, view=match.view_name if match else '', path=request.path)
+            except DatabaseError as e:
+                # The log must never cost the user their response
+                logger.error(f"Could not record slow queries: {str(e)}")
+        return response
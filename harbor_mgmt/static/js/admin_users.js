@@ -529,42 +529,62 @@ function initializeAdminUsers() {
     const filterButtons = document.querySelectorAll(".filter-btn");
     const addUserBtn = document.querySelector('.add-user-btn');
 
-    // Filter table functionality
-    function filterTable() {
-        const searchValue = searchInput.value.toLowerCase();
+    const tableBody = document.querySelector(".users-table tbody");
+    const loadMoreBtn = document.querySelector(".load-more-btn");
+    let searchTimer = null;
+    let requestId = 0;
+
+    // Map the filter buttons onto the directory API parameters
+    function currentFilters() {
         const activeFilter = document.querySelector(".filter-btn.active")?.textContent.trim() || "All Users";
+        const params = new URLSearchParams();
+        const searchValue = searchInput ? searchInput.value.trim() : "";
+        if (searchValue) params.set("search", searchValue);
+        if (activeFilter === "Admins") params.set("role", "admin");
+        else if (activeFilter === "Regular") params.set("role", "user");
+        else if (activeFilter === "Recent") {
+            const since = new Date(Date.now() - 30 * 24 * 60 * 60 * 1000);
+            params.set("joined_after", since.toISOString().slice(0, 10));
+        }
+        return params;
+    }
 
-        document.querySelectorAll(".users-table tbody tr").forEach(row => {
-            if (row.textContent.includes("No users found")) return;
+    // Fetch a page of users from the server; append when paging, replace when filtering
+    async function loadUsers(append) {
+        if (!loadMoreBtn || !tableBody) return;
+        const params = currentFilters();
+        if (append && loadMoreBtn.dataset.nextCursor) params.set("cursor", loadMoreBtn.dataset.nextCursor);
+        const thisRequest = ++requestId;
 
-            const name = row.querySelector(".user-name-text")?.textContent.toLowerCase() || "";
-            const username = row.querySelector(".user-username")?.textContent.toLowerCase() || "";
-            const email = row.querySelector("td:nth-child(3)")?.textContent.toLowerCase() || "";
-            
-            let roleText = row.querySelector(".role-badge")?.textContent.trim().toLowerCase() || 
-                          row.querySelector(".role-badge-btn")?.textContent.toLowerCase() || "";
-            roleText = roleText.split("(")[0].trim();
-
-            const matchesSearch = name.includes(searchValue) || username.includes(searchValue) || email.includes(searchValue);
-
-            let matchesFilter = true;
-            if (activeFilter === "Admins") matchesFilter = roleText.includes("admin");
-            else if (activeFilter === "Regular") matchesFilter = roleText.includes("user") && !roleText.includes("admin");
-            else if (activeFilter === "Recent") {
-                const joinedText = row.querySelector("td:nth-child(6)")?.textContent.trim();
-                const joinedDate = new Date(joinedText);
-                const now = new Date();
-                const diffDays = (now - joinedDate) / (1000 * 60 * 60 * 24);
-                matchesFilter = diffDays <= 30;
+        try {
+            const response = await fetch(`${loadMoreBtn.dataset.url}?${params.toString()}`);
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            const data = await response.json();
+            // Ignore responses overtaken by a newer search
+            if (thisRequest !== requestId) return;
+            if (!data.success) throw new Error(data.message);
+
+            if (!append) tableBody.innerHTML = "";
+            tableBody.querySelector(".no-users-row")?.remove();
+            tableBody.insertAdjacentHTML("beforeend", data.html);
+            if (!tableBody.children.length) {
+                tableBody.innerHTML = '<tr class="no-users-row"><td colspan="7" style="text-align:center;">No users found.</td></tr>';
             }
 
-            row.style.display = (matchesSearch && matchesFilter) ? "" : "none";
-        });
+            loadMoreBtn.dataset.nextCursor = data.next_cursor || "";
+            loadMoreBtn.style.display = data.next_cursor ? "" : "none";
+        } catch (error) {
+            console.error('Fetch error:', error);
+            showNotification('Could not load users: ' + error.message, 'error');
+        }
     }
 
-    // Search event
+    // Search event (debounced, server-side)
     if (searchInput) {
-        searchInput.addEventListener("keyup", filterTable);
+        searchInput.addEventListener("keyup", () => {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => loadUsers(false), 300);
+        });
     }
 
     // Filter buttons event
@@ -572,10 +592,82 @@ function initializeAdminUsers() {
         btn.addEventListener("click", () => {
             filterButtons.forEach(b => b.classList.remove("active"));
             btn.classList.add("active");
-            filterTable();
+            loadUsers(false);
         });
     });
 
+    // Load the next page
+    if (loadMoreBtn) {
+        loadMoreBtn.addEventListener("click", () => loadUsers(true));
+    }
+
+    // Bulk actions on the selected rows
+    const bulkActions = document.querySelector(".bulk-actions");
+    const bulkSelect = document.querySelector(".bulk-action-select");
+    const bulkApplyBtn = document.querySelector(".bulk-apply-btn");
+    const selectAll = document.querySelector(".select-all-checkbox");
+
+    function selectedUserIds() {
+        return Array.from(document.querySelectorAll(".row-checkbox:checked")).map(cb => cb.value);
+    }
+
+    function updateBulkState() {
+        if (!bulkApplyBtn) return;
+        const count = selectedUserIds().length;
+        bulkApplyBtn.querySelector(".bulk-count").textContent = count;
+        bulkApplyBtn.disabled = count === 0 || !bulkSelect.value;
+    }
+
+    if (selectAll) {
+        selectAll.addEventListener("change", () => {
+            document.querySelectorAll(".row-checkbox").forEach(cb => { cb.checked = selectAll.checked; });
+            updateBulkState();
+        });
+    }
+    if (tableBody) {
+        tableBody.addEventListener("change", (e) => {
+            if (e.target.classList.contains("row-checkbox")) updateBulkState();
+        });
+    }
+    if (bulkSelect) {
+        bulkSelect.addEventListener("change", updateBulkState);
+    }
+
+    if (bulkApplyBtn) {
+        bulkApplyBtn.addEventListener("click", async () => {
+            const userIds = selectedUserIds();
+            const action = bulkSelect.value;
+            if (!action || !userIds.length) return;
+
+            const label = bulkSelect.options[bulkSelect.selectedIndex].textContent;
+            if (!confirm(`${label} for ${userIds.length} selected user(s)?`)) return;
+
+            bulkApplyBtn.disabled = true;
+            try {
+                const response = await fetch(bulkActions.dataset.url, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'X-CSRFToken': getCookie('csrftoken')
+                    },
+                    body: JSON.stringify({ action: action, user_ids: userIds })
+                });
+                const data = await response.json();
+                if (!data.success) throw new Error(data.message);
+
+                const failures = Object.values(data.results || {}).filter(r => !r.success);
+                showNotification(data.message, failures.length ? 'info' : 'success');
+                if (selectAll) selectAll.checked = false;
+                await loadUsers(false);
+            } catch (error) {
+                console.error('Bulk action error:', error);
+                showNotification('Bulk action failed: ' + error.message, 'error');
+            } finally {
+                updateBulkState();
+            }
+        });
+    }
+
     // Add User button
     if (addUserBtn) {
         addUserBtn.addEventListener('click', showAddUserModal);
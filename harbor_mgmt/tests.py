@@ -0,0 +1,1367 @@
+import csv
+import gzip
+import importlib
+import json
+import logging
+import os
+import re
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from harbor_mgmt import expiry, jobs, slowqueries, timing, warmup
+from harbor_mgmt.backends import ProfileBackend
+from harbor_mgmt.bulk import BULK_USER_LIMIT
+from harbor_mgmt.carts import CART_COOKIE, BookingCart, purge_expired_carts
+from harbor_mgmt.details import decode_details, details_q, encode_details
+from harbor_mgmt.exports import CSV_COLUMNS, filter_bookings
+from harbor_mgmt.idempotency import IDEMPOTENCY_KEY_TTL, purge_expired_idempotency_keys
+from harbor_mgmt.inventory import (
+    SeatsUnavailable, UnknownSailing, checkout_session_expiry, confirm_holds, hold_seats, release_stale_holds,
+    renew_checkout_holds, sync_inventory, voyage_key,
+)
+from harbor_mgmt.management.commands.check_query_plans import hot_queries, seed_bookings, uses_index
+from harbor_mgmt.models import (
+    AdminJob, AdminJobFile, Booking, BookingDailyStats, CartEntry, IdempotencyKey, Passenger, SeatHold, SeatInventory,
+    SlowQuery, UserProfile,
+)
+from harbor_mgmt.pagecache import CSRF_INPUT_RE, CSRF_PLACEHOLDER, page_cache_key
+from harbor_mgmt.passengers import create_passengers
+from harbor_mgmt.references import (
+    check_character, is_valid_booking_reference, new_booking_reference, normalize_booking_reference,
+)
+from harbor_mgmt.rollups import rebuild_daily_stats
+from harbor_mgmt.search import search_bookings
+from harbor_mgmt.sessions import purge_expired_sessions
+from harbor_mgmt.views import cache_voyages, get_cached_booking_details, voyage_fragment_key
+
+
+class SessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('traveller', password='harbor-pass-123')
+
+    def test_logout_invalidates_session_on_other_workers(self):
+        self.client.force_login(self.user)
+        session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+        # Another worker serves the same cookie once, warming its own cache
+        other_worker = Client()
+        other_worker.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        self.assertEqual(other_worker.get(reverse('reservations')).status_code, 200)
+        other_cache = (dict(cache._cache), dict(cache._expire_info))
+
+        cache.clear()
+        self.client.get(reverse('logout'))
+
+        # ...and still has that cache after the logout on this worker
+        cache._cache.update(other_cache[0])
+        cache._expire_info.update(other_cache[1])
+        response = other_worker.get(reverse('reservations'))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith(reverse('login')))
+        self.assertFalse(Session.objects.filter(session_key=session_key).exists())
+
+    def test_sessions_use_the_cache_only_when_it_is_shared(self):
+        engines = {}
+        for redis_url in ('', 'redis://cache.internal:6379/0'):
+            engines[redis_url] = subprocess.run(
+                [sys.executable, '-c', 'from HarborHop import settings; print(settings.SESSION_ENGINE)'],
+                cwd=settings.BASE_DIR,
+                env=dict(os.environ, REDIS_URL=redis_url),
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        self.assertEqual(engines[''], 'django.contrib.sessions.backends.db')
+        self.assertEqual(engines['redis://cache.internal:6379/0'], 'django.contrib.sessions.backends.cached_db')
+
+    def test_purge_expired_sessions_keeps_live_ones(self):
+        now = timezone.now()
+        for number in range(5):
+            Session.objects.create(session_key=f'expired{number}', session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='live', session_data='', expire_date=now + timedelta(days=1))
+
+        self.assertEqual(purge_expired_sessions(now=now, batch_size=2), 5)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+
+
+class BookingCartTests(TestCase):
+    """Each BookingCart stands for one request, possibly on a different worker"""
+
+    def setUp(self):
+        cache.clear()
+        self.worker_a = BookingCart()
+        self.worker_a.set_many({'booking_selections': {'outbound': 1}, 'passenger_info_completed': True})
+        self.cart_id = self.worker_a.cart_id
+
+    def test_other_worker_sees_the_latest_write(self):
+        worker_b = BookingCart(self.cart_id)
+        self.assertEqual(worker_b.get('booking_selections'), {'outbound': 1})
+
+        BookingCart(self.cart_id).set('booking_selections', {'outbound': 2})
+        cache.clear()
+        self.assertEqual(BookingCart(self.cart_id).get('booking_selections'), {'outbound': 2})
+
+    def test_popped_entry_is_gone_for_every_worker(self):
+        worker_b = BookingCart(self.cart_id)
+        self.assertEqual(worker_b.get('passenger_info_completed'), True)
+
+        self.assertIs(BookingCart(self.cart_id).pop('passenger_info_completed', False), True)
+        self.assertIs(BookingCart(self.cart_id).pop('passenger_info_completed', False), False)
+        self.assertIsNone(BookingCart(self.cart_id).get('passenger_info_completed'))
+
+    def test_clear_removes_every_entry(self):
+        self.worker_a.clear()
+        self.assertFalse(CartEntry.objects.filter(cart_id=self.cart_id).exists())
+        self.assertIsNone(BookingCart(self.cart_id).get('booking_selections'))
+
+    def test_expired_entries_are_not_read_and_get_purged(self):
+        CartEntry.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(BookingCart(self.cart_id).get('booking_selections'))
+        self.assertEqual(purge_expired_carts(), 2)
+
+    def test_invalid_cart_cookie_is_ignored(self):
+        self.assertIsNone(BookingCart('../not-a-cart').cart_id)
+
+    def test_middleware_sets_cookie_on_write(self):
+        user = User.objects.create_user('cart-user', password='harbor-pass-123')
+        self.client.force_login(user)
+        response = self.client.post(
+            reverse('store_booking_selection'), data='{"selections": {"outbound": 3}}', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        cart_id = response.cookies[CART_COOKIE].value
+        self.assertEqual(BookingCart(cart_id).get('booking_selections'), {'outbound': 3})
+
+
+class SharedCacheBookingCartTests(TestCase):
+    """With a shared cache (one LocMemCache stands in for Redis) reads skip the table"""
+
+    def setUp(self):
+        patcher = mock.patch('harbor_mgmt.carts.USE_CACHE', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        cart = BookingCart()
+        cart.set_many({'booking_selections': {'outbound': 1}, 'passenger_info_completed': True})
+        self.cart_id = cart.cart_id
+
+    def test_reads_are_served_from_the_cache(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(BookingCart(self.cart_id).get('booking_selections'), {'outbound': 1})
+
+    def test_cache_miss_falls_back_to_the_table_and_refills(self):
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(BookingCart(self.cart_id).get('booking_selections'), {'outbound': 1})
+        with self.assertNumQueries(0):
+            BookingCart(self.cart_id).get('booking_selections')
+
+    def test_pop_and_clear_reach_every_reader(self):
+        self.assertIs(BookingCart(self.cart_id).pop('passenger_info_completed', False), True)
+        self.assertIs(BookingCart(self.cart_id).pop('passenger_info_completed', False), False)
+        self.assertIsNone(BookingCart(self.cart_id).get('passenger_info_completed'))
+
+        BookingCart(self.cart_id).clear()
+        self.assertIsNone(BookingCart(self.cart_id).get('booking_selections'))
+
+
+OUTBOUND_LEG = {
+    'company': 'Harbor Lines',
+    'vessel': 'MV Test',
+    'departureDateTime': '2030-01-10T08:00:00',
+    'accommodationName': 'Tourist',
+    'price': 500.0,
+}
+
+
+def make_booking(user, adults=2, leg=OUTBOUND_LEG, **fields):
+    fields.setdefault('status', 'pending')
+    fields.setdefault('departure_date', date(2030, 1, 10))
+    return Booking.objects.create(
+        user=user,
+        origin='Cebu',
+        destination='Tagbilaran',
+        adults=adults,
+        total_price=1000,
+        details={'outbound': dict(leg), 'total_price': 1000},
+        **fields,
+    )
+
+
+def barkota_results(remaining):
+    return [{
+        'voyage': {
+            'shippingLine': {'name': OUTBOUND_LEG['company']},
+            'vesselName': OUTBOUND_LEG['vessel'],
+            'departureDateTime': OUTBOUND_LEG['departureDateTime'],
+        },
+        'accommodations': [{'name': 'Tourist', 'remaining': remaining}],
+    }]
+
+
+class SeatLedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ledger', password='harbor-pass-123')
+        self.inventory = SeatInventory.objects.create(
+            voyage_key=voyage_key(OUTBOUND_LEG['company'], OUTBOUND_LEG['vessel'], OUTBOUND_LEG['departureDateTime']),
+            accommodation='Tourist',
+            capacity=3,
+        )
+
+    def held(self):
+        self.inventory.refresh_from_db()
+        return self.inventory.held
+
+    def test_hold_never_goes_past_capacity(self):
+        hold_seats(make_booking(self.user, adults=2))
+        with self.assertRaises(SeatsUnavailable):
+            hold_seats(make_booking(self.user, adults=2))
+        self.assertEqual(self.held(), 2)
+
+    def test_unknown_sailing_is_rejected(self):
+        booking = make_booking(self.user, leg={**OUTBOUND_LEG, 'vessel': 'MV Unknown'})
+        with self.assertRaises(UnknownSailing):
+            hold_seats(booking)
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_stale_checkout_releases_seats_once(self):
+        hold_seats(make_booking(self.user), expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(release_stale_holds(), 1)
+        self.assertEqual(release_stale_holds(), 0)
+        self.assertEqual(self.held(), 0)
+
+    def test_payment_after_expiry_retakes_released_seats(self):
+        booking = make_booking(self.user)
+        hold_seats(booking, expires_at=timezone.now() - timedelta(minutes=1))
+        release_stale_holds()
+
+        confirm_holds(booking)
+        self.assertEqual(self.held(), 2)
+        self.assertEqual(booking.seat_holds.filter(released_at__isnull=True, expires_at__isnull=True).count(), 1)
+
+    def test_payment_after_expiry_fails_when_seats_were_sold(self):
+        booking = make_booking(self.user)
+        hold_seats(booking, expires_at=timezone.now() - timedelta(minutes=1))
+        release_stale_holds()
+        hold_seats(make_booking(self.user, adults=3))
+
+        with self.assertRaises(SeatsUnavailable):
+            confirm_holds(booking)
+        self.assertEqual(self.held(), 3)
+
+    def test_paid_hold_is_never_released_as_stale(self):
+        booking = make_booking(self.user)
+        hold_seats(booking, expires_at=timezone.now() - timedelta(minutes=1))
+        confirm_holds(booking)
+        self.assertEqual(release_stale_holds(), 0)
+        self.assertEqual(self.held(), 2)
+
+    def test_renewing_a_checkout_never_shortens_a_reservation(self):
+        reserved_until = timezone.now() + timedelta(hours=48)
+        booking = make_booking(self.user, status='reserved', reserved_until=reserved_until)
+        hold_seats(booking, expires_at=reserved_until)
+        renew_checkout_holds(booking)
+        self.assertEqual(booking.seat_holds.get().expires_at, reserved_until)
+
+    def test_cached_results_read_the_ledger_without_resyncing(self):
+        hold_seats(make_booking(self.user, adults=2))
+
+        voyages = sync_inventory(barkota_results(10), refresh=False)
+        self.assertEqual(voyages[0]['accommodations'][0]['remaining'], 1)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.capacity, 3)
+
+        voyages = sync_inventory(barkota_results(10))
+        self.assertEqual(voyages[0]['accommodations'][0]['remaining'], 8)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.capacity, 10)
+
+    def test_admin_cancel_releases_seats(self):
+        booking = make_booking(self.user, adults=2)
+        hold_seats(booking)
+        admin = User.objects.create_superuser('ledger-admin', password='harbor-pass-123')
+        self.client.force_login(admin)
+
+        response = self.client.post(reverse('admin:harbor_mgmt_booking_change', args=[booking.pk]), {
+            'user': self.user.pk,
+            'status': 'cancelled',
+            'trip_type': booking.trip_type,
+            'origin': booking.origin,
+            'destination': booking.destination,
+            'departure_date': '2030-01-10',
+            'shipping_line': 'Harbor Lines',
+            'adults': 2,
+            'children': 0,
+            'total_price': '1000',
+            'passengers-TOTAL_FORMS': '0',
+            'passengers-INITIAL_FORMS': '0',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.held(), 0)
+        self.assertIsNotNone(booking.seat_holds.get().released_at)
+
+
+class ReservationSweepTests(TestCase):
+    def test_housekeeping_waits_for_the_sweeper_lock(self):
+        held_elsewhere = mock.MagicMock()
+        held_elsewhere.return_value.__enter__.return_value = False
+        with (
+            mock.patch.object(expiry, 'advisory_lock', held_elsewhere),
+            mock.patch.object(expiry, 'purge_expired_sessions') as purge_sessions,
+            mock.patch.object(expiry, 'trim_slow_queries') as trim,
+        ):
+            self.assertIsNone(expiry.expire_reservations())
+        purge_sessions.assert_not_called()
+        trim.assert_not_called()
+
+        metrics = expiry.expire_reservations()
+        self.assertEqual(metrics['sessions_purged'], 0)
+        self.assertEqual(metrics['carts_purged'], 0)
+
+    def buckets(self):
+        return sorted(BookingDailyStats.objects.filter(bookings__gt=0).values_list('status', 'bookings', 'passengers'))
+
+    def test_rollup_deltas_match_a_rebuild(self):
+        user = User.objects.create_user('sweep-owner', password='harbor-pass-123')
+        now = timezone.now()
+        for adults in (1, 2, 3):
+            make_booking(user, adults=adults, status='reserved', reserved_until=now - timedelta(minutes=5))
+        make_booking(user, status='reserved', reserved_until=now + timedelta(hours=1))
+        make_booking(user, status='confirmed')
+
+        metrics = expiry.expire_reservations(batch_size=2, now=now)
+        self.assertEqual((metrics['expired'], metrics['batches']), (3, 2))
+        self.assertEqual(Booking.objects.filter(status='expired').count(), 3)
+
+        incremental = self.buckets()
+        self.assertEqual(incremental, [('confirmed', 1, 2), ('expired', 3, 6), ('reserved', 1, 2)])
+        rebuild_daily_stats(Booking.objects.all(), BookingDailyStats)
+        self.assertEqual(self.buckets(), incremental)
+
+    def test_expiry_releases_the_seat_holds(self):
+        user = User.objects.create_user('sweep-holder', password='harbor-pass-123')
+        inventory = SeatInventory.objects.create(
+            voyage_key=voyage_key(OUTBOUND_LEG['company'], OUTBOUND_LEG['vessel'], OUTBOUND_LEG['departureDateTime']),
+            accommodation='Tourist',
+            capacity=5,
+        )
+        booking = make_booking(user, status='reserved', reserved_until=timezone.now() - timedelta(minutes=5))
+        hold_seats(booking, expires_at=booking.reserved_until + timedelta(days=1))
+
+        self.assertEqual(expiry.expire_reservations()['expired'], 1)
+        inventory.refresh_from_db()
+        self.assertEqual(inventory.held, 0)
+
+
+class VoyageFragmentKeyTests(TestCase):
+    CACHE_KEY = 'voyage_1_2_2030-01-10_2'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('fragment-owner', password='harbor-pass-123')
+        cache_voyages(self.CACHE_KEY, barkota_results(10))
+
+    def fragment_key(self, refresh=False):
+        voyages = sync_inventory(cache.get(self.CACHE_KEY), refresh=refresh)
+        return voyage_fragment_key(self.CACHE_KEY, voyages)
+
+    def test_key_changes_when_a_seat_hold_is_taken(self):
+        before = self.fragment_key(refresh=True)
+        self.assertEqual(self.fragment_key(), before)
+
+        hold_seats(make_booking(self.user, adults=2))
+        self.assertNotEqual(self.fragment_key(), before)
+
+    def test_key_changes_when_the_search_is_fetched_again(self):
+        before = self.fragment_key(refresh=True)
+        cache_voyages(self.CACHE_KEY, barkota_results(10))
+        self.assertNotEqual(self.fragment_key(refresh=True), before)
+
+
+class StripeCheckoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('payer', password='harbor-pass-123')
+        self.client.force_login(self.user)
+        self.inventory = SeatInventory.objects.create(
+            voyage_key=voyage_key(OUTBOUND_LEG['company'], OUTBOUND_LEG['vessel'], OUTBOUND_LEG['departureDateTime']),
+            accommodation='Tourist',
+            capacity=2,
+        )
+        self.booking = make_booking(self.user)
+        hold_seats(self.booking, expires_at=timezone.now() - timedelta(minutes=1))
+        release_stale_holds()
+
+    def test_checkout_session_expires_with_the_hold(self):
+        with mock.patch('stripe.checkout.Session.create', return_value=SimpleNamespace(id='cs_test_1')) as create:
+            response = self.client.post(reverse('stripe_checkout', args=[self.booking.id]))
+
+        self.assertEqual(response.json(), {'sessionId': 'cs_test_1'})
+        hold = self.booking.seat_holds.get(released_at__isnull=True)
+        self.assertEqual(create.call_args.kwargs['expires_at'], int(checkout_session_expiry(hold.expires_at).timestamp()))
+
+    def test_checkout_is_refused_when_seats_are_gone(self):
+        hold_seats(make_booking(self.user, adults=2))
+        with mock.patch('stripe.checkout.Session.create') as create:
+            response = self.client.post(reverse('stripe_checkout', args=[self.booking.id]))
+        self.assertEqual(response.status_code, 409)
+        create.assert_not_called()
+
+    def test_late_payment_for_sold_seats_is_refunded(self):
+        hold_seats(make_booking(self.user, adults=2))
+        session = SimpleNamespace(id='cs_test_2', payment_status='paid', payment_intent='pi_test_2')
+        with mock.patch('stripe.checkout.Session.retrieve', return_value=session), \
+                mock.patch('stripe.Refund.create') as refund:
+            response = self.client.get(reverse('stripe_success', args=[self.booking.id]), {'session_id': 'cs_test_2'})
+
+        self.assertRedirects(response, reverse('reservations'), fetch_redirect_response=False)
+        refund.assert_called_once_with(payment_intent='pi_test_2')
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'cancelled')
+        self.assertEqual(self.booking.details['payment']['status'], 'refunded')
+
+    def test_late_payment_with_seats_left_completes(self):
+        session = SimpleNamespace(id='cs_test_3', payment_status='paid', payment_intent='pi_test_3')
+        with mock.patch('stripe.checkout.Session.retrieve', return_value=session), \
+                mock.patch('stripe.Refund.create') as refund:
+            self.client.get(reverse('stripe_success', args=[self.booking.id]), {'session_id': 'cs_test_3'})
+
+        refund.assert_not_called()
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'completed')
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.held, 2)
+
+    def checkout(self, key='double-click-key', **create):
+        create.setdefault('return_value', SimpleNamespace(id='cs_test_4'))
+        with mock.patch('stripe.checkout.Session.create', **create) as session_create:
+            response = self.client.post(reverse('stripe_checkout', args=[self.booking.id]), HTTP_IDEMPOTENCY_KEY=key)
+        return response, session_create
+
+    def test_repeated_checkout_replays_the_first_session(self):
+        first, create = self.checkout()
+        second, create_again = self.checkout()
+        self.assertEqual(first.json(), {'sessionId': 'cs_test_4'})
+        self.assertEqual(second.json(), {'sessionId': 'cs_test_4'})
+        create.assert_called_once()
+        create_again.assert_not_called()
+
+    def test_stripe_is_called_after_the_claim_commits(self):
+        outer_blocks = len(connection.atomic_blocks)
+
+        def create(**kwargs):
+            self.assertEqual(len(connection.atomic_blocks), outer_blocks)
+            self.assertTrue(IdempotencyKey.objects.filter(key='double-click-key').exists())
+            return SimpleNamespace(id='cs_test_5')
+
+        response, _create = self.checkout(return_value=None, side_effect=create)
+        self.assertEqual(response.json(), {'sessionId': 'cs_test_5'})
+        self.assertEqual(IdempotencyKey.objects.get(key='double-click-key').result, {'sessionId': 'cs_test_5'})
+
+    def test_retry_after_a_failed_stripe_call_repeats_the_same_call(self):
+        with mock.patch('stripe.checkout.Session.create', side_effect=ConnectionError('stripe unreachable')) as failed:
+            with self.assertRaises(ConnectionError):
+                self.client.post(reverse('stripe_checkout', args=[self.booking.id]), HTTP_IDEMPOTENCY_KEY='double-click-key')
+        response, create = self.checkout()
+
+        self.assertEqual(response.json(), {'sessionId': 'cs_test_4'})
+        self.assertEqual(create.call_args.kwargs, failed.call_args.kwargs)
+        self.assertEqual(IdempotencyKey.objects.get(key='double-click-key').booking, self.booking)
+
+
+class IdempotencyKeyTests(TestCase):
+    def test_purge_removes_only_expired_keys(self):
+        user = User.objects.create_user('repeat-clicker', password='harbor-pass-123')
+        now = timezone.now()
+        for number in range(3):
+            IdempotencyKey.objects.create(user=user, scope='create_booking', key=f'old-key-{number}')
+        IdempotencyKey.objects.update(created_at=now - IDEMPOTENCY_KEY_TTL - timedelta(minutes=1))
+        IdempotencyKey.objects.create(user=user, scope='create_booking', key='fresh-key')
+
+        self.assertEqual(purge_expired_idempotency_keys(now=now, batch_size=2), 3)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['fresh-key'])
+
+
+class ProfileBackendTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('backend-user', password='harbor-pass-123')
+
+    def test_sessions_from_model_backend_stay_logged_in(self):
+        session = self.client.session
+        session[SESSION_KEY] = str(self.user.pk)
+        session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+        session[HASH_SESSION_KEY] = self.user.get_session_auth_hash()
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+        self.assertEqual(self.client.get(reverse('reservations')).status_code, 200)
+
+    def test_login_uses_profile_backend(self):
+        self.assertTrue(self.client.login(username='backend-user', password='harbor-pass-123'))
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], 'harbor_mgmt.backends.ProfileBackend')
+        self.assertFalse(self.client.login(username='backend-user', password='wrong-pass'))
+
+    def test_failed_login_hashes_the_password_once(self):
+        with mock.patch('django.contrib.auth.base_user.check_password', return_value=False) as check:
+            self.assertFalse(self.client.login(username='backend-user', password='wrong-pass'))
+        self.assertEqual(check.call_count, 1)
+
+        with mock.patch('django.contrib.auth.base_user.make_password', return_value='!') as make:
+            self.assertFalse(self.client.login(username='no-such-user', password='wrong-pass'))
+        self.assertEqual(make.call_count, 1)
+
+    def test_get_user_loads_profile_in_one_query(self):
+        with self.assertNumQueries(1):
+            user = ProfileBackend().get_user(self.user.pk)
+            user.profile.is_admin_user
+
+
+def make_admin(username='harbor-admin'):
+    user = User.objects.create_user(username, password='harbor-pass-123')
+    user.profile.is_admin_user = True
+    user.profile.save()
+    return user
+
+
+class AdminUsersApiTests(TestCase):
+    def setUp(self):
+        self.admin = make_admin()
+        self.client.force_login(self.admin)
+        joined = timezone.now() - timedelta(days=3)
+        for number in range(7):
+            User.objects.create_user(f'same-second-{number}', password='harbor-pass-123')
+        User.objects.exclude(pk=self.admin.pk).update(date_joined=joined)
+
+    def page(self, **params):
+        response = self.client.get(reverse('admin_users_api'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_cursor_pages_cover_equal_join_dates_exactly_once(self):
+        seen = []
+        params = {'limit': 3}
+        while True:
+            page = self.page(**params)
+            seen.extend(user['id'] for user in page['users'])
+            if not page['next_cursor']:
+                break
+            params['cursor'] = page['next_cursor']
+
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(sorted(seen), sorted(User.objects.values_list('pk', flat=True)))
+        # Newest first, ties broken by id
+        self.assertEqual(seen[0], self.admin.pk)
+        self.assertEqual(seen[1:], sorted(seen[1:], reverse=True))
+
+    def test_bad_cursor_and_limit_are_rejected(self):
+        for params in ({'cursor': 'not-a-cursor'}, {'limit': 0}, {'limit': 'many'}):
+            response = self.client.get(reverse('admin_users_api'), params)
+            self.assertEqual(response.status_code, 400)
+
+
+class BulkUserActionTests(TestCase):
+    def setUp(self):
+        self.admin = make_admin()
+        self.client.force_login(self.admin)
+
+    def post(self, data):
+        return self.client.post(reverse('bulk_user_action'), json.dumps(data), content_type='application/json')
+
+    def test_results_per_id_and_the_acting_admin_is_skipped(self):
+        target = User.objects.create_user('bulk-target', password='harbor-pass-123')
+        response = self.post({'action': 'deactivate', 'user_ids': [self.admin.pk, target.pk, 999999]})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+
+        self.assertEqual(results[str(target.pk)], {'success': True, 'message': 'Deactivated: bulk-target'})
+        self.assertEqual(results[str(self.admin.pk)]['success'], False)
+        self.assertEqual(results['999999'], {'success': False, 'message': 'User not found'})
+        self.assertFalse(User.objects.get(pk=target.pk).is_active)
+        self.assertTrue(User.objects.get(pk=self.admin.pk).is_active)
+
+    def test_make_admin_creates_missing_profiles(self):
+        target = User.objects.create_user('bulk-no-profile', password='harbor-pass-123')
+        UserProfile.objects.filter(user=target).delete()
+        self.assertEqual(self.post({'action': 'make_admin', 'user_ids': [target.pk]}).status_code, 200)
+        self.assertTrue(UserProfile.objects.get(user=target).is_admin_user)
+
+    def test_selections_over_the_limit_become_a_job(self):
+        user_ids = list(range(1, BULK_USER_LIMIT + 2))
+        response = self.post({'action': 'delete', 'user_ids': user_ids})
+        self.assertEqual(response.status_code, 202)
+
+        job = AdminJob.objects.get(pk=response.json()['job_id'])
+        self.assertEqual(job.kind, 'bulk_user_action')
+        self.assertEqual(job.params, {'action': 'delete', 'user_ids': user_ids})
+        self.assertTrue(User.objects.filter(pk=self.admin.pk).exists())
+
+        self.assertTrue(jobs.run_job(jobs.claim_next_job()))
+        self.assertTrue(User.objects.filter(pk=self.admin.pk).exists())
+
+    def test_unknown_action_is_rejected(self):
+        self.assertEqual(self.post({'action': 'promote', 'user_ids': [1]}).status_code, 400)
+
+    def test_non_object_body_is_rejected(self):
+        for body in ([1, 2], 'deactivate', 7, None):
+            response = self.post(body)
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(response.json()['success'])
+
+
+class CachePolicyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('etag-owner', password='harbor-pass-123')
+        self.booking = make_booking(self.user, status='reserved')
+        self.client.force_login(self.user)
+
+    def reservations(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(reverse('reservations'), **headers)
+
+    def test_matching_etag_is_answered_with_304(self):
+        response = self.reservations()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        etag = response['ETag']
+
+        with mock.patch('harbor_mgmt.views.render') as render:
+            self.assertEqual(self.reservations(etag).status_code, 304)
+        render.assert_not_called()
+
+    def test_cancel_changes_the_etag(self):
+        etag = self.reservations()['ETag']
+        self.client.post(reverse('cancel_reservation', args=[self.booking.pk]))
+
+        response = self.reservations(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_pending_flash_message_runs_the_view(self):
+        Booking.objects.filter(pk=self.booking.pk).update(status='cancelled')
+        etag = self.reservations()['ETag']
+        # Already cancelled: only queues an info message, nothing changes
+        self.client.post(reverse('cancel_reservation', args=[self.booking.pk]))
+
+        with mock.patch('harbor_mgmt.views.render', return_value=HttpResponse()) as render:
+            response = self.reservations(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], etag)
+        render.assert_called_once()
+
+    def test_public_pages_revalidate_on_their_body(self):
+        self.client.logout()
+        response = self.client.get(reverse('latest_offer'))
+        self.assertIn('public', response['Cache-Control'])
+        self.assertEqual(self.client.get(reverse('latest_offer'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = make_admin()
+
+    def test_admins_get_the_header(self):
+        self.client.force_login(self.admin)
+        with mock.patch.object(timing, 'SAMPLE_RATE', 0):
+            response = self.client.get(reverse('admin_dashboard'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=[\d.]+$')
+
+    def test_other_users_do_not(self):
+        self.client.force_login(User.objects.create_user('plain', password='harbor-pass-123'))
+        with mock.patch.object(timing, 'SAMPLE_RATE', 0):
+            response = self.client.get(reverse('reservations'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_sampled_request_writes_one_log_line(self):
+        with mock.patch.object(timing, 'SAMPLE_RATE', 1), self.assertLogs('harbor_mgmt.timing', 'INFO') as logs:
+            self.client.get(reverse('contact_us'))
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('request_timing method=GET path=/contact/ status=200', logs.output[0])
+
+    def test_log_line_is_enabled_by_the_logging_config(self):
+        self.assertTrue(timing.logger.isEnabledFor(logging.INFO))
+
+    def test_streamed_export_counts_queries_run_while_streaming(self):
+        make_booking(self.admin)
+        self.client.force_login(self.admin)
+        with mock.patch.object(timing, 'SAMPLE_RATE', 1), self.assertLogs('harbor_mgmt.timing', 'INFO') as logs:
+            response = self.client.get(reverse('export_bookings'))
+            self.assertIn('desc="until headers"', response['Server-Timing'])
+            self.assertEqual(logs.output, [])
+            b''.join(response.streaming_content)
+        db_queries = int(re.search(r'db_queries=(\d+)', logs.output[0]).group(1))
+        headers_queries = int(re.search(r'"(\d+) queries"', response['Server-Timing']).group(1))
+        self.assertGreater(db_queries, headers_queries)
+
+
+class QueryPlanTests(TestCase):
+    """The hot queries must keep using the indexes built for them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_id = seed_bookings(3000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_hot_queries_use_their_index(self):
+        for name, (index_name, queryset) in hot_queries(self.user_id).items():
+            with self.subTest(name):
+                plan = queryset.explain()
+                table = queryset.model._meta.db_table
+                self.assertTrue(uses_index(plan, index_name, connection.vendor, table), f"{index_name} not used:\n{plan}")
+
+
+class AdminJobTests(TestCase):
+    def setUp(self):
+        self.admin = make_admin()
+
+    def running_job(self, attempts, heartbeat_age):
+        return AdminJob.objects.create(
+            kind='rebuild_booking_stats',
+            status='running',
+            attempts=attempts,
+            heartbeat_at=timezone.now() - timedelta(seconds=heartbeat_age),
+        )
+
+    def test_export_is_stored_in_the_database_for_the_web_process(self):
+        make_booking(self.admin)
+        job = jobs.enqueue('export_bookings', {'format': 'csv'}, self.admin)
+        self.assertTrue(jobs.run_job(jobs.claim_next_job()))
+
+        job_file = AdminJobFile.objects.get(job=job)
+        self.assertEqual(job_file.name, f'bookings-{job.pk}.csv')
+        self.client.force_login(self.admin)
+        self.assertTrue(self.client.get(reverse('admin_job_status', args=[job.pk])).json()['job']['result_url'])
+        response = self.client.get(reverse('admin_job_result', args=[job.pk]))
+        content = b''.join(response.streaming_content)
+        self.assertEqual(content, gzip.decompress(bytes(job_file.data)))
+        self.assertEqual(len(content), job_file.size)
+        self.assertEqual(len(content.decode().splitlines()), 2)
+
+    def test_stale_job_is_requeued_until_the_attempts_cap(self):
+        retry = self.running_job(attempts=1, heartbeat_age=700)
+        poison = self.running_job(attempts=jobs.MAX_ATTEMPTS, heartbeat_age=700)
+        alive = self.running_job(attempts=jobs.MAX_ATTEMPTS, heartbeat_age=10)
+
+        self.assertEqual(jobs.requeue_stale_jobs(600), (1, 1))
+        self.assertEqual(AdminJob.objects.get(pk=retry.pk).status, 'queued')
+        self.assertEqual(AdminJob.objects.get(pk=poison.pk).status, 'failed')
+        self.assertEqual(AdminJob.objects.get(pk=alive.pk).status, 'running')
+
+
+class JobHeartbeatTests(TransactionTestCase):
+    def test_long_handler_keeps_its_heartbeat_fresh(self):
+        started = timezone.now() - timedelta(hours=1)
+        job = AdminJob.objects.create(kind='rebuild_booking_stats', status='running', heartbeat_at=started)
+        heartbeat = jobs.Heartbeat(job.pk, interval=0.05)
+        heartbeat.start()
+        try:
+            time.sleep(0.3)
+        finally:
+            heartbeat.stop()
+        self.assertGreater(AdminJob.objects.get(pk=job.pk).heartbeat_at, started + timedelta(minutes=59))
+
+
+class BookingReferenceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ref-owner', password='harbor-pass-123')
+        self.booking = make_booking(self.user)
+        self.reference = self.booking.booking_reference
+
+    def test_new_reference_has_a_valid_check_character(self):
+        reference = new_booking_reference()
+        self.assertRegex(reference, r'^HH-[0-9A-HJKMNP-TV-Z]{10}$')
+        self.assertTrue(is_valid_booking_reference(reference))
+        self.assertEqual(check_character(reference[3:-1]), reference[-1])
+
+    def test_check_character_catches_single_typos_and_transpositions(self):
+        # Luhn mod 32 misses swapping 0 and Z, so the code avoids that pair
+        code = '1C8ZQ4TNX' + check_character('1C8ZQ4TNX')
+        for position in range(len(code)):
+            for char in '0123456789ABCDEFGHJKMNPQRSTVWXYZ':
+                if char != code[position]:
+                    typo = code[:position] + char + code[position + 1:]
+                    self.assertFalse(is_valid_booking_reference('HH-' + typo), typo)
+        for position in range(len(code) - 1):
+            swapped = code[:position] + code[position + 1] + code[position] + code[position + 2:]
+            if swapped != code:
+                self.assertFalse(is_valid_booking_reference('HH-' + swapped), swapped)
+
+    def test_typed_variants_normalize_to_the_stored_reference(self):
+        code = self.reference[3:]
+        variants = [
+            self.reference.lower(),
+            'HH' + code,
+            code,
+            f' hh {code[:4]}-{code[4:]} ',
+            self.reference.replace('1', 'I').replace('0', 'O'),
+            self.reference.replace('1', 'l'),
+        ]
+        for variant in variants:
+            with self.subTest(variant):
+                self.assertEqual(normalize_booking_reference(variant), self.reference)
+
+    def test_search_finds_a_booking_by_any_typed_form(self):
+        make_booking(self.user)
+        code = self.reference[3:]
+        for query in (self.reference.lower(), code, f'hh-{code[:5]}-{code[5:]}'):
+            with self.subTest(query):
+                self.assertEqual(list(search_bookings(Booking.objects.all(), query)), [self.booking])
+
+    def test_search_rejects_a_bad_check_character(self):
+        code = self.reference[3:]
+        wrong = next(char for char in 'XY' if char != code[-1])
+        self.assertFalse(search_bookings(Booking.objects.all(), f'HH-{code[:-1]}{wrong}').exists())
+
+    def test_search_still_matches_older_references_and_words(self):
+        legacy = make_booking(self.user, booking_reference='HH-A3K9M2L5')
+        self.assertEqual(list(search_bookings(Booking.objects.all(), 'hh-a3k9')), [legacy])
+        self.assertEqual(list(search_bookings(Booking.objects.all(), 'HH-A3K9M2L5')), [legacy])
+        # Ten letters, like a bare code, but a port name
+        self.assertEqual(search_bookings(Booking.objects.all(), 'tagbilaran').count(), 2)
+
+    def test_admin_search_normalizes_references(self):
+        self.client.force_login(User.objects.create_superuser('root', password='harbor-pass-123'))
+        response = self.client.get(reverse('admin:harbor_mgmt_booking_changelist'), {'q': self.reference.lower().replace('-', '')})
+        self.assertEqual(list(response.context['cl'].result_list), [self.booking])
+
+
+class AdminBookingsPageTests(TestCase):
+    def test_only_the_requested_page_is_enhanced(self):
+        admin = make_admin()
+        user = User.objects.create_user('page-owner', password='harbor-pass-123')
+        for _ in range(17):
+            make_booking(user)
+        self.client.force_login(admin)
+
+        response = self.client.get(reverse('admin_bookings'), {'page': 2})
+        page = response.context['bookings']
+        self.assertEqual(page.number, 2)
+        self.assertEqual(page.paginator.count, 17)
+        self.assertEqual(len(page.object_list), 2)
+        self.assertEqual(page.object_list[0]['outbound']['company'], 'Harbor Lines')
+
+
+class BookingExportTests(TestCase):
+    def setUp(self):
+        self.admin = make_admin()
+        self.user = User.objects.create_user('export-owner', password='harbor-pass-123', email='owner@example.com')
+        self.card = make_booking(self.user, status='confirmed')
+        self.card.set_details_key('payment', {'method': 'stripe_test', 'status': 'paid'})
+        Passenger.objects.create(booking=self.card, number=1, first_name='Ana', last_name='Cruz')
+        self.cash = make_booking(self.user, leg={**OUTBOUND_LEG, 'company': 'Ocean Jet'}, departure_date=date(2030, 2, 1))
+        self.cash.set_details_key('payment', {'method': 'cash'})
+
+    def filtered(self, **filters):
+        return set(filter_bookings(filters).values_list('pk', flat=True))
+
+    def test_filters(self):
+        both = {self.card.pk, self.cash.pk}
+        self.assertEqual(self.filtered(), both)
+        self.assertEqual(self.filtered(status='confirmed'), {self.card.pk})
+        self.assertEqual(self.filtered(company='Ocean Jet'), {self.cash.pk})
+        self.assertEqual(self.filtered(payment_method='stripe'), {self.card.pk})
+        self.assertEqual(self.filtered(payment_method='cash'), {self.cash.pk})
+        self.assertEqual(self.filtered(date_from='2030-01-15'), {self.cash.pk})
+        self.assertEqual(self.filtered(date_to='2030-01-15'), {self.card.pk})
+
+    def export(self, **params):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('export_bookings'), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_streams_the_filtered_bookings(self):
+        rows = list(csv.reader(self.export(format='csv', company='Harbor Lines').splitlines()))
+        self.assertEqual(rows[0], CSV_COLUMNS)
+        self.assertEqual(len(rows), 2)
+        row = dict(zip(CSV_COLUMNS, rows[1]))
+        self.assertEqual(row['reference'], self.card.booking_reference)
+        self.assertEqual(row['payment_method'], 'stripe_test')
+        self.assertEqual(row['outbound_company'], 'Harbor Lines')
+        self.assertIn('Ana Cruz', row['passengers'])
+
+    def test_ndjson_export_has_one_record_per_line(self):
+        records = [json.loads(line) for line in self.export(format='ndjson').splitlines()]
+        self.assertEqual({record['reference'] for record in records}, {self.card.booking_reference, self.cash.booking_reference})
+        card = next(record for record in records if record['reference'] == self.card.booking_reference)
+        self.assertEqual(card['user']['email'], 'owner@example.com')
+        self.assertEqual(card['passengers'][0]['first_name'], 'Ana')
+        self.assertIsNone(card['return'])
+
+    def test_unknown_format_is_rejected(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse('export_bookings'), {'format': 'xlsx'}).status_code, 400)
+
+
+class VoyageManifestTests(TestCase):
+    def setUp(self):
+        self.admin = make_admin()
+        self.user = User.objects.create_user('manifest-owner', password='harbor-pass-123')
+        self.key = voyage_key(OUTBOUND_LEG['company'], OUTBOUND_LEG['vessel'], OUTBOUND_LEG['departureDateTime'])
+
+        self.outbound = make_booking(self.user, status='confirmed')
+        self.returning = make_booking(self.user, leg={**OUTBOUND_LEG, 'vessel': 'MV Other'}, status='confirmed')
+        self.returning.set_details_key('return', dict(OUTBOUND_LEG))
+        self.cancelled = make_booking(self.user, status='cancelled')
+        self.elsewhere = make_booking(self.user, leg={**OUTBOUND_LEG, 'vessel': 'MV Other'})
+        for booking, name in ((self.outbound, 'Ana'), (self.returning, 'Ben'), (self.cancelled, 'Cara'), (self.elsewhere, 'Dan')):
+            Passenger.objects.create(booking=booking, number=1, first_name=name, last_name='Cruz')
+
+    def manifest(self, **params):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('voyage_manifest'), params)
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        return sorted((row[0], row[5]) for row in rows[1:])
+
+    def test_outbound_and_return_legs_are_listed(self):
+        self.assertEqual(self.manifest(voyage_key=self.key), [('outbound', 'Ana'), ('outbound', 'Cara'), ('return', 'Ben')])
+
+    def test_status_filter(self):
+        self.assertEqual(self.manifest(voyage_key=self.key, status='confirmed'), [('outbound', 'Ana'), ('return', 'Ben')])
+        self.assertEqual(self.manifest(voyage_key=self.key, status='cancelled,expired'), [('outbound', 'Cara')])
+
+    def test_key_can_be_given_as_its_parts(self):
+        rows = self.manifest(
+            company=OUTBOUND_LEG['company'], vessel=OUTBOUND_LEG['vessel'], departure=OUTBOUND_LEG['departureDateTime'],
+        )
+        self.assertEqual(len(rows), 3)
+
+    def test_missing_key_is_rejected(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse('voyage_manifest')).status_code, 400)
+
+    def test_migration_backfills_the_voyage_keys(self):
+        Booking.objects.update(outbound_voyage_key='', return_voyage_key='')
+        migration = importlib.import_module('harbor_mgmt.migrations.0015_booking_voyage_keys')
+        migration.backfill_voyage_keys(django_apps, None)
+        self.assertEqual(self.manifest(voyage_key=self.key), [('outbound', 'Ana'), ('outbound', 'Cara'), ('return', 'Ben')])
+
+
+class AdminDashboardTests(TestCase):
+    def test_user_statistics(self):
+        admin = make_admin()
+        User.objects.create_user('dashboard-user', password='harbor-pass-123')
+        User.objects.create_user('dashboard-inactive', password='harbor-pass-123', is_active=False)
+        self.client.force_login(admin)
+
+        response = self.client.get(reverse('admin_dashboard'))
+        self.assertEqual(response.context['total_users'], 3)
+        self.assertEqual(response.context['admin_users'], 1)
+        self.assertEqual(response.context['active_users'], 2)
+        self.assertEqual(response.context['new_this_month'], 3)
+        self.assertEqual(json.loads(response.context['chart_data']), [3])
+
+
+class BookingDetailsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('details-owner', password='harbor-pass-123', first_name='Ana')
+        self.booking = make_booking(self.user)
+        self.passenger = Passenger.objects.create(booking=self.booking, number=1, first_name='Ana', last_name='Cruz')
+
+    def details(self):
+        return get_cached_booking_details([self.booking.id])[self.booking.id]
+
+    def test_unchanged_booking_is_served_from_cache(self):
+        self.details()
+        with self.assertNumQueries(1):
+            self.details()
+
+    def test_renamed_user_is_shown(self):
+        self.details()
+        self.user.first_name = 'Maria'
+        self.user.save()
+        self.assertEqual(self.details()['user']['name'], 'Maria')
+
+    def test_edited_and_removed_passengers_are_shown(self):
+        self.details()
+        self.passenger.first_name = 'Bea'
+        self.passenger.save()
+        self.assertIn('Bea', str(self.details()['passengers']))
+
+        Passenger.objects.filter(pk=self.passenger.pk).delete()
+        self.assertNotIn('Bea', str(self.details()['passengers']))
+
+
+FULL_LEG = {
+    'company': 'Harbor Lines',
+    'vessel': 'N/A',
+    'departureDate': '2030-01-10',
+    'departureTime': '08:00',
+    'departureDateTime': '2030-01-10T08:00:00',
+    'accommodationName': 'Tourist',
+    'seatType': 'N/A',
+    'price': 500.0,
+    'distance': 0,
+    'originName': 'Cebu',
+    'destinationName': '',
+}
+
+
+class BookingDetailsCodecTests(TestCase):
+    def stored(self, booking):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT details FROM {Booking._meta.db_table} WHERE id = %s', [booking.pk])
+            return json.loads(cursor.fetchone()[0])
+
+    def test_one_way_round_trip(self):
+        details = {'outbound': dict(FULL_LEG), 'return': None, 'total_price': 500, 'infants': 0}
+        encoded = encode_details(details)
+        self.assertEqual(encoded['v'], 2)
+        self.assertEqual(decode_details(encoded), details)
+
+    def test_round_trip_with_both_legs(self):
+        return_leg = dict(FULL_LEG, originName='Tagbilaran', price=450.0)
+        details = {'outbound': dict(FULL_LEG), 'return': return_leg, 'total_price': 950, 'infants': 1}
+        self.assertEqual(decode_details(encode_details(details)), details)
+
+    def test_passengers_pass_through(self):
+        passengers = [{'first_name': 'Ana', 'type': 'adult'}, {'first_name': 'Ben', 'type': 'child'}]
+        details = {'outbound': dict(FULL_LEG), 'return': None, 'infants': 0, 'passengers': passengers}
+        encoded = encode_details(details)
+        self.assertEqual(encoded['passengers'], passengers)
+        self.assertEqual(decode_details(encoded), details)
+
+    def test_defaults_are_dropped_and_restored(self):
+        encoded = encode_details({'outbound': dict(FULL_LEG), 'return': None, 'infants': 0})
+        self.assertEqual(set(encoded), {'v', 'o'})
+        self.assertNotIn('ve', encoded['o'])
+        self.assertNotIn('di', encoded['o'])
+        self.assertEqual(encoded['o']['co'], 'Harbor Lines')
+
+        decoded = decode_details({'v': 2, 'o': {'co': 'Harbor Lines'}})
+        self.assertIsNone(decoded['return'])
+        self.assertEqual(decoded['infants'], 0)
+        self.assertEqual(decoded['outbound']['vessel'], 'N/A')
+        self.assertEqual(decoded['outbound']['distance'], 0)
+
+    def test_keys_that_clash_with_short_keys_are_escaped(self):
+        details = {
+            'outbound': dict(FULL_LEG, co='extra'),
+            'payment': {'method': 'card', 'v': 'x'},
+            'o': 'top-level',
+            '~x': 1,
+            'return': None,
+            'infants': 0,
+        }
+        encoded = encode_details(details)
+        self.assertEqual(encoded['o']['~co'], 'extra')
+        self.assertEqual(encoded['p'], {'m': 'card', '~v': 'x'})
+        self.assertEqual(encoded['~o'], 'top-level')
+        self.assertEqual(encoded['~~x'], 1)
+        self.assertEqual(decode_details(encoded), details)
+
+    def test_version_1_blobs_pass_through(self):
+        legacy = {'outbound': {'company': 'Harbor Lines'}, 'total_price': 1000}
+        self.assertEqual(decode_details(legacy), legacy)
+        self.assertEqual(encode_details({'v': 2, 'o': {}}), {'v': 2, 'o': {}})
+
+    def test_set_details_key_on_a_version_2_row(self):
+        user = User.objects.create_user('codec-owner', password='harbor-pass-123')
+        booking = Booking.objects.get(pk=make_booking(user).pk)
+        booking.set_details_key('payment', {'method': 'card', 'status': 'paid'})
+
+        stored = self.stored(booking)
+        self.assertEqual(stored['v'], 2)
+        self.assertEqual(stored['p'], {'m': 'card', 's': 'paid'})
+        self.assertEqual(stored['o']['co'], 'Harbor Lines')
+        self.assertTrue(Booking.objects.filter(details_q(('outbound', 'company'), 'Harbor Lines')).exists())
+
+    def test_set_details_key_on_a_version_1_row_reencodes_it(self):
+        user = User.objects.create_user('codec-legacy', password='harbor-pass-123')
+        booking = make_booking(user)
+        legacy = {'outbound': dict(OUTBOUND_LEG), 'total_price': 1000}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {Booking._meta.db_table} SET details = %s WHERE id = %s',
+                [json.dumps(legacy), booking.pk],
+            )
+
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.set_details_key('payment', {'method': 'card', 'status': 'paid'})
+
+        stored = self.stored(booking)
+        self.assertEqual(stored['v'], 2)
+        self.assertEqual(stored['o']['co'], 'Harbor Lines')
+        self.assertNotIn('outbound', stored)
+        self.assertEqual(Booking.objects.get(pk=booking.pk).details['payment']['method'], 'card')
+        self.assertTrue(Booking.objects.filter(details_q(('outbound', 'company'), 'Harbor Lines')).exists())
+
+
+class PassengerRowTests(TestCase):
+    FORM = {
+        'passenger_2_first_name': 'Ben',
+        'passenger_2_last_name': 'Cruz',
+        'passenger_1_first_name': ' Ana ',
+        'passenger_1_last_name': 'Cruz' * 40,
+        'passenger_1_dob': '1990-05-01',
+        'passenger_3_first_name': 'Cara',
+        'passenger_3_type': 'Infant',
+        'passenger_3_dob': 'not-a-date',
+        'contact_email': 'ana@example.com',
+    }
+
+    def setUp(self):
+        self.user = User.objects.create_user('passenger-owner', password='harbor-pass-123')
+
+    def assert_rows(self, booking):
+        rows = list(booking.passengers.order_by('number').values_list('number', 'first_name', 'passenger_type', 'date_of_birth'))
+        self.assertEqual(rows, [
+            (1, 'Ana', 'adult', date(1990, 5, 1)),
+            (2, 'Ben', 'child', None),
+            (3, 'Cara', 'infant', None),
+        ])
+        self.assertEqual(len(booking.passengers.get(number=1).last_name), 100)
+
+    def test_create_passengers_is_one_insert(self):
+        booking = make_booking(self.user, adults=1)
+        with self.assertNumQueries(1):
+            create_passengers(booking, self.FORM)
+        self.assert_rows(booking)
+
+    def test_migration_explodes_the_passenger_json(self):
+        booking = make_booking(self.user, adults=1)
+        booking.set_details_key('passengers', self.FORM)
+        make_booking(self.user)
+
+        migration = importlib.import_module('harbor_mgmt.migrations.0014_passenger')
+        migration.explode_passenger_json(django_apps, None)
+        self.assert_rows(booking)
+        self.assertEqual(Passenger.objects.count(), 3)
+
+
+class BookingDailyStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('stats-owner', password='harbor-pass-123')
+
+    def buckets(self):
+        return sorted(BookingDailyStats.objects.values_list('status', 'bookings', 'passengers'))
+
+    def test_status_change_moves_the_booking_and_drops_the_empty_bucket(self):
+        booking = make_booking(self.user, adults=3)
+        self.assertEqual(self.buckets(), [('pending', 1, 3)])
+
+        booking.status = 'confirmed'
+        booking.save()
+        self.assertEqual(self.buckets(), [('confirmed', 1, 3)])
+
+    def test_deleting_a_deferred_instance_leaves_the_rollup(self):
+        make_booking(self.user)
+        kept = make_booking(self.user, status='confirmed')
+
+        Booking.objects.only('id').exclude(pk=kept.pk).get().delete()
+        self.assertEqual(self.buckets(), [('confirmed', 1, 2)])
+
+        Booking.objects.only('id').delete()
+        self.assertEqual(self.buckets(), [])
+
+    def test_rollup_matches_a_rebuild(self):
+        for status in ('pending', 'pending', 'confirmed'):
+            make_booking(self.user, status=status)
+        Booking.objects.filter(status='confirmed').get().delete()
+        incremental = self.buckets()
+
+        rebuild_daily_stats(Booking.objects.all(), BookingDailyStats)
+        self.assertEqual(self.buckets(), incremental)
+
+    def test_initial_backfill_matches_the_live_rebuild(self):
+        make_booking(self.user)
+        make_booking(self.user, status='confirmed').set_details_key('payment', {'method': 'stripe_test'})
+        rebuilt = list(BookingDailyStats.objects.order_by('status').values())
+
+        BookingDailyStats.objects.all().delete()
+        migration = importlib.import_module('harbor_mgmt.migrations.0007_bookingdailystats')
+        migration.backfill_daily_stats(django_apps, None)
+        backfilled = list(BookingDailyStats.objects.order_by('status').values())
+        for row in rebuilt + backfilled:
+            del row['id']
+        self.assertEqual(backfilled, rebuilt)
+
+
+class BookingSearchDocumentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('doc-owner', password='harbor-pass-123', first_name='Ana')
+        self.booking_id = make_booking(self.user).pk
+
+    def save_loaded(self, **changes):
+        booking = Booking.objects.get(pk=self.booking_id)
+        for name, value in changes.items():
+            setattr(booking, name, value)
+        with CaptureQueriesContext(connection) as queries:
+            booking.save()
+        booking.refresh_from_db()
+        return booking, [query['sql'] for query in queries.captured_queries]
+
+    def test_saving_unsearched_fields_does_not_load_the_user(self):
+        booking, queries = self.save_loaded(status='confirmed')
+        self.assertFalse([sql for sql in queries if 'FROM "auth_user"' in sql])
+        self.assertIn('ana', booking.search_document)
+
+    def test_changed_route_or_owner_rebuilds_the_document(self):
+        booking, _queries = self.save_loaded(destination='Siquijor')
+        self.assertIn('siquijor', booking.search_document)
+
+        other = User.objects.create_user('new-owner', password='harbor-pass-123')
+        booking, _queries = self.save_loaded(user=other)
+        self.assertIn('new-owner', booking.search_document)
+        self.assertNotIn('doc-owner', booking.search_document)
+
+
+class AnonymousPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache.set('barkota_routes', [{'origin': 'Cebu', 'destination': 'Tagbilaran'}])
+
+    def visit_home(self):
+        visitor = Client(enforce_csrf_checks=True)
+        content = visitor.get(reverse('home')).content
+        self.assertNotIn(CSRF_PLACEHOLDER, content)
+        return visitor, CSRF_INPUT_RE.search(content).group(1).decode()
+
+    def post_login(self, visitor, token):
+        return visitor.post(reverse('login'), {'username': 'nobody', 'password': 'wrong', 'csrfmiddlewaretoken': token})
+
+    def test_cached_page_carries_each_visitors_own_csrf_token(self):
+        first, first_token = self.visit_home()
+        with mock.patch('harbor_mgmt.views.load_routes_catalogue') as load_routes:
+            second, second_token = self.visit_home()
+        load_routes.assert_not_called()
+
+        self.assertNotEqual(first_token, second_token)
+        self.assertNotEqual(self.post_login(second, second_token).status_code, 403)
+        self.assertEqual(self.post_login(second, first_token).status_code, 403)
+
+    def test_signed_in_users_are_not_served_the_cached_page(self):
+        self.visit_home()
+        self.client.force_login(User.objects.create_user('signed-in', password='harbor-pass-123'))
+        with mock.patch('harbor_mgmt.views.load_routes_catalogue', return_value=[]) as load_routes:
+            self.client.get(reverse('home'))
+        load_routes.assert_called_once()
+
+    def test_unknown_query_parameters_bypass_the_cache(self):
+        self.visit_home()
+        with mock.patch('harbor_mgmt.views.load_routes_catalogue', return_value=[]) as load_routes:
+            for nonce in ('1', '2', '1'):
+                Client().get(reverse('home'), {'nonce': nonce})
+        self.assertEqual(load_routes.call_count, 3)
+
+    def test_listed_query_parameters_are_keyed_in_a_fixed_order(self):
+        factory = RequestFactory()
+        key = page_cache_key(factory.get('/', {'b': '2', 'a': '1'}), query_params=('a', 'b'))
+        self.assertEqual(key, page_cache_key(factory.get('/?a=1&b=2'), query_params=('a', 'b')))
+        self.assertNotEqual(key, page_cache_key(factory.get('/?a=1&b=3'), query_params=('a', 'b')))
+        self.assertNotEqual(key, page_cache_key(factory.get('/')))
+
+
+class SlowQueryLogTests(TestCase):
+    def test_literals_placeholders_and_in_lists_are_normalized(self):
+        self.assertEqual(
+            slowqueries.normalize_sql(
+                'SELECT U0."id" FROM t1 WHERE a = 5 AND b = \'it\'\'s\'  AND c IN (%s, %s, %s)\n AND d > 1.5'
+            ),
+            'SELECT U0."id" FROM t1 WHERE a = ? AND b = ? AND c IN (...) AND d > ?',
+        )
+
+    def test_repeats_with_other_values_share_a_fingerprint(self):
+        first = slowqueries.normalize_sql("SELECT * FROM t WHERE id IN (%s, %s) AND name = 'ana'")
+        second = slowqueries.normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s, %s) AND name = 'maria'")
+        other = slowqueries.normalize_sql("SELECT * FROM t WHERE id = %s")
+        self.assertEqual(slowqueries.sql_fingerprint(first), slowqueries.sql_fingerprint(second))
+        self.assertNotEqual(slowqueries.sql_fingerprint(first), slowqueries.sql_fingerprint(other))
+
+    def test_middleware_records_slow_queries_with_a_plan(self):
+        def view(request):
+            list(Booking.objects.filter(status='confirmed'))
+            return HttpResponse()
+
+        with mock.patch.object(slowqueries, 'SLOW_QUERY_MS', 0.000001), self.assertLogs('harbor_mgmt.slowqueries', 'WARNING'):
+            slowqueries.SlowQueryMiddleware(view)(RequestFactory().get('/bookings/'))
+
+        recorded = SlowQuery.objects.get()
+        self.assertIn('"status" = ?', recorded.sql)
+        self.assertEqual(recorded.path, '/bookings/')
+        self.assertTrue(recorded.location.startswith('harbor_mgmt/tests.py:'))
+        self.assertTrue(recorded.explain)
+
+
+GUNICORN_CONF = os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')
+
+
+class WarmupTests(TestCase):
+    def test_broken_templates_and_routes_do_not_fail_the_warmup(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'ok.html'), 'w') as f:
+                f.write('{{ value }}')
+            with open(os.path.join(directory, 'broken.html'), 'w') as f:
+                f.write('{% if %}')
+            templates = [{'BACKEND': 'django.template.backends.django.DjangoTemplates', 'DIRS': [directory]}]
+            with (
+                override_settings(TEMPLATES=templates),
+                mock.patch('harbor_mgmt.barkota.post', side_effect=ConnectionError('down')),
+                self.assertLogs('harbor_mgmt.warmup', 'WARNING'),
+            ):
+                cache.delete('barkota_routes')
+                metrics = warmup.warm_up()
+
+        self.assertEqual((metrics['templates'], metrics['template_errors'], metrics['routes']), (1, 1, 0))
+        self.assertGreater(metrics['url_patterns'], 0)
+
+    def test_gunicorn_hook_swallows_a_failed_warmup(self):
+        conf = runpy.run_path(GUNICORN_CONF)
+        log = mock.Mock()
+        with (
+            mock.patch.object(warmup, 'warm_up', side_effect=RuntimeError('boom')),
+            mock.patch('django.db.connections.close_all') as close_connections,
+        ):
+            conf['_warm_up'](log)
+
+        log.warning.assert_called_once_with('Warmup failed: boom')
+        close_connections.assert_called_once()
+
+
+class GunicornConfTests(TestCase):
+    def load(self, **env):
+        names = ('GUNICORN_WORKER_CLASS', 'WEB_CONCURRENCY', 'GUNICORN_THREADS', 'DB_MAX_CONNECTIONS')
+        environ = {name: value for name, value in os.environ.items() if name not in names}
+        with mock.patch.dict(os.environ, {**environ, **env}, clear=True):
+            conf = runpy.run_path(GUNICORN_CONF)
+        return conf['worker_class'], conf['workers'], conf['threads']
+
+    def test_threads_are_capped_to_the_connection_budget(self):
+        self.assertEqual(self.load(WEB_CONCURRENCY='3', GUNICORN_THREADS='8'), ('gthread', 3, 3))
+        self.assertEqual(self.load(WEB_CONCURRENCY='2', GUNICORN_THREADS='4', DB_MAX_CONNECTIONS='20'), ('gthread', 2, 4))
+
+    def test_workers_are_capped_before_threads(self):
+        self.assertEqual(self.load(WEB_CONCURRENCY='16', GUNICORN_THREADS='8'), ('gthread', 10, 1))
+        self.assertEqual(self.load(WEB_CONCURRENCY='4', DB_MAX_CONNECTIONS='0'), ('gthread', 1, 1))
+
+    def test_default_cpu_count_stays_within_the_budget(self):
+        with mock.patch('multiprocessing.cpu_count', return_value=64):
+            _, workers, threads = self.load()
+        self.assertEqual((workers, threads), (10, 1))
+
+    def test_sync_workers_get_one_thread(self):
+        self.assertEqual(self.load(GUNICORN_WORKER_CLASS='sync', WEB_CONCURRENCY='5'), ('sync', 5, 1))
+
@@ -0,0 +1,185 @@
+"""
+Per-request timing breakdown (Server-Timing header and log line).
+
+ServerTimingMiddleware measures a sample of requests: database query count
+and time (through connection.execute_wrapper), time spent waiting on
+upstream HTTP hosts (Barkota, Stripe), top-level template rendering and the
+total time. Admins always get the breakdown as a Server-Timing header, which
+the browser's network panel shows; sampled requests also write one
+"request_timing" log line. Requests that are neither are not instrumented.
+
+Streaming responses (the CSV exports) run most of their queries while the
+body is sent, after the headers are out: their header covers the time to
+the headers only, and their log line is written once the body has been
+streamed, with the queries it ran.
+
+The recorder lives in a thread-local, so gthread workers keep their
+requests apart.
+"""
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+# Share of requests that are measured and logged (admins are always measured)
+SAMPLE_RATE = getattr(settings, 'SERVER_TIMING_SAMPLE_RATE', 0.05)
+
+_local = threading.local()
+
+
+class RequestTimings:
+    """What one request spent its time on, in seconds"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.upstream = defaultdict(float)
+        self.template_time = 0.0
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper() hook
+        started = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_time += time.monotonic() - started
+
+    def finish(self):
+        self.total = time.monotonic() - self.started
+
+    def header(self, streaming=False):
+        metrics = [f'db;dur={self.db_time * 1000:.1f};desc="{self.db_queries} queries"']
+        for host, duration in self.upstream.items():
+            metrics.append(f'http;dur={duration * 1000:.1f};desc="{host}"')
+        metrics.append(f'tpl;dur={self.template_time * 1000:.1f}')
+        metrics.append(f'total;dur={self.total * 1000:.1f}' + (';desc="until headers"' if streaming else ''))
+        return ', '.join(metrics)
+
+    def log_line(self, request, response):
+        upstream = ','.join(f'{host}:{duration * 1000:.0f}' for host, duration in self.upstream.items()) or '-'
+        return (
+            f"request_timing method={request.method} path={request.path} status={response.status_code} "
+            f"total_ms={self.total * 1000:.0f} db_queries={self.db_queries} db_ms={self.db_time * 1000:.0f} "
+            f"upstream_ms={upstream} tpl_ms={self.template_time * 1000:.0f}"
+        )
+
+
+def current_timings():
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def upstream_timer(host):
+    """Count the enclosed block as time spent waiting on an upstream host"""
+    timings = current_timings()
+    if timings is None:
+        yield
+        return
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        timings.upstream[host] += time.monotonic() - started
+
+
+@contextmanager
+def _instrument(timings):
+    """Make `timings` the current recorder and count every query run meanwhile"""
+    _local.timings = timings
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings))
+            yield
+    finally:
+        _local.timings = None
+
+
+def _is_admin(request):
+    # Only look the user up when there is a session to find them in, so
+    # anonymous requests do not touch the session (and get Vary: Cookie)
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return False
+    user = request.user
+    return user.is_authenticated and hasattr(user, 'profile') and user.profile.is_admin_user
+
+
+class ServerTimingMiddleware:
+    """Measure sampled and admin requests; must come after AuthenticationMiddleware"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = random.random() < SAMPLE_RATE
+        is_admin = _is_admin(request)
+        if not (sampled or is_admin):
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        with _instrument(timings):
+            response = self.get_response(request)
+        timings.finish()
+
+        if is_admin:
+            response['Server-Timing'] = timings.header(streaming=response.streaming)
+        if response.streaming:
+            response.streaming_content = self._stream(timings, response.streaming_content, request, response, sampled)
+        elif sampled:
+            logger.info(timings.log_line(request, response))
+        return response
+
+    def _stream(self, timings, content, request, response, sampled):
+        # The body is iterated on the same thread by the WSGI server
+        with _instrument(timings):
+            yield from content
+        timings.finish()
+        if sampled:
+            logger.info(timings.log_line(request, response))
+
+
+class TimedTemplate:
+    """A Django template whose render() time is added to the request's timings"""
+
+    def __init__(self, template):
+        self.template = template
+
+    @property
+    def origin(self):
+        return self.template.origin
+
+    def render(self, context=None, request=None):
+        timings = current_timings()
+        if timings is None:
+            return self.template.render(context, request)
+        # Nested render_to_string calls are already inside the outer render
+        if getattr(_local, 'rendering', False):
+            return self.template.render(context, request)
+        started = time.monotonic()
+        _local.rendering = True
+        try:
+            return self.template.render(context, request)
+        finally:
+            _local.rendering = False
+            timings.template_time += time.monotonic() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend that times top-level renders for ServerTimingMiddleware"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
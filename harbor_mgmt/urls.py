@@ -4,12 +4,20 @@ from . import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('admin-dashboard/bookings/', views.admin_bookings, name='admin_bookings'),
+    path('admin-dashboard/bookings/export/', views.export_bookings, name='export_bookings'),
+    path('admin-dashboard/manifest/', views.voyage_manifest, name='voyage_manifest'),
+    path('admin-dashboard/jobs/', views.enqueue_admin_job, name='enqueue_admin_job'),
+    path('admin-dashboard/jobs/<int:job_id>/', views.admin_job_status, name='admin_job_status'),
+    path('admin-dashboard/jobs/<int:job_id>/result/', views.admin_job_result, name='admin_job_result'),
+    path('admin-dashboard/slow-queries/', views.admin_slow_queries, name='admin_slow_queries'),
     path('register/', views.register, name='register'),
     path('login/', views.user_login, name='login'),
     path('logout/', views.user_logout, name='logout'),
     path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('admin-dashboard/users/', views.admin_users, name='admin_users'),
+    path('admin-dashboard/users/api/', views.admin_users_api, name='admin_users_api'),
     path('change-user-role/', views.change_user_role, name='change_user_role'),
+    path('admin-dashboard/users/bulk/', views.bulk_user_action, name='bulk_user_action'),
     path('add-user/', views.add_user, name='add_user'),
     path('edit-user/<int:user_id>/', views.edit_user, name='edit_user'),
     path('delete-user/<int:user_id>/', views.delete_user, name='delete_user'),
@@ -33,6 +41,7 @@ urlpatterns = [
     path('upload-profile-photo/', views.upload_profile_photo, name='upload_profile_photo'),
     path('delete-profile-photo/', views.delete_profile_photo, name='delete_profile_photo'),
     path('api/get-booking-selection/', views.get_booking_selection, name='get_booking_selection'),
+    path('get-booking-details/', views.get_booking_details_batch, name='get_booking_details_batch'),
     path('get-booking-details/<int:booking_id>/', views.get_booking_details, name='get_booking_details'),
     path('profile/delete-account/', views.delete_account, name='delete_account'),
     path('contact/', views.contact_us, name='contact_us'),
@@ -1,29 +1,48 @@
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
+from django.template.loader import render_to_string
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from .forms import UserRegistrationForm
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from .models import UserProfile, Booking
+from .models import UserProfile, Booking, BookingDailyStats, AdminJob, AdminJobFile, SlowQuery
+from . import barkota, jobs
+from .bulk import BULK_USER_ACTIONS, BULK_USER_LIMIT, apply_bulk_user_action
+from .exports import EXPORT_FORMATS, booking_passengers, filter_bookings, get_filter_values, stream_bookings, stream_manifest
+from .idempotency import claim_idempotency_key, find_idempotent_result, new_idempotency_key, request_idempotency_key
+from .passengers import contact_fields, create_passengers
+from .pagecache import cache_anonymous_page, routes_catalogue_version, set_routes_catalogue_version
+from .timing import upstream_timer
+from .inventory import (
+    SeatsUnavailable, checkout_hold_deadline, checkout_session_expiry, confirm_holds, hold_seats, release_holds,
+    renew_checkout_holds, sync_inventory, voyage_key,
+)
 from django.views.decorators.http import require_http_methods, require_POST
 from django.views.decorators.csrf import ensure_csrf_cookie
-from django.views.decorators.cache import never_cache
+from HarborHop.middleware import NO_STORE, PRIVATE, PUBLIC, PUBLIC_MAX_AGE, cache_policy, policy_etag
 from django.views.decorators.http import require_POST
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import add_never_cache_headers
+from django.utils.crypto import get_random_string
+from django.utils.text import slugify
 from django.contrib.auth import update_session_auth_hash
-from datetime import datetime, date 
+from datetime import datetime, date, timedelta, timezone as dt_timezone
 from django.core.cache import cache
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import never_cache
 from django.contrib import messages
 from django.shortcuts import redirect
-from django.db.models import Sum, Count, Q, F
+from django.db import transaction
+from django.db.models import Avg, Sum, Count, Max, Q, F
 from django.db.models.functions import TruncMonth
 from .models import Booking
+import base64
+import gzip
+import hashlib
+import io
 import json
 import json
 import logging
@@ -33,6 +52,18 @@ from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
+# Display names for the payment methods stored in Booking.details['payment']
+PAYMENT_METHOD_DISPLAY = {
+    'stripe': 'Credit/Debit Card',
+    'gcash': 'GCash',
+    'paymaya': 'PayMaya',
+    'maya': 'Maya',
+    'shopeepay': 'ShopeePay',
+    'gotyme': 'GoTyme',
+    'paypal': 'PayPal',
+    'cash': 'Cash'
+}
+
 def normalize_voyage_data(voyage_data):
     """Normalize voyage data to ensure all required fields exist"""
     if not voyage_data:
@@ -54,21 +85,40 @@ def normalize_voyage_data(voyage_data):
     }
 
 
-def home(request):
-    # Ensure user has a profile if authenticated
-    if request.user.is_authenticated:
-        try:
-            request.user.profile
-        except UserProfile.DoesNotExist:
-            UserProfile.objects.create(user=request.user)
-    
+# Seconds Barkota voyage search results (and their rendered cards) are reused
+VOYAGE_CACHE_TIMEOUT = 300
+
+
+def cache_voyages(cache_key, voyages):
+    """Cache a voyage search result under a fresh version, retiring its rendered cards"""
+    cache.set_many({
+        cache_key: voyages,
+        f'{cache_key}:version': get_random_string(8),
+    }, VOYAGE_CACHE_TIMEOUT)
+
+
+def voyage_fragment_key(cache_key, voyages):
+    """
+    Key for the cached result cards of one voyage search: the voyage cache
+    key and version plus what changes between requests for the same data,
+    i.e. which voyages are past their cutoff and the seats left locally.
+    """
+    state = [
+        (item.get('cutoff_message'), [accommodation.get('remaining') for accommodation in item.get('accommodations') or []])
+        for item in voyages or []
+    ]
+    digest = hashlib.md5(json.dumps(state, default=str).encode(), usedforsecurity=False).hexdigest()
+    return f"{cache_key}:{cache.get(f'{cache_key}:version', '')}:{routes_catalogue_version()}:{digest}"
+
+
+def load_routes_catalogue():
+    """The Barkota routes catalogue, from the cache or fetched and cached ([] on failure)"""
     # Try to get routes data from cache first
     routes_data = cache.get('barkota_routes')
     
     if routes_data is None:
         # Cache miss - fetch from Barkota API
         try:
-            url = "https://barkota-reseller-php-prod-4kl27j34za-uc.a.run.app/ob/routes/passageenabled"
             headers = {
                 "Accept": "application/json",
                 "Content-Type": "application/json",
@@ -80,7 +130,7 @@ def home(request):
             logger.info("Fetching routes from Barkota API (cache miss)")
             
             # Increased timeout to 25 seconds
-            response = requests.post(url, json=payload, headers=headers, timeout=25)
+            response = barkota.post(barkota.ROUTES_PATH, payload, headers, timeout=25)
             response.raise_for_status()
             routes_data = response.json()
             
@@ -91,6 +141,7 @@ def home(request):
             else:
                 # Cache the data for 10 minutes (600 seconds)
                 cache.set('barkota_routes', routes_data, 600)
+                set_routes_catalogue_version(routes_data)
                 logger.info(f"Cached {len(routes_data)} routes for 10 minutes")
                 
         except requests.exceptions.Timeout:
@@ -105,13 +156,24 @@ def home(request):
     else:
         # Cache hit - using cached data
         logger.info(f"Using cached routes data ({len(routes_data)} routes)")
-    
+
+    return routes_data
+
+
+@cache_anonymous_page
+def home(request):
+    routes_data = load_routes_catalogue()
+
     today = date.today().isoformat()
     
-    return render(request, 'home.html', {
+    response = render(request, 'home.html', {
         'today': today,
         'routes_data': json.dumps(routes_data) if routes_data else '[]'
     })
+    if not routes_data:
+        # Keep a page without the routes catalogue out of the page cache
+        add_never_cache_headers(response)
+    return response
     
 def register(request):
     """Handle user registration"""
@@ -126,8 +188,8 @@ def register(request):
             # --- IMPORTANT: use the field name that matches your model ---
             dob = form.cleaned_data.get('date_of_birth')  # <-- correct field name
 
-            # Create or get profile and store date_of_birth
-            profile, created = UserProfile.objects.get_or_create(user=user)
+            # The profile is created by the post_save signal; store date_of_birth
+            profile = user.profile
             profile.date_of_birth = dob
             profile.save()
 
@@ -144,17 +206,14 @@ def register(request):
 
     return render(request, 'register.html', {'form': form})
 
-@never_cache
+@cache_policy(NO_STORE)
 def user_login(request):
     """Handle user login"""
     # Only redirect if user is authenticated AND it's a GET request (not after logout)
     if request.user.is_authenticated and request.method == 'GET':
         # Check if user is admin
-        try:
-            if request.user.profile.is_admin_user:
-                return redirect('admin_dashboard')
-        except UserProfile.DoesNotExist:
-            UserProfile.objects.create(user=request.user)
+        if request.user.profile.is_admin_user:
+            return redirect('admin_dashboard')
         return redirect('home')
    
     next_url = request.GET.get('next', 'home')
@@ -169,11 +228,8 @@ def user_login(request):
                 messages.success(request, f"Welcome back, {user.first_name or user.username}!")
                 
                 # Check if user is admin and redirect accordingly
-                try:
-                    if user.profile.is_admin_user:
-                        return redirect('admin_dashboard')
-                except UserProfile.DoesNotExist:
-                    UserProfile.objects.create(user=user)
+                if user.profile.is_admin_user:
+                    return redirect('admin_dashboard')
                 
                 return redirect(next_url)
             else:
@@ -188,6 +244,7 @@ def user_login(request):
 
 def user_logout(request):
     """Handle user logout"""
+    request.cart.clear()
     logout(request)
     messages.success(request, 'You have been logged out successfully!')
     return redirect('home')
@@ -195,25 +252,26 @@ def user_logout(request):
 @require_POST
 @login_required
 def store_booking_selection(request):
-    """API endpoint to store booking selections in session."""
+    """API endpoint to store booking selections in the booking cart."""
     try:
         import json
         data = json.loads(request.body)
         selections = data.get('selections', {})
         meta = data.get('meta', {})
         total_price = data.get('total_price', 0)
-        # Save selections, meta, and total_price to session
-        request.session['booking_selections'] = selections
-        request.session['booking_selections_meta'] = meta
-        request.session['booking_selections_total_price'] = total_price
-        request.session.modified = True
+        # Save selections, meta, and total_price to the cart
+        request.cart.set_many({
+            'booking_selections': selections,
+            'booking_selections_meta': meta,
+            'booking_selections_total_price': total_price,
+        })
         return JsonResponse({'success': True})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
 @login_required
 def passenger_info(request):
-    summary = request.session.get('passenger_info_summary')
+    summary = request.cart.get('passenger_info_summary')
 
     if not summary:
         messages.error(request, 'Please select your trips before entering passenger information.')
@@ -221,17 +279,23 @@ def passenger_info(request):
     
     if request.method == 'POST':
         action = request.POST.get('action')
+
+        # A double-submitted form replays the booking the first submit created
+        idempotency_key = request_idempotency_key(request)
+        previous = find_idempotent_result(request.user, 'create_booking', idempotency_key)
+        if previous and previous.result.get('redirect'):
+            return redirect(previous.result['redirect'])
         
-        # Store passenger form data in session
+        # Store passenger form data in the cart
         passenger_data = {}
         for key, value in request.POST.items():
             if key.startswith('passenger_') or key.startswith('contact_'):
                 passenger_data[key] = value
         
-        request.session['passenger_form_data'] = passenger_data
+        request.cart.set('passenger_form_data', passenger_data)
         
-        # Get booking selections from session
-        selections = request.session.get('booking_selections', {})
+        # Get booking selections from the cart
+        selections = request.cart.get('booking_selections', {})
         outbound = selections.get('outbound', {})
         return_trip = selections.get('return', {})
         
@@ -244,7 +308,6 @@ def passenger_info(request):
         children = summary.get('children', 0)
         
         # VALIDATE CHILDREN'S AGES BASED ON BIRTHDATES
-        from datetime import datetime, timedelta
         from dateutil.relativedelta import relativedelta
         
         valid_children_count = 0
@@ -345,7 +408,6 @@ def passenger_info(request):
             total_price += return_total
         
         # Parse dates
-        from datetime import datetime
         dep_date = summary.get('departure_date_formatted', '')
         ret_date = summary.get('return_date_formatted', None)
         
@@ -363,8 +425,6 @@ def passenger_info(request):
         
         # Handle "Reserve Booking" action
         if action == 'reserve':
-            from django.utils.crypto import get_random_string
-            from datetime import timedelta
             
             # Check 2-hour rule
             dep_time_str = normalized_outbound.get('departureDateTime') or normalized_outbound.get('departureTime')
@@ -389,65 +449,89 @@ def passenger_info(request):
                 messages.error(request, 'You can only reserve if your trip is at least 2 hours away. Please proceed to payment directly.')
                 return redirect('passenger_info')
             
-            # Create booking with 'reserved' status
-            booking_reference = get_random_string(12).upper()
-            
+            # Create booking with 'reserved' status (reference assigned on save)
             details = {
                 'outbound': normalized_outbound,
                 'return': normalized_return,
                 'total_price': total_price,
-                'passengers': passenger_data,
+                'contact': contact_fields(passenger_data),
                 'infants': summary.get('infants', 0),
             }
             
-            booking = Booking.objects.create(
-                user=request.user,
-                trip_type=summary.get('trip_type', 'one_way'),
-                origin=summary.get('origin_name', ''),
-                destination=summary.get('destination_name', ''),
-                departure_date=dep_date,
-                return_date=ret_date,
-                adults=summary.get('adults', 1),
-                children=valid_children_count,  # FIX: Use validated children count
-                booking_reference=booking_reference,
-                status='reserved',
-                reserved_until=now + timedelta(hours=48),
-                total_price=total_price,
-                details=details,
-            )
+            # The booking only exists if its seats could be held
+            try:
+                with transaction.atomic():
+                    if idempotency_key:
+                        record, replayed = claim_idempotency_key(request.user, 'create_booking', idempotency_key)
+                        if replayed:
+                            return redirect(record.result.get('redirect') or 'reservations')
+                    booking = Booking.objects.create(
+                        user=request.user,
+                        trip_type=summary.get('trip_type', 'one_way'),
+                        origin=summary.get('origin_name', ''),
+                        destination=summary.get('destination_name', ''),
+                        departure_date=dep_date,
+                        return_date=ret_date,
+                        adults=summary.get('adults', 1),
+                        children=valid_children_count,  # FIX: Use validated children count
+                        status='reserved',
+                        reserved_until=now + timedelta(hours=48),
+                        total_price=total_price,
+                        details=details,
+                    )
+                    create_passengers(booking, passenger_data)
+                    hold_seats(booking, expires_at=booking.reserved_until)
+                    if idempotency_key:
+                        record.booking = booking
+                        record.result = {'redirect': reverse('reservation_confirmation', args=[booking.id])}
+                        record.save(update_fields=['booking', 'result'])
+            except SeatsUnavailable as e:
+                messages.error(request, f'Sorry, this trip no longer has enough seats. {e}')
+                return redirect('passenger_info')
             
-            messages.success(request, f'Your booking has been reserved! Reference: {booking_reference}')
+            messages.success(request, f'Your booking has been reserved! Reference: {booking.booking_reference}')
             return redirect('reservation_confirmation', booking_id=booking.id)
         
         # Handle "Proceed To Payment" action
         elif action == 'payment':
-            from django.utils.crypto import get_random_string
-            
-            booking_reference = get_random_string(12).upper()
-            
             details = {
                 'outbound': normalized_outbound,
                 'return': normalized_return,
                 'total_price': total_price,
-                'passengers': passenger_data,
+                'contact': contact_fields(passenger_data),
                 'infants': summary.get('infants', 0),
             }
             
-            booking = Booking.objects.create(
-                user=request.user,
-                trip_type=summary.get('trip_type', 'one_way'),
-                origin=summary.get('origin_name', ''),
-                destination=summary.get('destination_name', ''),
-                departure_date=dep_date,
-                return_date=ret_date,
-                adults=summary.get('adults', 1),
-                children=valid_children_count,  # FIX: Use validated children count
-                booking_reference=booking_reference,
-                status='pending',
-                reserved_until=None,
-                total_price=total_price,
-                details=details,
-            )
+            # Seats are held for the length of the checkout
+            try:
+                with transaction.atomic():
+                    if idempotency_key:
+                        record, replayed = claim_idempotency_key(request.user, 'create_booking', idempotency_key)
+                        if replayed:
+                            return redirect(record.result.get('redirect') or 'reservations')
+                    booking = Booking.objects.create(
+                        user=request.user,
+                        trip_type=summary.get('trip_type', 'one_way'),
+                        origin=summary.get('origin_name', ''),
+                        destination=summary.get('destination_name', ''),
+                        departure_date=dep_date,
+                        return_date=ret_date,
+                        adults=summary.get('adults', 1),
+                        children=valid_children_count,  # FIX: Use validated children count
+                        status='pending',
+                        reserved_until=None,
+                        total_price=total_price,
+                        details=details,
+                    )
+                    create_passengers(booking, passenger_data)
+                    hold_seats(booking, expires_at=checkout_hold_deadline())
+                    if idempotency_key:
+                        record.booking = booking
+                        record.result = {'redirect': reverse('payment', args=[booking.id])}
+                        record.save(update_fields=['booking', 'result'])
+            except SeatsUnavailable as e:
+                messages.error(request, f'Sorry, this trip no longer has enough seats. {e}')
+                return redirect('passenger_info')
             
             return redirect('payment', booking_id=booking.id)
 
@@ -459,12 +543,12 @@ def passenger_info(request):
         'return_date_formatted': summary.get('return_date_formatted', ''),
         'adults': summary.get('adults', 1),
         'children': summary.get('children', 0),
+        'idempotency_key': new_idempotency_key(),
     }
     return render(request, 'passenger_info.html', context)
 
 @login_required
 def reservation_confirmation(request, booking_id):
-    from datetime import datetime, timedelta
     booking = Booking.objects.get(id=booking_id, user=request.user)
     # Determine if Reserve Booking is allowed (more than 2 hours before departure)
     can_reserve_booking = False
@@ -506,12 +590,42 @@ def cancel_reservation(request, booking_id):
 
     booking.status = 'cancelled'
     booking.reserved_until = None
-    booking.save(update_fields=['status', 'reserved_until', 'updated_at'])
+    with transaction.atomic():
+        booking.save(update_fields=['status', 'reserved_until', 'updated_at'])
+        release_holds([booking.id])
 
     messages.success(request, 'Your reservation has been cancelled.')
     return redirect('reservation_confirmation', booking_id=booking_id)
 
 
+def _page_etag_parts(request):
+    """What every signed-in page shows besides its content: nav bar user and CSRF token"""
+    user = request.user
+    profile = getattr(user, 'profile', None)
+    return (
+        user.pk,
+        user.username,
+        getattr(profile, 'is_admin_user', False),
+        getattr(profile, 'updated_at', None),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    )
+
+
+def reservations_etag(request):
+    bookings = Booking.objects.filter(user=request.user).aggregate(count=Count('id'), changed=Max('updated_at'))
+    return policy_etag(*_page_etag_parts(request), bookings['count'], bookings['changed'])
+
+
+def booking_last_modified(request, booking_id):
+    return Booking.objects.filter(id=booking_id, user=request.user).values_list('updated_at', flat=True).first()
+
+
+def booking_etag(request, booking_id):
+    changed = booking_last_modified(request, booking_id)
+    return policy_etag(*_page_etag_parts(request), booking_id, changed) if changed else None
+
+
+@cache_policy(PRIVATE, etag=reservations_etag)
 @login_required
 def reservations_view(request):
     """Display reservations separated by payment status"""
@@ -535,6 +649,7 @@ def reservations_view(request):
         'has_reservations': all_reservations.exists(),
     })
     
+@cache_policy(PRIVATE, etag=booking_etag, last_modified=booking_last_modified)
 @login_required
 def payment_confirmation(request, booking_id):
     """Display payment confirmation page after successful payment"""
@@ -559,17 +674,18 @@ def payment_view(request, booking_id):
     if request.method == 'POST':
         payment_method = request.POST.get('payment_method', '').strip() or 'unspecified'
 
-        details = booking.details or {}
         payment_info = {
             'method': payment_method,
             'paid_at': timezone.now().isoformat(),
             'paid_at_display': timezone.localtime().strftime('%b %d, %Y %I:%M %p'),
         }
-        details['payment'] = payment_info
-        booking.details = details
-        booking.status = 'completed'
-        booking.reserved_until = None
-        booking.save(update_fields=['details', 'status', 'reserved_until', 'updated_at'])
+        try:
+            with transaction.atomic():
+                confirm_holds(booking)
+                booking.set_details_key('payment', payment_info, status='completed', reserved_until=None)
+        except SeatsUnavailable as e:
+            messages.error(request, f'Sorry, this trip no longer has enough seats. {e}')
+            return redirect('reservations')
 
         messages.success(request, 'Payment confirmed! Your booking was added to your history.')
         return redirect('payment_confirmation', booking_id=booking.id)
@@ -586,10 +702,17 @@ def payment_view(request, booking_id):
         'user': request.user,
         'route_distance': distance,
         'stripe_public_key': settings.STRIPE_PUBLISHABLE_KEY,
+        'checkout_idempotency_key': new_idempotency_key(),
     }
     return render(request, 'payment.html', context)
 
 
+STRIPE_API_HOST = 'api.stripe.com'
+
+# Stripe rejects checkout sessions that close sooner than this
+STRIPE_MIN_SESSION_LIFETIME = timedelta(minutes=30)
+
+
 @require_POST
 @login_required
 def stripe_checkout(request, booking_id):
@@ -598,34 +721,81 @@ def stripe_checkout(request, booking_id):
     booking = get_object_or_404(Booking, id=booking_id, user=request.user)
     stripe.api_key = settings.STRIPE_SECRET_KEY
 
-    session = stripe.checkout.Session.create(
-        mode="payment",
-        payment_method_types=["card"],
-        customer_email=request.user.email,
-        line_items=[{
-            "price_data": {
-                "currency": "php",
-                "unit_amount": int(booking.total_price * 100),
-                "product_data": {"name": f"{booking.origin} - {booking.destination}"},
-            },
-            "quantity": 1,
-        }],
-        success_url=request.build_absolute_uri(
-            reverse("stripe_success", args=[booking.id])
-        ) + "?session_id={CHECKOUT_SESSION_ID}",
-        cancel_url=request.build_absolute_uri(
-            reverse("payment", args=[booking.id])
-        ),
-    )
+    # A repeated click replays the first checkout session instead of opening another
+    idempotency_key = request_idempotency_key(request)
+    previous = find_idempotent_result(request.user, 'stripe_checkout', idempotency_key)
+    if previous and previous.result.get('sessionId'):
+        return JsonResponse(previous.result)
 
-    details = booking.details or {}
-    details["payment"] = {"method": "stripe_test", "session_id": session.id, "status": "pending"}
-    booking.details = details
-    booking.save(update_fields=["details", "updated_at"])
+    # The seats must stay held for as long as the checkout session can be paid
+    try:
+        hold_deadline = renew_checkout_holds(booking)
+    except SeatsUnavailable as e:
+        return JsonResponse({'success': False, 'message': f'Sorry, this trip no longer has enough seats. {e}'}, status=409)
+
+    # The key is claimed and committed before Stripe is called, so no
+    # transaction stays open across the call. A repeat that finds the claim
+    # without a session (still being created, or its request died) repeats
+    # the same create call, which Stripe deduplicates
+    expires_at = checkout_session_expiry(hold_deadline)
+    record = None
+    if idempotency_key:
+        record, replayed = claim_idempotency_key(
+            request.user, 'stripe_checkout', idempotency_key, result={"expiresAt": int(expires_at.timestamp())},
+        )
+        if replayed:
+            if record.result.get("sessionId"):
+                return JsonResponse(record.result)
+            claimed = record.result.get("expiresAt")
+            if claimed and claimed >= (timezone.now() + STRIPE_MIN_SESSION_LIFETIME).timestamp():
+                expires_at = datetime.fromtimestamp(claimed, tz=dt_timezone.utc)
+
+    session = create_stripe_checkout_session(request, booking, idempotency_key, expires_at=expires_at)
+
+    with transaction.atomic():
+        booking.set_details_key("payment", {"method": "stripe_test", "session_id": session.id, "status": "pending"})
+        if record:
+            record.booking = booking
+            record.result = {"sessionId": session.id}
+            record.save(update_fields=["booking", "result"])
 
     return JsonResponse({"sessionId": session.id})
 
 
+def create_stripe_checkout_session(request, booking, idempotency_key=None, expires_at=None):
+    import stripe
+
+    # Stripe deduplicates retries of the same create call on its side too;
+    # its key must change whenever the parameters do
+    stripe_key = None
+    if idempotency_key:
+        stripe_key = f"checkout-{booking.id}-{idempotency_key}-{int(expires_at.timestamp()) if expires_at else 0}"
+
+    with upstream_timer(STRIPE_API_HOST):
+        return stripe.checkout.Session.create(
+            mode="payment",
+            payment_method_types=["card"],
+            customer_email=request.user.email,
+            line_items=[{
+                "price_data": {
+                    "currency": "php",
+                    "unit_amount": int(booking.total_price * 100),
+                    "product_data": {"name": f"{booking.origin} - {booking.destination}"},
+                },
+                "quantity": 1,
+            }],
+            success_url=request.build_absolute_uri(
+                reverse("stripe_success", args=[booking.id])
+            ) + "?session_id={CHECKOUT_SESSION_ID}",
+            cancel_url=request.build_absolute_uri(
+                reverse("payment", args=[booking.id])
+            ),
+            idempotency_key=stripe_key,
+            # Stripe's default is 24 hours, far past the seat hold
+            expires_at=int(expires_at.timestamp()) if expires_at else None,
+        )
+
+
 @login_required
 def stripe_success(request, booking_id):
     import stripe
@@ -634,20 +804,37 @@ def stripe_success(request, booking_id):
     booking = get_object_or_404(Booking, id=booking_id, user=request.user)
 
     stripe.api_key = settings.STRIPE_SECRET_KEY
-    session = stripe.checkout.Session.retrieve(session_id)
+    with upstream_timer(STRIPE_API_HOST):
+        session = stripe.checkout.Session.retrieve(session_id)
+
+    if booking.status == "completed":
+        return redirect('payment_confirmation', booking_id=booking.id)
+    if booking.status == "cancelled":
+        messages.error(request, "This booking was cancelled.")
+        return redirect('reservations')
 
     if session.payment_status == "paid":
-        details = booking.details or {}
-        details["payment"] = {
-            "method": "stripe_test",
-            "paid_at": timezone.now().isoformat(),
-            "paid_at_display": timezone.localtime().strftime('%b %d, %Y %I:%M %p'),
-            "session_id": session.id,
-        }
-        booking.details = details
-        booking.status = "completed"
-        booking.reserved_until = None
-        booking.save(update_fields=["details", "status", "reserved_until", "updated_at"])
+        try:
+            with transaction.atomic():
+                confirm_holds(booking)
+                booking.set_details_key("payment", {
+                    "method": "stripe_test",
+                    "paid_at": timezone.now().isoformat(),
+                    "paid_at_display": timezone.localtime().strftime('%b %d, %Y %I:%M %p'),
+                    "session_id": session.id,
+                }, status="completed", reserved_until=None)
+        except SeatsUnavailable as e:
+            # Paid after the hold ran out and the seats were sold meanwhile
+            logger.warning(f"Refunding booking {booking.id}: {str(e)}")
+            with upstream_timer(STRIPE_API_HOST):
+                stripe.Refund.create(payment_intent=session.payment_intent)
+            booking.set_details_key("payment", {
+                "method": "stripe_test",
+                "session_id": session.id,
+                "status": "refunded",
+            }, status="cancelled", reserved_until=None)
+            messages.error(request, f"Sorry, this trip sold out before your payment went through, so it was refunded. {e}")
+            return redirect('reservations')
         messages.success(request, "Payment confirmed! Your booking was added to your history.")
     else:
         messages.error(request, "Payment not completed. Please try again.")
@@ -666,7 +853,7 @@ def booking_history_view(request):
         'bookings': bookings,
     })
 
-    summary = request.session.get('passenger_info_summary')
+    summary = request.cart.get('passenger_info_summary')
 
     if not summary:
         messages.error(request, 'Please select your trips before entering passenger information.')
@@ -676,14 +863,11 @@ def booking_history_view(request):
         action = request.POST.get('action')
         if action == 'reserve':
             from .models import Booking
-            from django.utils.crypto import get_random_string
-            from datetime import timedelta
             now = timezone.now()
             reserved_until = now + timedelta(days=1)
-            # Minimal: get summary/session data for booking fields
-            summary = request.session.get('passenger_info_summary', {})
+            # Minimal: get summary/cart data for booking fields
+            summary = request.cart.get('passenger_info_summary', {})
             user = request.user
-            booking_reference = get_random_string(12).upper()
             booking = Booking.objects.create(
                 user=user,
                 trip_type=summary.get('trip_type', 'one_way'),
@@ -693,7 +877,6 @@ def booking_history_view(request):
                 return_date=summary.get('return_date_formatted', None),
                 adults=summary.get('adults', 1),
                 children=summary.get('children', 0),
-                booking_reference=booking_reference,
                 status='pending',
                 reserved_until=reserved_until,
                 total_price=0,  # Placeholder
@@ -704,12 +887,11 @@ def booking_history_view(request):
         form_data = {
             key: value for key, value in request.POST.items() if key != 'csrfmiddlewaretoken'
         }
-        request.session['passenger_info_form'] = form_data
-        request.session['passenger_info_completed'] = True
+        request.cart.set_many({'passenger_info_form': form_data, 'passenger_info_completed': True})
         return redirect('passenger_info')
 
-    passenger_form_data = request.session.pop('passenger_info_form', {})
-    show_booking_options = request.session.pop('passenger_info_completed', False)
+    passenger_form_data = request.cart.pop('passenger_info_form', {})
+    show_booking_options = request.cart.pop('passenger_info_completed', False)
 
     context = {
         'trip_type': summary.get('trip_type', 'one_way'),
@@ -725,48 +907,11 @@ def booking_history_view(request):
     return render(request, 'passenger_info.html', context)
 
 
-@never_cache
-@login_required
-def admin_bookings(request):
-    """Admin bookings management page - view all bookings"""
-    # Check admin permissions
-    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin_user:
-        messages.error(request, "You don't have permission to access this page.")
-        return redirect('home')
-
-    # Get all bookings with related user
-    bookings = Booking.objects.select_related('user').order_by('-created_at')
-
-    # Booking statistics
-    total_bookings = bookings.count()
-    pending_bookings = bookings.filter(status='pending').count()
-    reserved_bookings = bookings.filter(status='reserved').count()
-    confirmed_bookings = bookings.filter(status='confirmed').count()
-    cancelled_bookings = bookings.filter(status='cancelled').count()
-    completed_bookings = bookings.filter(status='completed').count()
-
-    context = {
-        'bookings': bookings,
-        'total_bookings': total_bookings,
-        'pending_bookings': pending_bookings,
-        'reserved_bookings': reserved_bookings,
-        'confirmed_bookings': confirmed_bookings,
-        'cancelled_bookings': cancelled_bookings,
-        'completed_bookings': completed_bookings,
-        'user': request.user,
-    }
-    return render(request, 'admin_bookings.html', context)
-
-@never_cache
+@cache_policy(NO_STORE)
 @login_required
 def admin_dashboard(request):
     """Admin dashboard - only accessible to admin users"""
-    try:
-        if not request.user.profile.is_admin_user:
-            messages.error(request, "You don't have permission to access the admin dashboard.")
-            return redirect('home')
-    except UserProfile.DoesNotExist:
-        UserProfile.objects.create(user=request.user)
+    if not request.user.profile.is_admin_user:
         messages.error(request, "You don't have permission to access the admin dashboard.")
         return redirect('home')
 
@@ -774,20 +919,12 @@ def admin_dashboard(request):
     from django.contrib.auth.models import User
     from django.db.models import Count
     from django.db.models.functions import TruncMonth
-    from datetime import timedelta
     import json
     from django.utils import timezone
 
-    total_bookings = Booking.objects.count()  # Get actual booking count
-    total_users = User.objects.count()
-    admin_users = UserProfile.objects.filter(is_admin_user=True).count()
-    active_users = User.objects.filter(is_active=True).count()
-
-    # Calculate new users this month
+    total_bookings = BookingDailyStats.objects.aggregate(total=Sum('bookings'))['total'] or 0
     now = timezone.now()
-    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    new_this_month = User.objects.filter(date_joined__gte=start_of_month).count()
-    
+
     # Get user growth data for the last 12 months
     twelve_months_ago = now - timedelta(days=365)
     
@@ -829,17 +966,94 @@ def admin_dashboard(request):
     context = {
         'user': request.user,
         'total_bookings': total_bookings,
-        'total_users': total_users,
-        'admin_users': admin_users,
-        'active_users': active_users,
-        'new_this_month': new_this_month,
+        **get_user_statistics(),
         'chart_labels': json.dumps(chart_labels),
         'chart_data': json.dumps(chart_data),
         'cumulative_data': json.dumps(cumulative_data),
     }
     return render(request, 'admin_dashboard.html', context)
 
-@never_cache
+# Admin users directory page size (keyset paginated)
+ADMIN_USERS_PAGE_SIZE = 25
+ADMIN_USERS_MAX_PAGE_SIZE = 100
+
+
+def get_user_statistics():
+    """Admin user KPI cards in a single aggregate query"""
+    now = timezone.now()
+    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return User.objects.aggregate(
+        total_users=Count('id'),
+        admin_users=Count('id', filter=Q(profile__is_admin_user=True)),
+        active_users=Count('id', filter=Q(is_active=True)),
+        new_this_month=Count('id', filter=Q(date_joined__gte=start_of_month)),
+    )
+
+
+def encode_user_cursor(user):
+    """Opaque keyset cursor: the (date_joined, id) of the last row sent"""
+    raw = f"{user.date_joined.isoformat()}|{user.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_user_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    joined, user_id = raw.rsplit('|', 1)
+    return datetime.fromisoformat(joined), int(user_id)
+
+
+def get_admin_users_page(params):
+    """
+    Return (users, next_cursor) for the admin users directory.
+    Ordered newest first by (date_joined, id), the auth_user_date_joined_id
+    index (migration 0020), so pages never use OFFSET.
+    Raises ValueError for malformed cursors, dates or limits.
+    """
+    users = User.objects.select_related('profile').order_by('-date_joined', '-id')
+
+    search = params.get('search', '').strip()
+    if search:
+        users = users.filter(
+            Q(username__icontains=search) |
+            Q(email__icontains=search) |
+            Q(first_name__icontains=search) |
+            Q(last_name__icontains=search)
+        )
+
+    role = params.get('role', '')
+    if role == 'admin':
+        users = users.filter(profile__is_admin_user=True)
+    elif role == 'user':
+        users = users.exclude(profile__is_admin_user=True)
+
+    active = params.get('active', '')
+    if active in ('true', 'false'):
+        users = users.filter(is_active=(active == 'true'))
+
+    if params.get('joined_after'):
+        users = users.filter(date_joined__date__gte=date.fromisoformat(params['joined_after']))
+    if params.get('joined_before'):
+        users = users.filter(date_joined__date__lte=date.fromisoformat(params['joined_before']))
+
+    cursor = params.get('cursor', '')
+    if cursor:
+        try:
+            joined, user_id = decode_user_cursor(cursor)
+        except Exception:
+            raise ValueError('Invalid cursor')
+        users = users.filter(Q(date_joined__lt=joined) | Q(date_joined=joined, id__lt=user_id))
+
+    limit = min(int(params.get('limit') or ADMIN_USERS_PAGE_SIZE), ADMIN_USERS_MAX_PAGE_SIZE)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+
+    # Fetch one extra row to know whether another page exists
+    page = list(users[:limit + 1])
+    next_cursor = encode_user_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
+
+
+@cache_policy(NO_STORE)
 @login_required
 def admin_users(request):
     """Admin users management page - with statistics"""
@@ -849,26 +1063,13 @@ def admin_users(request):
         messages.error(request, "You don't have permission to access this page.")
         return redirect('home')
 
-    # Get all users with their profiles
-    users = User.objects.all().select_related('profile').order_by('-date_joined')
-    
-    # Calculate statistics
-    total_users = User.objects.count()
-    admin_users = User.objects.filter(profile__is_admin_user=True).count()
-    active_users = User.objects.filter(is_active=True).count()
-    
-    # Calculate new users this month
-    now = timezone.now()
-    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    new_this_month = User.objects.filter(date_joined__gte=start_of_month).count()
-    
     # Handle POST requests (role changes from non-AJAX submissions)
     if request.method == "POST":
         user_id = request.POST.get('user_id')
         action = request.POST.get('action')
         
         try:
-            target_user = User.objects.get(id=user_id)
+            target_user = User.objects.select_related('profile').get(id=user_id)
             profile = target_user.profile
             
             # Prevent admin from changing their own role
@@ -893,18 +1094,52 @@ def admin_users(request):
             messages.error(request, "User profile not found.")
         
         return redirect('admin_users')
-    
+
+    # First page is rendered server-side; the rest is loaded from admin_users_api
+    users, next_cursor = get_admin_users_page({})
+
     # Prepare context
     context = {
         'users': users,
-        'total_users': total_users,
-        'admin_users': admin_users,
-        'active_users': active_users,
-        'new_this_month': new_this_month,
+        'next_cursor': next_cursor,
+        **get_user_statistics(),
     }
     
     return render(request, 'admin_users.html', context)
 
+
+@cache_policy(NO_STORE)
+@login_required
+def admin_users_api(request):
+    """Paginated, searchable admin user directory (JSON + rendered rows)"""
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin_user:
+        return JsonResponse({'success': False, 'message': 'Unauthorized'}, status=403)
+
+    try:
+        users, next_cursor = get_admin_users_page(request.GET)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'users': [
+            {
+                'id': u.id,
+                'username': u.username,
+                'full_name': u.get_full_name() or u.username,
+                'first_name': u.first_name,
+                'last_name': u.last_name,
+                'email': u.email,
+                'is_admin': bool(getattr(getattr(u, 'profile', None), 'is_admin_user', False)),
+                'is_active': u.is_active,
+                'date_joined': u.date_joined.isoformat(),
+            }
+            for u in users
+        ],
+        'html': render_to_string('admin_users_rows.html', {'users': users, 'user': request.user}, request=request),
+        'next_cursor': next_cursor,
+    })
+
 @login_required
 @require_POST
 def toggle_user_active_ajax(request, user_id):
@@ -955,7 +1190,7 @@ def change_user_role(request):
         
         # Get the user to modify
         try:
-            target_user = User.objects.get(id=user_id)
+            target_user = User.objects.select_related('profile').get(id=user_id)
         except User.DoesNotExist:
             return JsonResponse({
                 'success': False,
@@ -1009,6 +1244,59 @@ def change_user_role(request):
         }, status=500)
 
 
+@login_required
+@require_POST
+def bulk_user_action(request):
+    """Apply a role/status/delete action to many users in one request"""
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin_user:
+        return JsonResponse({
+            'success': False,
+            'message': 'Unauthorized. Admin privileges required.'
+        }, status=403)
+
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError('Expected a JSON object')
+        action = data.get('action')
+        user_ids = [int(user_id) for user_id in data.get('user_ids') or []]
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return JsonResponse({
+            'success': False,
+            'message': 'Invalid JSON data'
+        }, status=400)
+
+    if action not in BULK_USER_ACTIONS:
+        return JsonResponse({
+            'success': False,
+            'message': 'Invalid action specified'
+        }, status=400)
+
+    if not user_ids:
+        return JsonResponse({
+            'success': False,
+            'message': 'No users selected'
+        }, status=400)
+
+    # Very large selections run on the job worker instead of inside this request
+    if data.get('background') or len(user_ids) > BULK_USER_LIMIT:
+        job = jobs.enqueue('bulk_user_action', {'action': action, 'user_ids': user_ids}, user=request.user)
+        return JsonResponse({
+            'success': True,
+            'message': f'Queued {action} for {len(user_ids)} users',
+            'job_id': job.id,
+            'status_url': reverse('admin_job_status', args=[job.id]),
+        }, status=202)
+
+    results = apply_bulk_user_action(action, user_ids, request.user)
+    succeeded = sum(1 for result in results.values() if result['success'])
+    return JsonResponse({
+        'success': True,
+        'message': f'{succeeded} of {len(results)} users updated',
+        'results': {str(user_id): result for user_id, result in results.items()},
+    })
+
+
 @require_http_methods(["POST"])
 def add_user(request):
     """Add a new user - Fixed for AJAX requests with Supabase"""
@@ -1030,9 +1318,6 @@ def add_user(request):
     
     try:
         # Check if the current user is an admin
-        if not hasattr(request.user, 'profile'):
-            UserProfile.objects.create(user=request.user)
-            
         if not request.user.profile.is_admin_user:
             logger.warning(f"Unauthorized add_user attempt by {request.user.username}")
             return JsonResponse({
@@ -1118,9 +1403,8 @@ def add_user(request):
         
         logger.info(f"✓ Verified user {username} exists in database")
         
-        # Create profile
-        profile, profile_created = UserProfile.objects.get_or_create(user=user)
-        logger.info(f"Profile created: {profile_created}")
+        # Profile is created by the post_save signal
+        profile = user.profile
         
         # Set admin status if requested
         if is_admin:
@@ -1161,7 +1445,7 @@ def delete_user(request, user_id):
         
         # Get the user to delete
         try:
-            target_user = User.objects.get(id=user_id)
+            target_user = User.objects.select_related('profile').get(id=user_id)
         except User.DoesNotExist:
             return JsonResponse({
                 'success': False,
@@ -1210,9 +1494,6 @@ def edit_user(request, user_id):
     
     try:
         # Check if the current user is an admin
-        if not hasattr(request.user, 'profile'):
-            UserProfile.objects.create(user=request.user)
-            
         if not request.user.profile.is_admin_user:
             logger.warning(f"Unauthorized edit_user attempt by {request.user.username}")
             return JsonResponse({
@@ -1222,7 +1503,7 @@ def edit_user(request, user_id):
         
         # Get the user to edit
         try:
-            target_user = User.objects.get(id=user_id)
+            target_user = User.objects.select_related('profile').get(id=user_id)
         except User.DoesNotExist:
             logger.error(f"User with ID {user_id} not found")
             return JsonResponse({
@@ -1271,9 +1552,6 @@ def edit_user(request, user_id):
         
         # Update admin status (only if not editing self)
         if target_user.id != request.user.id:
-            if not hasattr(target_user, 'profile'):
-                UserProfile.objects.create(user=target_user)
-            
             target_user.profile.is_admin_user = is_admin
             target_user.profile.save()
             logger.info(f"✓ User {target_user.username} admin status updated to {is_admin}")
@@ -1312,7 +1590,7 @@ def test_csrf(request):
         'post_data': dict(request.POST) if request.method == 'POST' else None,
     })
 
-@never_cache
+@cache_policy(NO_STORE)
 @login_required
 def admin_bookings(request):
     """Enhanced admin bookings management page with comprehensive data and pagination"""
@@ -1322,158 +1600,87 @@ def admin_bookings(request):
         return redirect('home')
 
     # Get filter parameters
-    search_query = request.GET.get('search', '')
-    status_filter = request.GET.get('status', '')
-    company_filter = request.GET.get('company', '')
-    payment_method_filter = request.GET.get('payment_method', '')
-    date_from = request.GET.get('date_from', '')
-    date_to = request.GET.get('date_to', '')
-
-    # Base queryset
-    bookings = Booking.objects.select_related('user').order_by('-created_at')
-
-    # Apply basic filters
-    if search_query:
-        bookings = bookings.filter(
-            Q(booking_reference__icontains=search_query) |
-            Q(user__username__icontains=search_query) |
-            Q(user__first_name__icontains=search_query) |
-            Q(user__last_name__icontains=search_query) |
-            Q(origin__icontains=search_query) |
-            Q(destination__icontains=search_query)
-        )
-
-    if status_filter:
-        bookings = bookings.filter(status=status_filter)
-
-    if date_from:
-        bookings = bookings.filter(departure_date__gte=date_from)
-    
-    if date_to:
-        bookings = bookings.filter(departure_date__lte=date_to)
-
-    # For company and payment filters, we need to filter after getting the queryset
-    if company_filter or payment_method_filter:
-        filtered_ids = []
-        for b in bookings:
-            include = True
-            if b.details and isinstance(b.details, dict):
-                # Check company filter
-                if company_filter:
-                    outbound = b.details.get('outbound')
-                    if not (outbound and isinstance(outbound, dict) and 
-                           outbound.get('company', '') == company_filter):
-                        include = False
-                
-                # Check payment method filter - FIXED to use actual method names
-                if payment_method_filter and include:
-                    payment = b.details.get('payment')
-                    if payment and isinstance(payment, dict):
-                        actual_method = payment.get('method', '')
-                        # Normalize stripe_test to stripe for comparison
-                        if actual_method == 'stripe_test':
-                            actual_method = 'stripe'
-                        if actual_method != payment_method_filter:
-                            include = False
-                    else:
-                        include = False
-            else:
-                include = False
-            
-            if include:
-                filtered_ids.append(b.id)
-        
-        # Apply the filter
-        bookings = bookings.filter(id__in=filtered_ids)
+    filters = get_filter_values(request.GET)
+    search_query = filters['search']
+    status_filter = filters['status']
+    company_filter = filters['company']
+    payment_method_filter = filters['payment_method']
+    date_from = filters['date_from']
+    date_to = filters['date_to']
+
+    # Filtered queryset (shared with the booking export - see exports.py)
+    bookings = filter_bookings(filters)
+
+    # Calculate KPIs (use all bookings, not filtered) from the daily rollup
+    stats = BookingDailyStats.objects.all()
+    status_counts = dict(
+        stats.values_list('status').annotate(total=Sum('bookings')).order_by()
+    )
 
-    # Calculate KPIs (use all bookings, not filtered)
-    all_bookings = Booking.objects.all()
-    
     # Basic statistics
-    total_bookings = all_bookings.count()
-    pending_bookings = all_bookings.filter(status='pending').count()
-    reserved_bookings = all_bookings.filter(status='reserved').count()
-    confirmed_bookings = all_bookings.filter(status='confirmed').count()
-    cancelled_bookings = all_bookings.filter(status='cancelled').count()
-    completed_bookings = all_bookings.filter(status='completed').count()
+    total_bookings = sum(status_counts.values())
+    pending_bookings = status_counts.get('pending', 0)
+    reserved_bookings = status_counts.get('reserved', 0)
+    confirmed_bookings = status_counts.get('confirmed', 0)
+    cancelled_bookings = status_counts.get('cancelled', 0)
+    completed_bookings = status_counts.get('completed', 0)
 
     # Revenue statistics (only completed bookings)
-    completed = all_bookings.filter(status='completed')
-    total_revenue = completed.aggregate(Sum('total_price'))['total_price__sum'] or 0
+    completed = stats.filter(status='completed')
+    total_revenue = completed.aggregate(Sum('revenue'))['revenue__sum'] or 0
 
-    # Revenue by shipping company
+    # Revenue by shipping company (sorted by revenue)
     company_revenue = {}
-    for booking in completed:
-        if booking.details and isinstance(booking.details, dict):
-            outbound = booking.details.get('outbound')
-            if outbound and isinstance(outbound, dict):
-                company = outbound.get('company', 'Unknown')
-                if company not in company_revenue:
-                    company_revenue[company] = {
-                        'revenue': 0,
-                        'bookings': 0,
-                        'passengers': 0
-                    }
-                company_revenue[company]['revenue'] += float(booking.total_price)
-                company_revenue[company]['bookings'] += 1
-                company_revenue[company]['passengers'] += booking.adults + booking.children
-
-    # Sort companies by revenue
-    company_revenue = dict(sorted(company_revenue.items(), 
-                                 key=lambda x: x[1]['revenue'], 
-                                 reverse=True))
+    for entry in (
+        completed
+        .values('company')
+        .annotate(revenue=Sum('revenue'), bookings=Sum('bookings'), passengers=Sum('passengers'))
+        .order_by('-revenue')
+    ):
+        company_revenue[entry['company'] or 'Unknown'] = {
+            'revenue': float(entry['revenue']),
+            'bookings': entry['bookings'],
+            'passengers': entry['passengers'],
+        }
 
     # Get unique shipping companies for filter dropdown
-    all_companies = set()
-    for booking in all_bookings:
-        if booking.details and isinstance(booking.details, dict):
-            outbound = booking.details.get('outbound')
-            if outbound and isinstance(outbound, dict):
-                company = outbound.get('company')
-                if company:
-                    all_companies.add(company)
-
-    # FIXED: Get unique payment methods with proper display names
-    all_payment_methods = {}  # Changed to dict for display mapping
-    for booking in all_bookings:
-        if booking.details and isinstance(booking.details, dict):
-            payment = booking.details.get('payment')
-            if payment and isinstance(payment, dict):
-                method = payment.get('method', '')
-                if method:
-                    # Normalize stripe_test to stripe
-                    if method == 'stripe_test':
-                        method = 'stripe'
-                    
-                    # Map method to display name
-                    display_name = {
-                        'stripe': 'Credit/Debit Card',
-                        'gcash': 'GCash',
-                        'paymaya': 'PayMaya',
-                        'maya': 'Maya',
-                        'shopeepay': 'ShopeePay',
-                        'gotyme': 'GoTyme',
-                        'paypal': 'PayPal',
-                        'cash': 'Cash'
-                    }.get(method.lower(), method.title())
-                    
-                    all_payment_methods[method] = display_name
+    all_companies = set(
+        stats.filter(bookings__gt=0).exclude(company='').values_list('company', flat=True).distinct().order_by()
+    )
+
+    # Get unique payment methods with proper display names
+    all_payment_methods = {}
+    for method in stats.filter(bookings__gt=0).exclude(payment_method='').values_list('payment_method', flat=True).distinct().order_by():
+        all_payment_methods[method] = PAYMENT_METHOD_DISPLAY.get(method.lower(), method.title())
 
     # Monthly revenue data for chart
     monthly_revenue = (
         completed
-        .annotate(month=TruncMonth('created_at'))
+        .annotate(month=TruncMonth('day'))
         .values('month')
-        .annotate(revenue=Sum('total_price'))
+        .annotate(revenue=Sum('revenue'))
         .order_by('month')
     )
 
     chart_labels = [entry['month'].strftime('%b %Y') for entry in monthly_revenue]
     chart_data = [float(entry['revenue']) for entry in monthly_revenue]
 
+    # Pagination - 15 bookings per page
+    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+    
+    paginator = Paginator(bookings, 15)
+    page = request.GET.get('page', 1)
+    
+    try:
+        paginated_bookings = paginator.page(page)
+    except PageNotAnInteger:
+        paginated_bookings = paginator.page(1)
+    except EmptyPage:
+        paginated_bookings = paginator.page(paginator.num_pages)
+
     # Prepare enhanced booking data
     enhanced_bookings = []
-    for booking in bookings:
+    for booking in paginated_bookings:
         # Safely get details with proper None handling
         details = booking.details if booking.details and isinstance(booking.details, dict) else {}
         
@@ -1493,16 +1700,9 @@ def admin_bookings(request):
         if payment_method_raw == 'stripe_test':
             payment_method_raw = 'stripe'
         
-        payment_method_display = {
-            'stripe': 'Credit/Debit Card',
-            'gcash': 'GCash',
-            'paymaya': 'PayMaya',
-            'maya': 'Maya',
-            'shopeepay': 'ShopeePay',
-            'gotyme': 'GoTyme',
-            'paypal': 'PayPal',
-            'cash': 'Cash'
-        }.get(payment_method_raw.lower() if payment_method_raw != 'N/A' else '', payment_method_raw)
+        payment_method_display = PAYMENT_METHOD_DISPLAY.get(
+            payment_method_raw.lower() if payment_method_raw != 'N/A' else '', payment_method_raw
+        )
 
         enhanced_bookings.append({
             'booking': booking,
@@ -1541,18 +1741,8 @@ def admin_bookings(request):
             }
         })
 
-    # Pagination - 15 bookings per page
-    from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-    
-    paginator = Paginator(enhanced_bookings, 15)
-    page = request.GET.get('page', 1)
-    
-    try:
-        paginated_bookings = paginator.page(page)
-    except PageNotAnInteger:
-        paginated_bookings = paginator.page(1)
-    except EmptyPage:
-        paginated_bookings = paginator.page(paginator.num_pages)
+    # Only the bookings on this page are enhanced
+    paginated_bookings.object_list = enhanced_bookings
 
     context = {
         'bookings': paginated_bookings,
@@ -1579,6 +1769,302 @@ def admin_bookings(request):
     }
     return render(request, 'admin_bookings.html', context)
 
+@cache_policy(NO_STORE)
+@login_required
+def export_bookings(request):
+    """Stream the filtered admin bookings as CSV or NDJSON"""
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin_user:
+        messages.error(request, "You don't have permission to access this page.")
+        return redirect('home')
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({
+            'success': False,
+            'message': f'Unsupported export format: {export_format}'
+        }, status=400)
+
+    bookings = filter_bookings(get_filter_values(request.GET))
+    filename = f"bookings-{timezone.localtime().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+
+    response = StreamingHttpResponse(
+        stream_bookings(bookings, export_format),
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@cache_policy(NO_STORE)
+@login_required
+def voyage_manifest(request):
+    """Stream the passenger manifest of one sailing as CSV"""
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin_user:
+        messages.error(request, "You don't have permission to access this page.")
+        return redirect('home')
+
+    # Either the stored key or the parts it is built from
+    key = request.GET.get('voyage_key') or voyage_key(
+        request.GET.get('company'), request.GET.get('vessel'), request.GET.get('departure')
+    )
+    if not key.strip('|'):
+        return JsonResponse({
+            'success': False,
+            'message': 'voyage_key or company, vessel and departure are required'
+        }, status=400)
+
+    statuses = [status for status in request.GET.get('status', '').split(',') if status]
+    slug = slugify(key.replace('|', ' ')) or 'voyage'
+    response = StreamingHttpResponse(stream_manifest(key, statuses), content_type=EXPORT_FORMATS['csv'])
+    response['Content-Disposition'] = f'attachment; filename="manifest-{slug}.csv"'
+    return response
+
+@login_required
+@require_POST
+def enqueue_admin_job(request):
+    """Queue a heavy admin operation for the run_jobs worker"""
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin_user:
+        return JsonResponse({'success': False, 'message': 'Unauthorized'}, status=403)
+
+    try:
+        data = json.loads(request.body) if request.body else {}
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'Invalid JSON data'}, status=400)
+
+    kind = data.get('kind')
+    if kind == 'export_bookings':
+        params = {
+            'format': data.get('format', 'csv'),
+            'filters': get_filter_values(data.get('filters') or {}),
+        }
+    else:
+        params = data.get('params') or {}
+
+    try:
+        job = jobs.enqueue(kind, params, user=request.user)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'job_id': job.id,
+        'status_url': reverse('admin_job_status', args=[job.id]),
+    }, status=202)
+
+
+@cache_policy(NO_STORE)
+@login_required
+def admin_job_status(request, job_id):
+    """Poll a queued admin job"""
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin_user:
+        return JsonResponse({'success': False, 'message': 'Unauthorized'}, status=403)
+
+    job = get_object_or_404(AdminJob, id=job_id)
+    return JsonResponse({
+        'success': True,
+        'job': {
+            'id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'progress': job.progress,
+            'total': job.total,
+            'percent': job.percent,
+            'message': job.message,
+            'result': job.result,
+            'result_url': reverse('admin_job_result', args=[job.id]) if AdminJobFile.objects.filter(job=job).exists() else None,
+        }
+    })
+
+
+@cache_policy(NO_STORE)
+@login_required
+def admin_job_result(request, job_id):
+    """Download the file produced by a finished admin job"""
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin_user:
+        messages.error(request, "You don't have permission to access this page.")
+        return redirect('home')
+
+    job_file = get_object_or_404(AdminJobFile, job_id=job_id, job__status='succeeded')
+    content = gzip.GzipFile(fileobj=io.BytesIO(bytes(job_file.data)))
+    return FileResponse(content, as_attachment=True, filename=job_file.name, content_type=job_file.content_type)
+
+# Fingerprints listed by the slow-query summary
+SLOW_QUERY_SUMMARY_LIMIT = 50
+
+
+@cache_policy(NO_STORE)
+@login_required
+def admin_slow_queries(request):
+    """Slow-query log grouped by fingerprint, slowest total time first"""
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin_user:
+        return JsonResponse({'success': False, 'message': 'Unauthorized'}, status=403)
+
+    groups = list(
+        SlowQuery.objects.values('fingerprint')
+        .annotate(
+            count=Count('id'),
+            total_ms=Sum('duration_ms'),
+            avg_ms=Avg('duration_ms'),
+            max_ms=Max('duration_ms'),
+            last_seen=Max('created_at'),
+        )
+        .order_by('-total_ms')[:SLOW_QUERY_SUMMARY_LIMIT]
+    )
+    # Newest row of each fingerprint for its SQL, view, location and plan
+    latest = {}
+    explained = (
+        SlowQuery.objects.filter(fingerprint__in=[group['fingerprint'] for group in groups])
+        .order_by('fingerprint', '-created_at')
+        .values('fingerprint', 'sql', 'view', 'location', 'explain')
+    )
+    for row in explained:
+        entry = latest.setdefault(row['fingerprint'], dict(row))
+        if not entry['explain'] and row['explain']:
+            entry['explain'] = row['explain']
+
+    return JsonResponse({
+        'success': True,
+        'queries': [
+            {
+                'fingerprint': group['fingerprint'],
+                'count': group['count'],
+                'total_ms': round(group['total_ms'], 1),
+                'avg_ms': round(group['avg_ms'], 1),
+                'max_ms': round(group['max_ms'], 1),
+                'last_seen': group['last_seen'].isoformat(),
+                'sql': latest[group['fingerprint']]['sql'],
+                'view': latest[group['fingerprint']]['view'],
+                'location': latest[group['fingerprint']]['location'],
+                'explain': latest[group['fingerprint']]['explain'],
+            }
+            for group in groups
+        ],
+    })
+
+# Serialized modal payloads are cached per booking version
+BOOKING_DETAILS_CACHE_TIMEOUT = 60 * 60
+# Upper bound on ids accepted by the batch details endpoint
+BOOKING_DETAILS_BATCH_LIMIT = 100
+
+
+# User fields shown in the modal; part of the cache key since saving the
+# user does not touch the booking
+BOOKING_DETAILS_USER_FIELDS = ('username', 'first_name', 'last_name', 'email')
+
+
+def booking_details_cache_key(booking_id, updated_at, user_fields):
+    """
+    Cache key that changes whenever the booking row (or one of its
+    passengers, see signals.py) is saved, or the user's shown fields change
+    """
+    user_version = hashlib.md5('\x1f'.join(user_fields).encode(), usedforsecurity=False).hexdigest()[:12]
+    return f"booking_details:{booking_id}:{updated_at.timestamp()}:{user_version}"
+
+
+def serialize_booking_details(booking):
+    """Build the admin modal payload for one booking (expects user to be loaded)"""
+    details = booking.details if booking.details and isinstance(booking.details, dict) else {}
+
+    # Extract voyage information
+    outbound = details.get('outbound') or {}
+    return_trip = details.get('return') or {}
+    payment = details.get('payment') or {}
+
+    # Format payment method
+    payment_method = payment.get('method', 'N/A')
+    if payment_method == 'stripe_test':
+        payment_method = 'stripe'
+
+    payment_display = PAYMENT_METHOD_DISPLAY.get(
+        payment_method.lower() if payment_method != 'N/A' else '', payment_method
+    )
+
+    return {
+        'id': booking.id,
+        'reference': booking.booking_reference,
+        'status': booking.status,
+        'created_at': booking.created_at.strftime('%b %d, %Y %I:%M %p'),
+        'user': {
+            'name': booking.user.get_full_name() or booking.user.username,
+            'email': booking.user.email,
+            'username': booking.user.username
+        },
+        'route': {
+            'origin': booking.origin,
+            'destination': booking.destination,
+            'trip_type': booking.trip_type
+        },
+        'outbound': {
+            'company': outbound.get('company', 'N/A'),
+            'vessel': outbound.get('vessel', 'N/A'),
+            'date': outbound.get('departureDate', 'N/A'),
+            'time': outbound.get('departureTime', 'N/A'),
+            'accommodation': outbound.get('accommodationName', 'N/A'),
+            'seat_type': outbound.get('seatType', 'N/A'),
+            'adult_price': outbound.get('adult_price', 0),
+            'child_price': outbound.get('child_price', 0),
+            'total': outbound.get('price', 0)
+        },
+        'return': {
+            'company': return_trip.get('company', 'N/A'),
+            'vessel': return_trip.get('vessel', 'N/A'),
+            'date': return_trip.get('departureDate', 'N/A'),
+            'time': return_trip.get('departureTime', 'N/A'),
+            'accommodation': return_trip.get('accommodationName', 'N/A'),
+            'seat_type': return_trip.get('seatType', 'N/A'),
+            'adult_price': return_trip.get('adult_price', 0),
+            'child_price': return_trip.get('child_price', 0),
+            'total': return_trip.get('price', 0)
+        } if return_trip else None,
+        'passengers': booking_passengers(booking),
+        'payment': {
+            'method': payment_display,
+            'paid_at': payment.get('paid_at_display', 'N/A'),
+            'amount': float(booking.total_price)
+        },
+        'totals': {
+            'adults': booking.adults,
+            'children': booking.children,
+            'infants': details.get('infants', 0),
+            'total_price': float(booking.total_price)
+        }
+    }
+
+
+def get_cached_booking_details(booking_ids):
+    """
+    Return {id: payload} for the given bookings. Only the versions (updated_at
+    and the user's shown fields) are read for cache hits; misses are loaded
+    with their user and passengers in two queries.
+    """
+    user_fields = [f'user__{field}' for field in BOOKING_DETAILS_USER_FIELDS]
+    keys = {
+        booking_id: booking_details_cache_key(booking_id, updated_at, user_values)
+        for booking_id, updated_at, *user_values in Booking.objects.filter(id__in=booking_ids).values_list(
+            'id', 'updated_at', *user_fields
+        )
+    }
+    cached = cache.get_many(list(keys.values()))
+
+    payloads = {}
+    missing = []
+    for booking_id, key in keys.items():
+        if key in cached:
+            payloads[booking_id] = cached[key]
+        else:
+            missing.append(booking_id)
+
+    if missing:
+        fresh = {}
+        for booking in Booking.objects.filter(id__in=missing).select_related('user').prefetch_related('passengers'):
+            payload = serialize_booking_details(booking)
+            payloads[booking.id] = payload
+            user_values = [getattr(booking.user, field) for field in BOOKING_DETAILS_USER_FIELDS]
+            fresh[booking_details_cache_key(booking.id, booking.updated_at, user_values)] = payload
+        cache.set_many(fresh, BOOKING_DETAILS_CACHE_TIMEOUT)
+
+    return payloads
+
+
 @login_required
 def get_booking_details(request, booking_id):
     """API endpoint to get detailed booking information for modal"""
@@ -1589,111 +2075,63 @@ def get_booking_details(request, booking_id):
                 'success': False,
                 'message': 'Unauthorized'
             }, status=403)
-        
-        booking = get_object_or_404(Booking, id=booking_id)
-        details = booking.details if booking.details and isinstance(booking.details, dict) else {}
-        
-        # Extract passenger information
-        passengers_data = details.get('passengers', {})
-        passengers = []
-        
-        # Get passenger count
-        total_passengers = booking.adults + booking.children
-        
-        for i in range(1, total_passengers + 1):
-            passenger = {
-                'number': i,
-                'first_name': passengers_data.get(f'passenger_{i}_first_name', 'N/A'),
-                'last_name': passengers_data.get(f'passenger_{i}_last_name', 'N/A'),
-                'gender': passengers_data.get(f'passenger_{i}_gender', 'N/A'),
-                'dob': passengers_data.get(f'passenger_{i}_dob', 'N/A'),
-                'type': 'Adult' if i <= booking.adults else 'Child'
-            }
-            passengers.append(passenger)
-        
-        # Extract voyage information
-        outbound = details.get('outbound', {})
-        return_trip = details.get('return', {})
-        payment = details.get('payment', {})
-        
-        # Format payment method
-        payment_method = payment.get('method', 'N/A')
-        if payment_method == 'stripe_test':
-            payment_method = 'stripe'
-        
-        payment_display = {
-            'stripe': 'Credit/Debit Card',
-            'gcash': 'GCash',
-            'paymaya': 'PayMaya',
-            'maya': 'Maya',
-            'shopeepay': 'ShopeePay',
-            'gotyme': 'GoTyme',
-            'paypal': 'PayPal',
-            'cash': 'Cash'
-        }.get(payment_method.lower() if payment_method != 'N/A' else '', payment_method)
-        
-        response_data = {
+
+        payload = get_cached_booking_details([booking_id]).get(booking_id)
+        if payload is None:
+            raise Http404("Booking not found")
+
+        return JsonResponse({
             'success': True,
-            'booking': {
-                'reference': booking.booking_reference,
-                'status': booking.status,
-                'created_at': booking.created_at.strftime('%b %d, %Y %I:%M %p'),
-                'user': {
-                    'name': booking.user.get_full_name() or booking.user.username,
-                    'email': booking.user.email,
-                    'username': booking.user.username
-                },
-                'route': {
-                    'origin': booking.origin,
-                    'destination': booking.destination,
-                    'trip_type': booking.trip_type
-                },
-                'outbound': {
-                    'company': outbound.get('company', 'N/A'),
-                    'vessel': outbound.get('vessel', 'N/A'),
-                    'date': outbound.get('departureDate', 'N/A'),
-                    'time': outbound.get('departureTime', 'N/A'),
-                    'accommodation': outbound.get('accommodationName', 'N/A'),
-                    'seat_type': outbound.get('seatType', 'N/A'),
-                    'adult_price': outbound.get('adult_price', 0),
-                    'child_price': outbound.get('child_price', 0),
-                    'total': outbound.get('price', 0)
-                },
-                'return': {
-                    'company': return_trip.get('company', 'N/A'),
-                    'vessel': return_trip.get('vessel', 'N/A'),
-                    'date': return_trip.get('departureDate', 'N/A'),
-                    'time': return_trip.get('departureTime', 'N/A'),
-                    'accommodation': return_trip.get('accommodationName', 'N/A'),
-                    'seat_type': return_trip.get('seatType', 'N/A'),
-                    'adult_price': return_trip.get('adult_price', 0),
-                    'child_price': return_trip.get('child_price', 0),
-                    'total': return_trip.get('price', 0)
-                } if return_trip else None,
-                'passengers': passengers,
-                'payment': {
-                    'method': payment_display,
-                    'paid_at': payment.get('paid_at_display', 'N/A'),
-                    'amount': float(booking.total_price)
-                },
-                'totals': {
-                    'adults': booking.adults,
-                    'children': booking.children,
-                    'infants': details.get('infants', 0),
-                    'total_price': float(booking.total_price)
-                }
-            }
-        }
-        
-        return JsonResponse(response_data)
-    
+            'booking': payload
+        })
+
+    except Http404:
+        raise
     except Exception as e:
         logger.error(f"Error getting booking details: {str(e)}", exc_info=True)
         return JsonResponse({
             'success': False,
             'message': str(e)
         }, status=500)
-        
+
+
+@login_required
+def get_booking_details_batch(request):
+    """API endpoint to prefetch modal details for a page of bookings: ?ids=1,2,3"""
+    try:
+        if not hasattr(request.user, 'profile') or not request.user.profile.is_admin_user:
+            return JsonResponse({
+                'success': False,
+                'message': 'Unauthorized'
+            }, status=403)
+
+        try:
+            booking_ids = [int(i) for i in request.GET.get('ids', '').split(',') if i.strip()]
+        except ValueError:
+            return JsonResponse({
+                'success': False,
+                'message': 'ids must be a comma-separated list of booking ids'
+            }, status=400)
+
+        if len(booking_ids) > BOOKING_DETAILS_BATCH_LIMIT:
+            return JsonResponse({
+                'success': False,
+                'message': f'At most {BOOKING_DETAILS_BATCH_LIMIT} bookings per request'
+            }, status=400)
+
+        payloads = get_cached_booking_details(booking_ids)
+        return JsonResponse({
+            'success': True,
+            'bookings': {str(booking_id): payload for booking_id, payload in payloads.items()}
+        })
+
+    except Exception as e:
+        logger.error(f"Error getting booking details batch: {str(e)}", exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
+        }, status=500)
+
 @login_required
 def profile_settings(request):
     user = request.user
@@ -1897,7 +2335,6 @@ def search_trips(request):
             
             if not routes_data:
                 # Cache miss - fetch from API
-                locations_url = "https://barkota-reseller-php-prod-4kl27j34za-uc.a.run.app/ob/routes/passageenabled"
                 locations_headers = {
                     "Accept": "application/json",
                     "Content-Type": "application/json",
@@ -1907,12 +2344,13 @@ def search_trips(request):
                 locations_payload = {"companyId": None}
                 
                 logger.info("Fetching routes for search (cache miss)")
-                locations_response = requests.post(locations_url, json=locations_payload, headers=locations_headers, timeout=25)
+                locations_response = barkota.post(barkota.ROUTES_PATH, locations_payload, locations_headers, timeout=25)
                 locations_response.raise_for_status()
                 routes_data = locations_response.json()
                 
                 # Cache for 10 minutes
                 cache.set('barkota_routes', routes_data, 600)
+                set_routes_catalogue_version(routes_data)
             else:
                 logger.info("Using cached routes for search")
             
@@ -1951,11 +2389,10 @@ def search_trips(request):
             
             # Search for outbound voyages - check cache first
             outbound_voyages = cache.get(outbound_cache_key)
+            outbound_fetched = not outbound_voyages
             
-            if not outbound_voyages:
+            if outbound_fetched:
                 # Cache miss - fetch from API
-                url = "https://barkota-reseller-php-prod-4kl27j34za-uc.a.run.app/ob/voyages/search/bylocation"
-                
                 headers = {
                     "Content-Type": "application/json",
                     "Accept": "application/json, text/plain, */*",
@@ -1975,22 +2412,24 @@ def search_trips(request):
                 
                 logger.info(f"Searching outbound voyages (cache miss): {payload}")
                 
-                response = requests.post(url, json=payload, headers=headers, timeout=25)
+                response = barkota.post(barkota.VOYAGES_PATH, payload, headers, timeout=25)
                 response.raise_for_status()
                 
                 outbound_voyages = response.json()
                 
                 # Cache voyage results for 5 minutes (shorter than routes cache)
-                cache.set(outbound_cache_key, outbound_voyages, 300)
+                cache_voyages(outbound_cache_key, outbound_voyages)
             else:
                 logger.info("Using cached outbound voyages")
             
             # If roundtrip, search for return voyages
             return_voyages = []
+            return_fetched = False
             if trip_type == 'round_trip' and return_date:
                 return_voyages = cache.get(return_cache_key)
+                return_fetched = not return_voyages
                 
-                if not return_voyages:
+                if return_fetched:
                     # Cache miss - fetch from API
                     return_payload = {
                         "origin": int(destination),  # Swapped
@@ -2004,12 +2443,12 @@ def search_trips(request):
                     
                     logger.info(f"Searching return voyages (cache miss): {return_payload}")
                     
-                    return_response = requests.post(url, json=return_payload, headers=headers, timeout=25)
+                    return_response = barkota.post(barkota.VOYAGES_PATH, return_payload, headers, timeout=25)
                     return_response.raise_for_status()
                     return_voyages = return_response.json()
                     
                     # Cache for 5 minutes
-                    cache.set(return_cache_key, return_voyages, 300)
+                    cache_voyages(return_cache_key, return_voyages)
                 else:
                     logger.info("Using cached return voyages")
             
@@ -2026,7 +2465,6 @@ def search_trips(request):
                 return_time = first_return.get('departureDateTime', '')
             
             # Format dates to "Wed, 22 Oct 2025"
-            from datetime import datetime
             departure_date_formatted = departure_date
             return_date_formatted = return_date
             
@@ -2044,7 +2482,6 @@ def search_trips(request):
                     pass
             
             # Enforce cutoff: 1 hour 30 minutes before departure
-            from datetime import timedelta
             now = timezone.now()
             cutoff_delta = timedelta(hours=1, minutes=30)
 
@@ -2083,6 +2520,10 @@ def search_trips(request):
             outbound_voyages = apply_cutoff(outbound_voyages)
             return_voyages = apply_cutoff(return_voyages)
 
+            # Seed the seat ledger from fresh results and show what is left after our own holds
+            sync_inventory(outbound_voyages, refresh=outbound_fetched)
+            sync_inventory(return_voyages, refresh=return_fetched)
+
             # Render results page
             context = {
                 'trip_type': trip_type,
@@ -2100,11 +2541,15 @@ def search_trips(request):
                 'children': children,
                 'outbound_voyages': outbound_voyages,
                 'return_voyages': return_voyages,
+                # The rendered result cards are shared by every search with these keys
+                'outbound_fragment_key': voyage_fragment_key(outbound_cache_key, outbound_voyages),
+                'return_fragment_key': voyage_fragment_key(return_cache_key, return_voyages) if return_cache_key else '',
+                'voyage_fragment_timeout': VOYAGE_CACHE_TIMEOUT,
                 'routes_data': json.dumps(routes_data) if routes_data else '[]',
                 'today': date.today().isoformat(),
             }
 
-            request.session['passenger_info_summary'] = {
+            request.cart.set('passenger_info_summary', {
                 'trip_type': trip_type,
                 'origin_name': origin_name,
                 'destination_name': destination_name,
@@ -2112,7 +2557,7 @@ def search_trips(request):
                 'return_date_formatted': return_date_formatted,
                 'adults': adults,
                 'children': children,
-            }
+            })
             
             return render(request, 'available_trips_search.html', context)
             
@@ -2137,9 +2582,6 @@ def search_voyages_page(request):
 def get_all_locations(request):
     """Fetch all available locations/routes from Barkota API"""
     try:
-        # Barkota routes endpoint (found via DevTools - returns locations)
-        url = "https://barkota-reseller-php-prod-4kl27j34za-uc.a.run.app/ob/routes/passageenabled"
-        
         # Headers matching the Barkota website
         headers = {
             "Accept": "application/json",
@@ -2156,7 +2598,7 @@ def get_all_locations(request):
         logger.info(f"Fetching all locations from Barkota API")
         
         # Make API request with POST method and payload
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
+        response = barkota.post(barkota.ROUTES_PATH, payload, headers, timeout=10)
         response.raise_for_status()
         
         # Return the API response
@@ -2194,9 +2636,6 @@ def search_voyages_barkota(request):
         cargo_item_id = data.get('cargoItemId', None)
         with_driver = data.get('withDriver', 1)
         
-        # Barkota API endpoint
-        url = "https://barkota-reseller-php-prod-4kl27j34za-uc.a.run.app/ob/voyages/search/bylocation"
-        
         # Request headers
         headers = {
             "Content-Type": "application/json",
@@ -2219,7 +2658,7 @@ def search_voyages_barkota(request):
         logger.info(f"Searching voyages with payload: {payload}")
         
         # Make API request
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
+        response = barkota.post(barkota.VOYAGES_PATH, payload, headers, timeout=10)
         response.raise_for_status()
         
         # Return the API response
@@ -2286,10 +2725,7 @@ def update_profile_ajax(request):
        Note: date_of_birth is intentionally ignored here to keep DOB immutable.
     """
     user = request.user
-    profile = getattr(user, 'profile', None)
-    if not profile:
-        # defensive: ensure profile exists
-        profile = UserProfile.objects.create(user=user)
+    profile = user.profile
 
     # Get fields from POST data (do NOT accept date_of_birth updates)
     first_name = request.POST.get("first_name", user.first_name)
@@ -2327,7 +2763,7 @@ def update_profile_ajax(request):
 
 @require_http_methods(["GET"])
 def get_booking_selection(request):
-        booking_data = request.session.get('booking_selection', {})
+        booking_data = request.cart.get('booking_selection', {})
         return JsonResponse(booking_data)
 
 
@@ -2378,9 +2814,13 @@ def delete_account(request):
             return redirect('profile')  # or render an error page
         
 
+@cache_policy(PUBLIC, max_age=PUBLIC_MAX_AGE)
+@cache_anonymous_page
 def contact_us(request):
     
     return render(request, 'contact.html')
 
+@cache_policy(PUBLIC, max_age=PUBLIC_MAX_AGE)
+@cache_anonymous_page
 def latest_offer(request):
     return render(request, 'latest_offer.html')
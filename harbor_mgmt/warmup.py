@@ -0,0 +1,66 @@
+"""
+Worker warmup, run by gunicorn.conf.py before a worker takes traffic.
+
+Without it the first requests after a deploy or worker recycle pay for
+importing every view module, compiling each template on first use and
+fetching the Barkota routes catalogue. With preload_app the master warms up
+once and every forked worker inherits the loaded modules, the cached
+loader's compiled templates and the primed local cache.
+"""
+import logging
+import os
+import time
+
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def import_views():
+    """Import every URLconf and view module and build the reverse() lookup tables"""
+    resolver = get_resolver()
+    resolver._populate()
+    return len(resolver.reverse_dict)
+
+
+def compile_templates():
+    """Compile every template in every template directory through the cached loader"""
+    compiled = failed = 0
+    for engine in engines.all():
+        for directory in getattr(engine, 'template_dirs', ()):
+            for root, _dirs, files in os.walk(directory):
+                for filename in files:
+                    name = os.path.relpath(os.path.join(root, filename), directory).replace(os.sep, '/')
+                    try:
+                        engine.get_template(name)
+                        compiled += 1
+                    except (TemplateDoesNotExist, TemplateSyntaxError, UnicodeDecodeError) as e:
+                        failed += 1
+                        logger.warning(f"warmup could not compile template {name}: {str(e)}")
+    return compiled, failed
+
+
+def prime_routes_catalogue():
+    from .views import load_routes_catalogue
+    return len(load_routes_catalogue())
+
+
+def warm_up():
+    """Run every warmup step and return the timings"""
+    started = time.monotonic()
+    urls = import_views()
+    templates, failed = compile_templates()
+    routes = prime_routes_catalogue()
+    metrics = {
+        'url_patterns': urls,
+        'templates': templates,
+        'template_errors': failed,
+        'routes': routes,
+        'duration_ms': round((time.monotonic() - started) * 1000),
+    }
+    logger.info(
+        f"warmup url_patterns={metrics['url_patterns']} templates={metrics['templates']} "
+        f"template_errors={metrics['template_errors']} routes={metrics['routes']} duration_ms={metrics['duration_ms']}"
+    )
+    return metrics